@@ -6,6 +6,7 @@ from flask_wtf.csrf import CSRFProtect
 from config import Config
 import os
 import logging
+import time
 from logging.handlers import RotatingFileHandler
 
 # Initialize extensions
@@ -15,6 +16,8 @@ migrate = Migrate()
 csrf = CSRFProtect()
 
 def create_app(config_class=Config):
+    started = time.perf_counter()
+    
     app = Flask(__name__)
     app.config.from_object(config_class)
     
@@ -70,6 +73,34 @@ def create_app(config_class=Config):
     from app.utils.error_handlers import register_error_handlers
     register_error_handlers(app)
     
+    # Set up buffered feature usage metering
+    from app.utils.usage_metering import usage_meter
+    usage_meter.init_app(app)
+    
+    # Set up the out-of-request chart renderer
+    from app.utils.chart_renderer import chart_renderer
+    chart_renderer.init_app(app)
+    
+    # Set up background report exports
+    from app.utils.report_export import report_exporter
+    report_exporter.init_app(app)
+    
+    # Rescore compliance categories after commits in the background
+    from app.utils.compliance_scoring import score_refresher
+    score_refresher.init_app(app)
+    
+    # Set up background AI generation
+    from app.ai_agents.generation_queue import generation_queue
+    generation_queue.init_app(app)
+    
+    # Share one Anthropic client and limit concurrent API calls
+    from app.ai_agents.client_pool import anthropic_pool
+    anthropic_pool.init_app(app)
+    
+    # Register CLI commands
+    from app.commands import register_commands
+    register_commands(app)
+    
     # Set up logging
     if not app.debug and not app.testing:
         # Ensure log directory exists
@@ -99,13 +130,15 @@ def create_app(config_class=Config):
     from app.models import ai_assistant_models
     from app.models import value_added_models
     
-    # Create database tables if they don't exist
-    with app.app_context():
-        db.create_all()
-        
-        # Initialize database with required data
-        from app.utils.db_init import initialize_database
-        initialize_database()
+    # Create database tables if they don't exist. With FAST_BOOT this is
+    # left to `flask init-db`, so workers start without DDL or seed queries.
+    if not app.config.get('FAST_BOOT'):
+        with app.app_context():
+            from app.utils.db_init import bootstrap_database
+            bootstrap_database()
+    
+    app.config['BOOT_TIME_MS'] = round((time.perf_counter() - started) * 1000, 1)
+    app.logger.info(f"NGOmply booted in {app.config['BOOT_TIME_MS']} ms (fast boot: {bool(app.config.get('FAST_BOOT'))})")
     
     return app
 
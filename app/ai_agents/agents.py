@@ -1,25 +1,33 @@
 import os
-import anthropic
 from flask import current_app, jsonify
+from app.ai_agents.retrieval import build_legal_context
+from app.ai_agents.client_pool import anthropic_pool, AIBusyError
+from app.ai_agents.response_cache import response_cache, response_cache_key
+from app.ai_agents.token_usage import TokenUsage, TokenBudgetExceeded, check_token_budget, estimate_tokens, record_token_usage
 import logging
 from datetime import datetime
 
 class AIAgent:
     """Base class for AI agents using Anthropic Claude"""
     
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, organization_id=None):
         """
         Initialize the AI agent
         
         Args:
             api_key (str, optional): Anthropic API key. Defaults to None (uses environment variable).
+            organization_id (int, optional): Organization the agent works for, used to share
+                API call slots fairly. Defaults to None.
         """
         try:
             self.api_key = api_key or os.environ.get('ANTHROPIC_API_KEY') or current_app.config.get('ANTHROPIC_API_KEY')
             if not self.api_key:
                 raise ValueError("Anthropic API key not found. Please set ANTHROPIC_API_KEY environment variable or provide it in the application config.")
             
-            self.client = anthropic.Anthropic(api_key=self.api_key)
+            # Agents share one pooled client per process
+            self.client = anthropic_pool.get_client(self.api_key)
+            self.organization_id = organization_id
+            self.last_usage = None  # TokenUsage of the latest API call
             self.model = "claude-3-opus-20240229"  # Default to most capable model
             self.logger = logging.getLogger(__name__)
             
@@ -27,34 +35,58 @@ class AIAgent:
             self.logger.error(f"Error initializing AI agent: {str(e)}")
             raise
 
-    def _call_api(self, prompt, max_tokens=1000, temperature=0.7):
+    def _call_api(self, prompt, max_tokens=1000, temperature=0.7, use_cache=True, feature='generation'):
         """
         Call the Anthropic API with error handling
         
+        Low-temperature requests are answered from the response cache when
+        an identical request was made before. Other requests are checked
+        against the organization's monthly token budget first, and the
+        tokens reported by the API are recorded.
+        
         Args:
             prompt (str): Prompt to send to the API
             max_tokens (int, optional): Maximum tokens to generate. Defaults to 1000.
             temperature (float, optional): Temperature for generation. Defaults to 0.7.
+            use_cache (bool, optional): Whether to read and write the response cache. Defaults to True.
+            feature (str, optional): What is generated, for token accounting. Defaults to 'generation'.
             
         Returns:
             str: Generated text
             
         Raises:
+            TokenBudgetExceeded: If the call does not fit in the organization's token budget
             Exception: If API call fails
         """
+        import anthropic
+        
+        cache_key = None
+        if use_cache and response_cache.is_cacheable(temperature):
+            cache_key = response_cache_key(self.model, prompt, max_tokens, temperature)
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                self.logger.info(f"Anthropic API response served from cache, {len(cached)} characters")
+                return cached
+        else:
+            response_cache.record_bypass()
+        
+        # Reserve room for the whole prompt and the longest completion
+        check_token_budget(self.organization_id, estimate_tokens(prompt) + max_tokens)
+        
         try:
             # Log API call attempt
             self.logger.info(f"Calling Anthropic API with prompt length: {len(prompt)}")
             
-            # Make API call with timeout and retry logic
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=max_tokens,
-                temperature=temperature,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
-            )
+            # Make API call with timeout and retry logic, within this process's concurrency limits
+            with anthropic_pool.slot(self.organization_id):
+                response = self.client.messages.create(
+                    model=self.model,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    messages=[
+                        {"role": "user", "content": prompt}
+                    ]
+                )
             
             # Extract and validate response
             if not response or not hasattr(response, 'content') or not response.content:
@@ -66,6 +98,12 @@ class AIAgent:
             # Log successful API call
             self.logger.info(f"Anthropic API call successful, received {len(content)} characters")
             
+            self._record_usage(feature, self._usage_of(response, prompt, content))
+            
+            # Cache valid responses only, so failed generations are retried
+            if cache_key and self.validate_response(content):
+                response_cache.set(cache_key, self.model, content)
+            
             return content
             
         except anthropic.APIError as e:
@@ -84,10 +122,144 @@ class AIAgent:
             self.logger.error(f"Anthropic API status error: {str(e)}")
             raise Exception(f"AI service returned an error: {str(e)}")
             
+        except (AIBusyError, TokenBudgetExceeded):
+            raise
+            
         except Exception as e:
             self.logger.error(f"Unexpected error calling Anthropic API: {str(e)}")
             raise Exception(f"Unexpected error: {str(e)}")
 
+    def _stream_api(self, prompt, max_tokens=1000, temperature=0.7, use_cache=True, feature='generation'):
+        """
+        Stream a response from the Anthropic API as it is generated
+        
+        A cached response is yielded as a single chunk. The complete text is
+        cached once the stream ends, as with _call_api.
+        
+        Args:
+            prompt (str): Prompt to send to the API
+            max_tokens (int, optional): Maximum tokens to generate. Defaults to 1000.
+            temperature (float, optional): Temperature for generation. Defaults to 0.7.
+            use_cache (bool, optional): Whether to read and write the response cache. Defaults to True.
+            feature (str, optional): What is generated, for token accounting. Defaults to 'generation'.
+            
+        Yields:
+            str: Chunks of generated text
+            
+        Raises:
+            TokenBudgetExceeded: If the call does not fit in the organization's token budget
+            Exception: If API call fails
+        """
+        import anthropic
+        
+        cache_key = None
+        if use_cache and response_cache.is_cacheable(temperature):
+            cache_key = response_cache_key(self.model, prompt, max_tokens, temperature)
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                self.logger.info(f"Anthropic API response served from cache, {len(cached)} characters")
+                yield cached
+                return
+        else:
+            response_cache.record_bypass()
+        
+        # Reserve room for the whole prompt and the longest completion
+        check_token_budget(self.organization_id, estimate_tokens(prompt) + max_tokens)
+        
+        chunks = []
+        usage = None
+        
+        try:
+            # Log API call attempt
+            self.logger.info(f"Streaming from Anthropic API with prompt length: {len(prompt)}")
+            
+            # The call slot is held until the stream ends
+            with anthropic_pool.slot(self.organization_id), self.client.messages.stream(
+                model=self.model,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                messages=[
+                    {"role": "user", "content": prompt}
+                ]
+            ) as stream:
+                for text in stream.text_stream:
+                    chunks.append(text)
+                    yield text
+                    
+                usage = self._usage_of(stream.get_final_message(), prompt, ''.join(chunks))
+                    
+        except anthropic.APITimeoutError as e:
+            self.logger.error(f"Anthropic API timeout: {str(e)}")
+            raise Exception("AI service timeout. Please try again later.")
+            
+        except anthropic.APIConnectionError as e:
+            self.logger.error(f"Anthropic API connection error: {str(e)}")
+            raise Exception("Unable to connect to AI service. Please check your internet connection.")
+            
+        except anthropic.APIError as e:
+            self.logger.error(f"Anthropic API error: {str(e)}")
+            raise Exception(f"AI service error: {str(e)}")
+            
+        finally:
+            # A stream stopped early is billed for what was generated
+            if usage is None and chunks:
+                usage = TokenUsage(estimate_tokens(prompt), estimate_tokens(''.join(chunks)))
+            if usage is not None:
+                self._record_usage(feature, usage)
+        
+        content = ''.join(chunks)
+        
+        # Log successful stream
+        self.logger.info(f"Anthropic API stream finished, received {len(content)} characters")
+        
+        # Cache valid responses only, so failed generations are retried
+        if cache_key and self.validate_response(content):
+            response_cache.set(cache_key, self.model, content)
+
+    def _usage_of(self, message, prompt, content):
+        """Get the token usage reported with a message, estimating it if missing"""
+        usage = getattr(message, 'usage', None)
+        
+        if usage is None:
+            return TokenUsage(estimate_tokens(prompt), estimate_tokens(content))
+            
+        return TokenUsage(usage.input_tokens, usage.output_tokens)
+
+    def _record_usage(self, feature, usage):
+        """Keep the usage of the latest call and add it to the organization's totals"""
+        self.last_usage = usage
+        record_token_usage(self.organization_id, feature, self.model, usage)
+
+    def _with_legal_context(self, prompt, query):
+        """
+        Ground a prompt in the stored legal documents and regulatory updates
+        
+        The passages most relevant to the query are placed before the prompt,
+        within the RETRIEVAL_CONTEXT_TOKENS budget. Retrieval problems never
+        block generation; the prompt is then sent as is.
+        
+        Args:
+            prompt (str): Prompt to send to the API
+            query (str): Description of what is being generated, used to find passages
+            
+        Returns:
+            str: Prompt with the legal context prepended
+        """
+        try:
+            context = build_legal_context(query)
+        except Exception as e:
+            self.logger.warning(f"Legal context retrieval failed: {str(e)}")
+            return prompt
+            
+        if not context:
+            return prompt
+            
+        return (
+            "Base your answer on the following excerpts from Ugandan laws and regulations. "
+            "Refer to them by title where relevant and do not cite provisions that are not supported by them.\n\n"
+            f"{context}\n\n{prompt}"
+        )
+
     def validate_response(self, response):
         """
         Validate AI response
@@ -115,7 +287,7 @@ class AIAgent:
 class DocumentGenerationAgent(AIAgent):
     """AI agent for document generation"""
     
-    def generate_constitution(self, org_name, org_vision="", org_mission="", primary_objective=""):
+    def generate_constitution(self, org_name, org_vision="", org_mission="", primary_objective="", use_cache=True, stream=False):
         """
         Generate an organization constitution
         
@@ -124,9 +296,11 @@ class DocumentGenerationAgent(AIAgent):
             org_vision (str, optional): Vision statement. Defaults to "".
             org_mission (str, optional): Mission statement. Defaults to "".
             primary_objective (str, optional): Primary objective. Defaults to "".
+            use_cache (bool, optional): Whether to reuse a cached response. Defaults to True.
+            stream (bool, optional): Whether to return the text in chunks as it is generated. Defaults to False.
             
         Returns:
-            str: Generated constitution
+            str: Generated constitution, or an iterator of text chunks when streaming
         """
         try:
             prompt = f"""
@@ -152,7 +326,15 @@ class DocumentGenerationAgent(AIAgent):
             Ensure it complies with Ugandan NGO laws and regulations.
             """
             
-            response = self._call_api(prompt, max_tokens=2000, temperature=0.2)
+            prompt = self._with_legal_context(
+                prompt,
+                f"NGO constitution registration membership board governance meetings financial management amendment dissolution {primary_objective}"
+            )
+            
+            if stream:
+                return self._stream_api(prompt, max_tokens=2000, temperature=0.2, use_cache=use_cache, feature='constitution')
+            
+            response = self._call_api(prompt, max_tokens=2000, temperature=0.2, use_cache=use_cache, feature='constitution')
             
             # Validate response
             if not self.validate_response(response):
@@ -160,11 +342,14 @@ class DocumentGenerationAgent(AIAgent):
                 
             return response
             
+        except (AIBusyError, TokenBudgetExceeded):
+            raise
+            
         except Exception as e:
             self.logger.error(f"Error generating constitution: {str(e)}")
             raise Exception(f"Error generating constitution: {str(e)}")
 
-    def generate_minutes(self, org_name, meeting_date, meeting_type="Board Meeting", attendees=None):
+    def generate_minutes(self, org_name, meeting_date, meeting_type="Board Meeting", attendees=None, use_cache=True, stream=False):
         """
         Generate meeting minutes
         
@@ -173,9 +358,11 @@ class DocumentGenerationAgent(AIAgent):
             meeting_date (str): Date of the meeting
             meeting_type (str, optional): Type of meeting. Defaults to "Board Meeting".
             attendees (list, optional): List of attendees. Defaults to None.
+            use_cache (bool, optional): Whether to reuse a cached response. Defaults to True.
+            stream (bool, optional): Whether to return the text in chunks as it is generated. Defaults to False.
             
         Returns:
-            str: Generated minutes
+            str: Generated minutes, or an iterator of text chunks when streaming
         """
         try:
             attendees_str = ", ".join(attendees) if attendees else "Board members and key stakeholders"
@@ -203,7 +390,15 @@ class DocumentGenerationAgent(AIAgent):
             Include realistic but generic agenda items appropriate for an NGO/CBO in Uganda.
             """
             
-            response = self._call_api(prompt, max_tokens=1500, temperature=0.3)
+            prompt = self._with_legal_context(
+                prompt,
+                f"{meeting_type} minutes board meeting quorum resolutions annual general meeting"
+            )
+            
+            if stream:
+                return self._stream_api(prompt, max_tokens=1500, temperature=0.3, use_cache=use_cache, feature='minutes')
+            
+            response = self._call_api(prompt, max_tokens=1500, temperature=0.3, use_cache=use_cache, feature='minutes')
             
             # Validate response
             if not self.validate_response(response):
@@ -211,11 +406,14 @@ class DocumentGenerationAgent(AIAgent):
                 
             return response
             
+        except (AIBusyError, TokenBudgetExceeded):
+            raise
+            
         except Exception as e:
             self.logger.error(f"Error generating minutes: {str(e)}")
             raise Exception(f"Error generating minutes: {str(e)}")
 
-    def generate_request_letter(self, org_name, letter_subject, letter_purpose, recipient):
+    def generate_request_letter(self, org_name, letter_subject, letter_purpose, recipient, use_cache=True, stream=False):
         """
         Generate a request letter
         
@@ -224,9 +422,11 @@ class DocumentGenerationAgent(AIAgent):
             letter_subject (str): Subject of the letter
             letter_purpose (str): Purpose of the letter
             recipient (str): Recipient of the letter
+            use_cache (bool, optional): Whether to reuse a cached response. Defaults to True.
+            stream (bool, optional): Whether to return the text in chunks as it is generated. Defaults to False.
             
         Returns:
-            str: Generated letter
+            str: Generated letter, or an iterator of text chunks when streaming
         """
         try:
             prompt = f"""
@@ -248,7 +448,12 @@ class DocumentGenerationAgent(AIAgent):
             Format the letter professionally with proper structure and formatting.
             """
             
-            response = self._call_api(prompt, max_tokens=1000, temperature=0.3)
+            prompt = self._with_legal_context(prompt, f"{letter_subject} {letter_purpose} {recipient}")
+            
+            if stream:
+                return self._stream_api(prompt, max_tokens=1000, temperature=0.3, use_cache=use_cache, feature='letter')
+            
+            response = self._call_api(prompt, max_tokens=1000, temperature=0.3, use_cache=use_cache, feature='letter')
             
             # Validate response
             if not self.validate_response(response):
@@ -256,15 +461,72 @@ class DocumentGenerationAgent(AIAgent):
                 
             return response
             
+        except (AIBusyError, TokenBudgetExceeded):
+            raise
+            
         except Exception as e:
             self.logger.error(f"Error generating request letter: {str(e)}")
             raise Exception(f"Error generating request letter: {str(e)}")
 
+    def generate_compliance_document(self, document_type, org_name, title, description="", use_cache=True, stream=False):
+        """
+        Generate a compliance document such as a policy or procedure
+        
+        Args:
+            document_type (str): Type of document (policy, procedure, report, checklist)
+            org_name (str): Name of the organization
+            title (str): Title of the document
+            description (str, optional): What the document should cover. Defaults to "".
+            use_cache (bool, optional): Whether to reuse a cached response. Defaults to True.
+            stream (bool, optional): Whether to return the text in chunks as it is generated. Defaults to False.
+            
+        Returns:
+            str: Generated document, or an iterator of text chunks when streaming
+        """
+        try:
+            prompt = f"""
+            Generate a compliance {document_type} titled "{title}" for a Ugandan NGO/CBO named "{org_name}".
+            
+            Document details:
+            - Organization: {org_name}
+            - Type: {document_type}
+            - Title: {title}
+            - Description: {description if description else 'To be determined by the organization'}
+            
+            The document should:
+            1. State its purpose and scope
+            2. Set out the requirements, responsibilities and procedures
+            3. Reference the Ugandan NGO laws and regulations it helps comply with
+            4. Include review and approval details
+            
+            Format the document professionally with proper numbering and section headers.
+            """
+            
+            prompt = self._with_legal_context(prompt, f"{document_type} {title} {description}")
+            
+            if stream:
+                return self._stream_api(prompt, max_tokens=2000, temperature=0.2, use_cache=use_cache, feature='compliance_document')
+            
+            response = self._call_api(prompt, max_tokens=2000, temperature=0.2, use_cache=use_cache, feature='compliance_document')
+            
+            # Validate response
+            if not self.validate_response(response):
+                raise Exception("Failed to generate a valid document. Please try again with more specific details.")
+                
+            return response
+            
+        except (AIBusyError, TokenBudgetExceeded):
+            raise
+            
+        except Exception as e:
+            self.logger.error(f"Error generating document: {str(e)}")
+            raise Exception(f"Error generating document: {str(e)}")
+
 
 class AuditMethodologyAgent(AIAgent):
     """AI agent for audit methodology generation"""
     
-    def generate_audit_methodology(self, org_type, ngo_type=None, focus_areas=None):
+    def generate_audit_methodology(self, org_type, ngo_type=None, focus_areas=None, use_cache=True, stream=False):
         """
         Generate an audit methodology
         
@@ -272,9 +534,11 @@ class AuditMethodologyAgent(AIAgent):
             org_type (str): Type of organization (NGO, CBO)
             ngo_type (str, optional): Type of NGO. Defaults to None.
             focus_areas (list, optional): Focus areas of the organization. Defaults to None.
+            use_cache (bool, optional): Whether to reuse a cached response. Defaults to True.
+            stream (bool, optional): Whether to return the text in chunks as it is generated. Defaults to False.
             
         Returns:
-            str: Generated audit methodology
+            str: Generated audit methodology, or an iterator of text chunks when streaming
         """
         try:
             focus_areas_str = ", ".join(focus_areas) if focus_areas else "various social and development areas"
@@ -318,7 +582,15 @@ class AuditMethodologyAgent(AIAgent):
             Include specific references to Ugandan NGO laws and regulations where appropriate.
             """
             
-            response = self._call_api(prompt, max_tokens=2000, temperature=0.2)
+            prompt = self._with_legal_context(
+                prompt,
+                f"{org_type_full} compliance audit governance financial reporting accounts returns {focus_areas_str}"
+            )
+            
+            if stream:
+                return self._stream_api(prompt, max_tokens=2000, temperature=0.2, use_cache=use_cache, feature='audit_methodology')
+            
+            response = self._call_api(prompt, max_tokens=2000, temperature=0.2, use_cache=use_cache, feature='audit_methodology')
             
             # Validate response
             if not self.validate_response(response):
@@ -326,6 +598,173 @@ class AuditMethodologyAgent(AIAgent):
                 
             return response
             
+        except (AIBusyError, TokenBudgetExceeded):
+            raise
+            
         except Exception as e:
             self.logger.error(f"Error generating audit methodology: {str(e)}")
             raise Exception(f"Error generating audit methodology: {str(e)}")
+
+    def generate_compliance_methodology(self, methodology_type, org_name, title, description="", use_cache=True, stream=False):
+        """
+        Generate a compliance methodology for an organization
+        
+        Args:
+            methodology_type (str): Type of methodology (audit, risk_assessment, monitoring)
+            org_name (str): Name of the organization
+            title (str): Title of the methodology
+            description (str, optional): What the methodology should cover. Defaults to "".
+            use_cache (bool, optional): Whether to reuse a cached response. Defaults to True.
+            stream (bool, optional): Whether to return the text in chunks as it is generated. Defaults to False.
+            
+        Returns:
+            str: Generated methodology, or an iterator of text chunks when streaming
+        """
+        try:
+            prompt = f"""
+            Generate a compliance {methodology_type} methodology titled "{title}" for a Ugandan NGO/CBO named "{org_name}".
+            
+            Methodology details:
+            - Organization: {org_name}
+            - Type: {methodology_type}
+            - Title: {title}
+            - Description: {description if description else 'To be determined by the organization'}
+            
+            The methodology should include:
+            1. Purpose, scope and objectives
+            2. Roles and responsibilities
+            3. Step-by-step procedures and the evidence to collect
+            4. Reporting, corrective action and follow-up
+            
+            Format the methodology professionally with proper structure, headings, and subheadings.
+            Include specific references to Ugandan NGO laws and regulations where appropriate.
+            """
+            
+            prompt = self._with_legal_context(prompt, f"{methodology_type} compliance {title} {description}")
+            
+            if stream:
+                return self._stream_api(prompt, max_tokens=2000, temperature=0.2, use_cache=use_cache, feature='compliance_methodology')
+            
+            response = self._call_api(prompt, max_tokens=2000, temperature=0.2, use_cache=use_cache, feature='compliance_methodology')
+            
+            # Validate response
+            if not self.validate_response(response):
+                raise Exception("Failed to generate a valid methodology. Please try again with more specific details.")
+                
+            return response
+            
+        except (AIBusyError, TokenBudgetExceeded):
+            raise
+            
+        except Exception as e:
+            self.logger.error(f"Error generating methodology: {str(e)}")
+            raise Exception(f"Error generating methodology: {str(e)}")
+
+
+class ComplianceAssistantAgent(AIAgent):
+    """AI agent answering compliance questions"""
+    
+    # Most tokens an answer can generate
+    max_answer_tokens = 1000
+    
+    def answer_query(self, query_text, category="general", use_cache=True, stream=False):
+        """
+        Answer a compliance question from an organization
+        
+        Args:
+            query_text (str): Question asked by the user
+            category (str, optional): Query category (registration, financial, governance, program, general). Defaults to "general".
+            use_cache (bool, optional): Whether to reuse a cached response. Defaults to True.
+            stream (bool, optional): Whether to return the text in chunks as it is generated. Defaults to False.
+            
+        Returns:
+            str: Answer, or an iterator of text chunks when streaming
+        """
+        try:
+            prompt = f"""
+            You are a compliance assistant for NGOs and CBOs in Uganda.
+            Answer the following {category} compliance question clearly and practically.
+            
+            Question: {query_text}
+            
+            Explain the relevant requirements, the steps the organization should take and any deadlines or penalties.
+            Keep the answer concise and recommend consulting the NGO Bureau or a legal professional where appropriate.
+            """
+            
+            prompt = self._with_legal_context(prompt, f"{category} {query_text}")
+            
+            if stream:
+                return self._stream_api(prompt, max_tokens=self.max_answer_tokens, temperature=0.2, use_cache=use_cache, feature='assistant_query')
+            
+            response = self._call_api(prompt, max_tokens=self.max_answer_tokens, temperature=0.2, use_cache=use_cache, feature='assistant_query')
+            
+            # Validate response
+            if not self.validate_response(response):
+                raise Exception("Failed to generate a valid answer. Please rephrase your question.")
+                
+            return response
+            
+        except (AIBusyError, TokenBudgetExceeded):
+            raise
+            
+        except Exception as e:
+            self.logger.error(f"Error answering query: {str(e)}")
+            raise Exception(f"Error answering query: {str(e)}")
+
+def generate_document(document_type, organization_name, title, description="", organization_id=None, use_cache=True, stream=False):
+    """
+    Generate a compliance document for the AI assistant
+    
+    Args:
+        document_type (str): Type of document (policy, procedure, report, checklist)
+        organization_name (str): Name of the organization
+        title (str): Title of the document
+        description (str, optional): What the document should cover. Defaults to "".
+        organization_id (int, optional): Organization the document is for. Defaults to None.
+        use_cache (bool, optional): Whether to reuse a cached response. Defaults to True.
+        stream (bool, optional): Whether to return the text in chunks as it is generated. Defaults to False.
+        
+    Returns:
+        str: Generated document, or an iterator of text chunks when streaming
+    """
+    agent = DocumentGenerationAgent(organization_id=organization_id)
+    return agent.generate_compliance_document(
+        document_type, organization_name, title, description or "", use_cache=use_cache, stream=stream
+    )
+
+def generate_methodology(methodology_type, organization_name, title, description="", organization_id=None, use_cache=True, stream=False):
+    """
+    Generate a compliance methodology for the AI assistant
+    
+    Args:
+        methodology_type (str): Type of methodology (audit, risk_assessment, monitoring)
+        organization_name (str): Name of the organization
+        title (str): Title of the methodology
+        description (str, optional): What the methodology should cover. Defaults to "".
+        organization_id (int, optional): Organization the methodology is for. Defaults to None.
+        use_cache (bool, optional): Whether to reuse a cached response. Defaults to True.
+        stream (bool, optional): Whether to return the text in chunks as it is generated. Defaults to False.
+        
+    Returns:
+        str: Generated methodology, or an iterator of text chunks when streaming
+    """
+    agent = AuditMethodologyAgent(organization_id=organization_id)
+    return agent.generate_compliance_methodology(
+        methodology_type, organization_name, title, description or "", use_cache=use_cache, stream=stream
+    )
+
+def ai_error_status(error):
+    """
+    Get the HTTP status to answer an AI call failure with
+    
+    Args:
+        error (Exception): Error raised by an agent
+        
+    Returns:
+        int: 429 when no call slot was free, 402 when the token budget is used up, or None for other errors
+    """
+    if isinstance(error, AIBusyError):
+        return 429
+    if isinstance(error, TokenBudgetExceeded):
+        return 402
+    return None
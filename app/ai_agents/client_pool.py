@@ -0,0 +1,210 @@
+from flask import current_app
+from collections import Counter
+from contextlib import contextmanager
+import logging
+import threading
+import time
+
+class AIBusyError(Exception):
+    """Raised when no AI call slot became free in time"""
+    pass
+
+class AnthropicClientPool:
+    """Shared Anthropic client and concurrency limits for this process
+
+    One client is kept per API key. The SDK client is thread-safe and its
+    HTTP connection pool keeps connections alive, so calls reuse TLS
+    sessions instead of opening a connection each time.
+
+    Every call holds a slot while it talks to the API. There are at most
+    ANTHROPIC_MAX_CONCURRENCY slots in the process and
+    ANTHROPIC_MAX_CONCURRENCY_PER_ORG per organization, so one
+    organization cannot take every slot. Callers wait up to
+    ANTHROPIC_QUEUE_TIMEOUT seconds for a slot before AIBusyError is
+    raised. Time spent waiting is recorded for stats().
+    """
+
+    def __init__(self):
+        self._clients = {}
+        self._slots = None
+        self._org_slots = {}
+        self._lock = threading.Lock()
+        self._app = None
+        self._counters = Counter()
+        self._in_flight = 0
+        self._max_wait = 0.0
+        self.logger = logging.getLogger(__name__)
+
+    def init_app(self, app):
+        """
+        Bind the pool to an application
+
+        Args:
+            app: Flask application instance
+        """
+        app.config.setdefault('ANTHROPIC_MAX_CONCURRENCY', 8)
+        app.config.setdefault('ANTHROPIC_MAX_CONCURRENCY_PER_ORG', 4)
+        app.config.setdefault('ANTHROPIC_QUEUE_TIMEOUT', 30)
+        app.config.setdefault('ANTHROPIC_TIMEOUT', 120)
+        app.config.setdefault('ANTHROPIC_CONNECT_TIMEOUT', 10)
+        app.config.setdefault('ANTHROPIC_MAX_RETRIES', 2)
+
+        with self._lock:
+            self._app = app
+            self._slots = threading.BoundedSemaphore(app.config['ANTHROPIC_MAX_CONCURRENCY'])
+            self._org_slots = {}
+
+    def get_client(self, api_key):
+        """
+        Get the shared client for an API key, creating it on first use
+
+        Args:
+            api_key (str): Anthropic API key
+
+        Returns:
+            anthropic.Anthropic: Thread-safe client
+        """
+        self._ensure_app()
+
+        with self._lock:
+            client = self._clients.get(api_key)
+            if client is None:
+                client = self._clients[api_key] = self._create_client(api_key)
+            return client
+
+    @contextmanager
+    def slot(self, organization_id=None):
+        """
+        Hold a call slot for the duration of the block
+
+        Args:
+            organization_id (int, optional): Organization the call is made for. Defaults to None.
+
+        Raises:
+            AIBusyError: If no slot became free within ANTHROPIC_QUEUE_TIMEOUT
+        """
+        self._ensure_app()
+
+        timeout = self._app.config['ANTHROPIC_QUEUE_TIMEOUT']
+        started = time.monotonic()
+
+        # Take the organization's slot first, so a busy organization waits
+        # without holding one of the shared slots
+        org_slots = self._org_semaphore(organization_id) if organization_id else None
+
+        try:
+            if org_slots is not None and not org_slots.acquire(timeout=timeout):
+                self._reject(organization_id, started)
+
+            remaining = max(timeout - (time.monotonic() - started), 0)
+            if not self._slots.acquire(timeout=remaining):
+                if org_slots is not None:
+                    org_slots.release()
+                self._reject(organization_id, started)
+
+            waited = time.monotonic() - started
+            self._record_start(waited)
+
+            if waited >= 1:
+                self.logger.info(f"AI call for organization {organization_id} waited {waited:.1f}s for a slot")
+
+            try:
+                yield
+            finally:
+                self._slots.release()
+                if org_slots is not None:
+                    org_slots.release()
+
+                with self._lock:
+                    self._in_flight -= 1
+        finally:
+            if org_slots is not None:
+                self._release_org_semaphore(organization_id)
+
+    def stats(self):
+        """
+        Get this process's call and queue-wait counters
+
+        Returns:
+            dict: Calls, rejections, calls in flight and wait times in milliseconds
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            stats['in_flight'] = self._in_flight
+            stats['max_wait_ms'] = round(self._max_wait * 1000, 1)
+            stats['clients'] = len(self._clients)
+
+        calls = stats.get('calls', 0)
+        stats['average_wait_ms'] = round(stats.pop('wait_seconds', 0) * 1000 / calls, 1) if calls else 0.0
+
+        return stats
+
+    def close(self):
+        """Close the clients and their connections"""
+        with self._lock:
+            clients, self._clients = self._clients, {}
+
+        for client in clients.values():
+            try:
+                client.close()
+            except Exception as e:
+                self.logger.warning(f"Error closing Anthropic client: {str(e)}")
+
+    def _ensure_app(self):
+        if self._app is None:
+            self.init_app(current_app._get_current_object())
+
+    def _create_client(self, api_key):
+        # The SDK is slow to import, so it is loaded with the first client
+        import anthropic
+        import httpx
+
+        config = self._app.config
+        limit = config['ANTHROPIC_MAX_CONCURRENCY']
+
+        return anthropic.Anthropic(
+            api_key=api_key,
+            timeout=httpx.Timeout(config['ANTHROPIC_TIMEOUT'], connect=config['ANTHROPIC_CONNECT_TIMEOUT']),
+            max_retries=config['ANTHROPIC_MAX_RETRIES'],
+            http_client=anthropic.DefaultHttpxClient(
+                limits=httpx.Limits(max_connections=limit, max_keepalive_connections=limit)
+            )
+        )
+
+    def _org_semaphore(self, organization_id):
+        # Semaphores are counted by the calls waiting on or holding them and
+        # dropped when the last one leaves, so idle organizations cost nothing
+        with self._lock:
+            entry = self._org_slots.get(organization_id)
+            if entry is None:
+                entry = self._org_slots[organization_id] = [
+                    threading.BoundedSemaphore(self._app.config['ANTHROPIC_MAX_CONCURRENCY_PER_ORG']), 0
+                ]
+            entry[1] += 1
+            return entry[0]
+
+    def _release_org_semaphore(self, organization_id):
+        with self._lock:
+            entry = self._org_slots[organization_id]
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._org_slots[organization_id]
+
+    def _record_start(self, waited):
+        with self._lock:
+            self._counters['calls'] += 1
+            self._counters['wait_seconds'] += waited
+            self._in_flight += 1
+            self._max_wait = max(self._max_wait, waited)
+
+    def _reject(self, organization_id, started):
+        with self._lock:
+            self._counters['rejected'] += 1
+
+        waited = time.monotonic() - started
+        self.logger.warning(f"AI call for organization {organization_id} rejected after waiting {waited:.1f}s for a slot")
+
+        raise AIBusyError("The AI service is busy. Please try again in a moment.")
+
+# Process-wide pool
+anthropic_pool = AnthropicClientPool()
@@ -0,0 +1,255 @@
+from flask import current_app
+from sqlalchemy import func, or_
+from app.models.ai_assistant_models import AIComplianceTemplate
+from app.ai_agents.faq_answers import DEFAULT_FAQ_ANSWERS
+from app.ai_agents.retrieval import STOP_WORDS
+from app import db
+from collections import namedtuple
+import logging
+import math
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Canned answer returned by a search, with how well it covers the question (0-1)
+FAQAnswer = namedtuple('FAQAnswer', ['template_id', 'title', 'category', 'text', 'confidence'])
+
+# Template document type of FAQ answers
+FAQ_DOCUMENT_TYPE = 'faq'
+
+# Confidence is scaled by this when an answer belongs to another category
+CATEGORY_MISMATCH_FACTOR = 0.85
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Question phrasing and words every answer is about, which say nothing about the topic
+FAQ_STOP_WORDS = STOP_WORDS | frozenset("""
+what how do does did can could should would i we our my me us you your need needs want know about
+when where why tell please explain get much many ngo ngos cbo cbos organization organisation
+organizations organisations uganda ugandan
+""".split())
+
+def faq_terms(text):
+    """Split text into FAQ index terms, dropping stop words and plural endings"""
+    terms = set()
+
+    for token in _TOKEN_RE.findall((text or '').lower()):
+        if token in FAQ_STOP_WORDS or len(token) < 2:
+            continue
+        if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        terms.add(token)
+
+    return terms
+
+class FAQIndex:
+    """Inverted index from question keywords to canned answers
+
+    Every answer is indexed by the terms of its question and keywords. The
+    confidence of a match is the share of the query's terms, weighted by
+    inverse document frequency, that the answer covers. Terms no answer
+    knows get the highest weight, so questions about anything else score
+    low and are left to the language model.
+    """
+
+    def __init__(self):
+        self.entries = {}  # template ID -> (title, category, organization ID, public, text, terms)
+        self.postings = {}  # term -> set of template IDs
+
+    def add(self, template_id, title, keywords, category, organization_id, is_public, text):
+        """Index an answer under the terms of its question and keywords"""
+        terms = faq_terms(f'{title} {keywords}')
+        if not terms:
+            return
+
+        for term in terms:
+            self.postings.setdefault(term, set()).add(template_id)
+
+        self.entries[template_id] = (title, category, organization_id, is_public, text, terms)
+
+    def search(self, query, category=None, organization_id=None, k=1):
+        """
+        Get the answers that best cover a question
+
+        Args:
+            query (str): Question asked by the user
+            category (str, optional): Category the user chose. Defaults to None.
+            organization_id (int, optional): Organization asking, whose private answers are included. Defaults to None.
+            k (int, optional): Number of answers. Defaults to 1.
+
+        Returns:
+            list: FAQAnswer tuples, best match first
+        """
+        terms = faq_terms(query)
+        if not terms or not self.entries:
+            return []
+
+        count = len(self.entries)
+        weights = {
+            term: math.log((count + 1) / (len(self.postings.get(term, ())) + 0.5))
+            for term in terms
+        }
+        query_weight = sum(weights.values())
+
+        matched = {}
+        for term, weight in weights.items():
+            for template_id in self.postings.get(term, ()):
+                matched[template_id] = matched.get(template_id, 0.0) + weight
+
+        ranked = []
+        for template_id, weight in matched.items():
+            title, entry_category, entry_organization_id, is_public, text, entry_terms = self.entries[template_id]
+
+            if not is_public and entry_organization_id != organization_id:
+                continue
+
+            confidence = weight / query_weight
+            if category and category != 'general' and entry_category != category:
+                confidence *= CATEGORY_MISMATCH_FACTOR
+
+            # Among equally confident answers, prefer the one the question covers best
+            specificity = len(terms & entry_terms) / len(entry_terms)
+            ranked.append((confidence, specificity, template_id))
+
+        ranked.sort(reverse=True)
+
+        return [
+            FAQAnswer(template_id, title, entry_category, text, round(confidence, 3))
+            for confidence, _, template_id in ranked[:k]
+            for title, entry_category, _, _, text, _ in [self.entries[template_id]]
+        ]
+
+class FAQStore:
+    """Process-wide FAQ index, rebuilt when the FAQ templates change"""
+
+    def __init__(self):
+        self._index = None
+        self._signature = None
+        self._lock = threading.Lock()
+        self._last_sync = 0.0
+
+    def search(self, query, category=None, organization_id=None, k=1):
+        """Search the index after rebuilding it if the templates changed"""
+        with self._lock:
+            self._ensure_fresh()
+            index = self._index
+
+        return index.search(query, category, organization_id, k)
+
+    def rebuild(self):
+        """
+        Re-index every FAQ template
+
+        Returns:
+            int: Number of indexed answers
+        """
+        with self._lock:
+            self._ensure_fresh(force=True)
+            return len(self._index.entries)
+
+    def _ensure_fresh(self, force=False):
+        interval = current_app.config.get('AI_FAQ_SYNC_INTERVAL', 60)
+        if self._index is not None and not force and time.monotonic() - self._last_sync < interval:
+            return
+
+        self._last_sync = time.monotonic()
+
+        # Count and last edit of the templates; any addition, change or deletion moves one of them
+        signature = tuple(_faq_templates().with_entities(
+            func.count(AIComplianceTemplate.id), func.max(AIComplianceTemplate.updated_at)
+        ).one())
+
+        if self._index is not None and not force and signature == self._signature:
+            return
+
+        self._index = _build_index()
+        self._signature = signature
+
+# Process-wide store
+faq_store = FAQStore()
+
+def _faq_templates():
+    return AIComplianceTemplate.query.filter(
+        AIComplianceTemplate.document_type == FAQ_DOCUMENT_TYPE,
+        or_(AIComplianceTemplate.is_public == True, AIComplianceTemplate.organization_id.isnot(None))
+    )
+
+def _build_index():
+    index = FAQIndex()
+
+    for template in _faq_templates():
+        category = template.get_variables().get('category', 'general')
+        index.add(
+            template.id, template.title, template.description, category,
+            template.organization_id, bool(template.is_public), (template.content or '').strip()
+        )
+
+    return index
+
+def find_faq_answer(query_text, category=None, organization_id=None):
+    """
+    Get the canned answer that best covers a question
+
+    Args:
+        query_text (str): Question asked by the user
+        category (str, optional): Category the user chose. Defaults to None.
+        organization_id (int, optional): Organization asking. Defaults to None.
+
+    Returns:
+        FAQAnswer: Best answer, or None if no answer shares a term with the question
+    """
+    started = time.perf_counter()
+    answers = faq_store.search(query_text, category, organization_id)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    if not answers:
+        logger.debug(f"No FAQ answer for query ({elapsed_ms:.2f}ms)")
+        return None
+
+    logger.debug(f"FAQ answer {answers[0].template_id} with confidence {answers[0].confidence} ({elapsed_ms:.2f}ms)")
+
+    return answers[0]
+
+def is_confident(answer):
+    """Whether a FAQ answer is good enough to serve without asking the language model"""
+    return answer is not None and answer.confidence >= current_app.config.get('AI_FAQ_MIN_CONFIDENCE', 0.6)
+
+def seed_faq_answers():
+    """
+    Add the default FAQ answers that are missing from the templates
+
+    Answers are matched by question, so edited answers are kept.
+
+    Returns:
+        int: Number of answers added
+    """
+    existing = {
+        row[0] for row in db.session.query(AIComplianceTemplate.title).filter(
+            AIComplianceTemplate.document_type == FAQ_DOCUMENT_TYPE,
+            AIComplianceTemplate.organization_id.is_(None)
+        )
+    }
+
+    added = 0
+    for answer in DEFAULT_FAQ_ANSWERS:
+        if answer['title'] in existing:
+            continue
+
+        template = AIComplianceTemplate(
+            title=answer['title'],
+            description=answer['keywords'],
+            document_type=FAQ_DOCUMENT_TYPE,
+            content=answer['content'].strip(),
+            is_public=True
+        )
+        template.set_variables({'category': answer['category']})
+
+        db.session.add(template)
+        added += 1
+
+    if added:
+        db.session.commit()
+
+    return added
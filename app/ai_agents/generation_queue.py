@@ -0,0 +1,425 @@
+from flask import current_app
+from sqlalchemy import update
+from app import db
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import atexit
+import logging
+import threading
+
+# Kind of generation job: model of its rows, function generating the text of
+# a claimed row, function saving the text to the row, and optional callbacks
+# run once a job has completed or failed
+JobKind = namedtuple('JobKind', ['model', 'generate', 'save', 'on_failure', 'on_success'])
+
+# Seconds a queued job may wait before a status poll hands it to this process
+REQUEUE_GRACE = 30
+
+# Seconds a follower waits for new text before it is given a keep-alive
+HEARTBEAT_INTERVAL = 15
+
+class JobProgress:
+    """Text generated so far by a job running in this process"""
+
+    def __init__(self):
+        self.chunks = []
+        self.finished = False
+        self._condition = threading.Condition()
+
+    def publish(self, text):
+        """Add a chunk of generated text and wake the followers"""
+        with self._condition:
+            self.chunks.append(text)
+            self._condition.notify_all()
+
+    def finish(self):
+        """Mark the job as stopped and wake the followers"""
+        with self._condition:
+            self.finished = True
+            self._condition.notify_all()
+
+    def wait(self, index, timeout):
+        """
+        Wait for chunks after the given index
+
+        Returns:
+            tuple: New chunks and whether the job has stopped
+        """
+        with self._condition:
+            if index >= len(self.chunks) and not self.finished:
+                self._condition.wait(timeout)
+            return self.chunks[index:], self.finished
+
+class GenerationQueue:
+    """Thread pool that runs AI generations outside request threads
+
+    The database is the queue: a route saves a row with status 'queued' and
+    everything the generation needs, then submits its ID. A worker claims
+    the row by switching it to 'processing' with a conditional update, so a
+    job submitted by several processes runs once. The worker streams the
+    text from the API, saves it to the row and the status moves to
+    'completed' or 'failed'. While a job submitted by this process runs,
+    follow() relays its text as it is generated, e.g. to a server-sent
+    event stream; a follower going away does not affect the job.
+
+    Queued rows survive restarts. They are resubmitted the first time a
+    process submits a job, when a status poll finds one that has waited
+    longer than REQUEUE_GRACE, and by the ``ai-jobs --resume`` command.
+    Rows still processing AI_GENERATION_TIMEOUT seconds after they were
+    claimed, e.g. because the process running them exited, are failed when
+    polled. Completing and failing are conditional on the row still
+    processing, so a job that timed out is not completed afterwards and its
+    callbacks run once.
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._lock = threading.Lock()
+        self._app = None
+        self._kinds = {}
+        self._inflight = {}  # (kind, row ID) -> JobProgress of jobs submitted by this process
+        self._resumed = False
+        self.logger = logging.getLogger(__name__)
+
+    def init_app(self, app):
+        """
+        Bind the queue to an application and register the pool shutdown
+
+        Args:
+            app: Flask application instance
+        """
+        app.config.setdefault('AI_GENERATION_WORKERS', 4)
+        app.config.setdefault('AI_GENERATION_TIMEOUT', 900)
+
+        if self._app is None:
+            atexit.register(self.shutdown)
+
+        self._app = app
+
+    def register(self, kind, model, generate, save, on_failure=None, on_success=None):
+        """
+        Register a kind of generation job
+
+        The model needs ``status``, ``error_message`` and ``created_at``
+        columns. ``started_at`` and ``completed_at`` columns are filled in
+        when the model has them.
+
+        Args:
+            kind (str): Name of the job kind
+            model: SQLAlchemy model whose rows track the jobs
+            generate (callable): Function taking a claimed row and ``stream=True``, returning an iterator of text chunks
+            save (callable): Function taking the row and the generated text, filling in the row
+            on_failure (callable, optional): Function taking a row whose job failed. Defaults to None.
+            on_success (callable, optional): Function taking a row whose job completed. Defaults to None.
+        """
+        self._kinds[kind] = JobKind(model, generate, save, on_failure, on_success)
+
+    def submit(self, kind, record_id):
+        """
+        Queue a generation to run in the background
+
+        Args:
+            kind (str): Registered job kind
+            record_id (int): ID of a row with status 'queued'
+        """
+        if self._app is None:
+            self.init_app(current_app._get_current_object())
+
+        if not self._resumed:
+            self._resumed = True
+            self.resume_pending()
+
+        self._enqueue(kind, record_id)
+
+    def resume_pending(self):
+        """
+        Submit every queued job of every registered kind
+
+        Returns:
+            int: Number of jobs submitted
+        """
+        if self._app is None:
+            self.init_app(current_app._get_current_object())
+
+        submitted = 0
+
+        for kind, job_kind in list(self._kinds.items()):
+            record_ids = [
+                row[0] for row in db.session.query(job_kind.model.id).filter(
+                    job_kind.model.status == 'queued'
+                ).order_by(job_kind.model.created_at)
+            ]
+
+            for record_id in record_ids:
+                submitted += self._enqueue(kind, record_id)
+
+        return submitted
+
+    def check(self, kind, record):
+        """
+        Recover the job of a row being polled
+
+        A queued job that no process has picked up within REQUEUE_GRACE
+        seconds is submitted here, and a job claimed more than
+        AI_GENERATION_TIMEOUT seconds ago is marked as failed.
+
+        Args:
+            kind (str): Registered job kind
+            record: Row of the job
+
+        Returns:
+            bool: True if the row was changed or resubmitted
+        """
+        now = datetime.utcnow()
+
+        if record.status == 'queued':
+            if record.created_at > now - timedelta(seconds=REQUEUE_GRACE):
+                return False
+            self.submit(kind, record.id)
+            return True
+
+        timeout = current_app.config.get('AI_GENERATION_TIMEOUT', 900)
+        started_at = getattr(record, 'started_at', None) or record.created_at
+
+        if record.status != 'processing' or started_at > now - timedelta(seconds=timeout):
+            return False
+
+        failed = self._fail(kind, record.id, 'Generation timed out')
+        db.session.refresh(record)
+
+        return failed
+
+    def follow(self, kind, record_id):
+        """
+        Relay the text of a job submitted by this process as it is generated
+
+        Args:
+            kind (str): Registered job kind
+            record_id (int): ID of the job's row
+
+        Yields:
+            str: Chunks of generated text, from the start, or None when no
+                text arrived for HEARTBEAT_INTERVAL seconds. Nothing is
+                yielded if the job is not queued or running in this process.
+        """
+        with self._lock:
+            progress = self._inflight.get((kind, record_id))
+
+        if progress is None:
+            return
+
+        index = 0
+        while True:
+            chunks, finished = progress.wait(index, HEARTBEAT_INTERVAL)
+            index += len(chunks)
+
+            yield from chunks
+
+            if finished:
+                return
+            if not chunks:
+                yield None
+
+    def current_status(self, kind, record_id):
+        """
+        Read the status of a job as last committed
+
+        Args:
+            kind (str): Registered job kind
+            record_id (int): ID of the job's row
+
+        Returns:
+            tuple: Status and error message
+        """
+        # End the current read transaction to see the worker's commits
+        db.session.rollback()
+
+        record = db.session.get(self._kinds[kind].model, record_id)
+        return record.status, record.error_message
+
+    def shutdown(self, wait=False):
+        """
+        Stop the worker threads
+
+        Args:
+            wait (bool, optional): Finish submitted jobs first instead of
+                leaving them queued in the database. Defaults to False.
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=not wait)
+
+    def _enqueue(self, kind, record_id):
+        with self._lock:
+            if (kind, record_id) in self._inflight:
+                return 0
+            self._inflight[(kind, record_id)] = JobProgress()
+
+        self._get_executor().submit(self._run, kind, record_id)
+
+        return 1
+
+    def _run(self, kind, record_id):
+        with self._lock:
+            progress = self._inflight[(kind, record_id)]
+
+        try:
+            with self._app.app_context():
+                self._process(kind, record_id, progress)
+        finally:
+            with self._lock:
+                self._inflight.pop((kind, record_id), None)
+            progress.finish()
+
+    def claim(self, kind, record_id):
+        """
+        Take a queued job for this process to run
+
+        Args:
+            kind (str): Registered job kind
+            record_id (int): ID of the job's row
+
+        Returns:
+            The row, now processing, or None if the job is not queued
+        """
+        model = self._kinds[kind].model
+        values = {'status': 'processing'}
+        if hasattr(model, 'started_at'):
+            values['started_at'] = datetime.utcnow()
+
+        # Conditional update; another process may already have the job
+        claimed = db.session.execute(
+            update(model)
+            .where(model.id == record_id, model.status == 'queued')
+            .values(**values)
+        ).rowcount
+        db.session.commit()
+
+        return db.session.get(model, record_id) if claimed else None
+
+    def complete(self, kind, record):
+        """
+        Mark a claimed job as completed and save its row
+
+        The output is only saved if the job is still processing; a job that
+        timed out or failed meanwhile stays failed.
+
+        Args:
+            kind (str): Registered job kind
+            record: Row of the job, with the generated output filled in
+
+        Returns:
+            bool: True if the job was completed
+        """
+        job_kind = self._kinds[kind]
+        model = job_kind.model
+        record_id = record.id
+
+        values = {'status': 'completed'}
+        if hasattr(model, 'completed_at'):
+            values['completed_at'] = datetime.utcnow()
+
+        # Write the generated output, then complete it in the same transaction
+        db.session.flush()
+        completed = db.session.execute(
+            update(model)
+            .where(model.id == record_id, model.status == 'processing')
+            .values(**values)
+        ).rowcount
+
+        if not completed:
+            db.session.rollback()
+            self.logger.warning(f"Discarding output of {kind} generation {record_id}, which is no longer processing")
+            return False
+
+        db.session.commit()
+
+        if job_kind.on_success is not None:
+            try:
+                job_kind.on_success(db.session.get(model, record_id))
+            except Exception as e:
+                self.logger.error(f"Error finishing {kind} generation {record_id}: {str(e)}")
+
+        return True
+
+    def fail(self, kind, record_id, message):
+        """
+        Mark a claimed job as failed, discarding unsaved changes to its row
+
+        Args:
+            kind (str): Registered job kind
+            record_id (int): ID of the job's row
+            message (str): Error shown to the user
+
+        Returns:
+            bool: True if the job was failed, False if it had already finished
+        """
+        db.session.rollback()
+
+        return self._fail(kind, record_id, message)
+
+    def _process(self, kind, record_id, progress):
+        record = self.claim(kind, record_id)
+        if record is None:
+            return
+
+        job_kind = self._kinds[kind]
+
+        try:
+            parts = []
+            for text in job_kind.generate(record, stream=True):
+                parts.append(text)
+                progress.publish(text)
+
+            content = ''.join(parts)
+            if not content.strip():
+                raise ValueError('The AI service returned an empty response')
+
+            job_kind.save(record, content)
+        except Exception as e:
+            self.logger.error(f"Error running {kind} generation {record_id}: {str(e)}")
+            self.fail(kind, record_id, str(e))
+        else:
+            self.complete(kind, record)
+
+    def _fail(self, kind, record_id, message):
+        job_kind = self._kinds[kind]
+        model = job_kind.model
+
+        values = {'status': 'failed', 'error_message': message}
+        if hasattr(model, 'completed_at'):
+            values['completed_at'] = datetime.utcnow()
+
+        # Conditional, so a job that just completed or already failed is left alone
+        failed = db.session.execute(
+            update(model)
+            .where(model.id == record_id, model.status == 'processing')
+            .values(**values)
+        ).rowcount
+        db.session.commit()
+
+        if not failed:
+            return False
+
+        if job_kind.on_failure is not None:
+            try:
+                job_kind.on_failure(db.session.get(model, record_id))
+            except Exception as e:
+                self.logger.error(f"Error cleaning up {kind} generation {record_id}: {str(e)}")
+
+        return True
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._app.config['AI_GENERATION_WORKERS'],
+                    thread_name_prefix='ai-generation'
+                )
+            return self._executor
+
+# Process-wide queue
+generation_queue = GenerationQueue()
@@ -0,0 +1,277 @@
+from flask import current_app
+from sqlalchemy import bindparam, delete
+from sqlalchemy.orm import Session
+from app.models.ai_assistant_models import AIResponseCache
+from app.utils.usage_metering import dialect_insert
+from app import db
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta
+import atexit
+import hashlib
+import json
+import logging
+import threading
+import time
+
+def response_cache_key(model, prompt, max_tokens, temperature):
+    """
+    Get the canonical cache key of an API request
+
+    Surrounding whitespace of every prompt line is ignored, so prompts that
+    differ only in source indentation share a key.
+
+    Args:
+        model (str): Model name
+        prompt (str): Prompt text
+        max_tokens (int): Maximum tokens to generate
+        temperature (float): Sampling temperature
+
+    Returns:
+        str: Hex sha256 digest
+    """
+    canonical_prompt = '\n'.join(line.strip() for line in prompt.strip().splitlines())
+    payload = json.dumps(
+        {'model': model, 'prompt': canonical_prompt, 'max_tokens': int(max_tokens), 'temperature': float(temperature)},
+        sort_keys=True
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class ResponseCache:
+    """Two-level cache of AI responses
+
+    Recent responses are kept in a per-process LRU dictionary. Every
+    response is also written to the AIResponseCache table, so cached
+    generations are shared between workers and survive restarts. Entries
+    expire AI_CACHE_TTL seconds after they were stored.
+
+    Hits from either level are counted in memory and added to the stored
+    hit counts at most every AI_CACHE_HIT_FLUSH_INTERVAL seconds, so a hit
+    does not cost a write transaction.
+    """
+
+    def __init__(self):
+        self._memory = OrderedDict()  # key -> (response text, expiry timestamp)
+        self._lock = threading.Lock()
+        self._counters = Counter()
+        self._hits = {}  # key -> (hits since the last flush, time of the latest hit)
+        self._last_hit_flush = time.monotonic()
+        self._app = None
+        self.logger = logging.getLogger(__name__)
+
+    def is_cacheable(self, temperature):
+        """Whether responses at this temperature are deterministic enough to reuse"""
+        return (
+            current_app.config.get('AI_CACHE_TTL', 7 * 24 * 3600) > 0 and
+            temperature <= current_app.config.get('AI_CACHE_MAX_TEMPERATURE', 0.5)
+        )
+
+    def get(self, key):
+        """
+        Get a cached response
+
+        Args:
+            key (str): Key from response_cache_key
+
+        Returns:
+            str: Cached response text, or None on a miss
+        """
+        now = time.time()
+        text = None
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._memory.move_to_end(key)
+                    self._counters['memory_hits'] += 1
+                    text = entry[0]
+                else:
+                    del self._memory[key]
+
+        if text is None:
+            try:
+                text = self._load(key)
+            except Exception as e:
+                self.logger.warning(f"Error reading AI response cache: {str(e)}")
+                text = None
+
+            with self._lock:
+                self._counters['store_hits' if text is not None else 'misses'] += 1
+
+        if text is not None:
+            self._count_hit(key)
+
+        return text
+
+    def set(self, key, model, text):
+        """
+        Cache a response in memory and in the persistent store
+
+        Args:
+            key (str): Key from response_cache_key
+            model (str): Model that generated the response
+            text (str): Response text
+        """
+        ttl = current_app.config.get('AI_CACHE_TTL', 7 * 24 * 3600)
+
+        self._remember(key, text, time.time() + ttl)
+
+        try:
+            self._store(key, model, text, datetime.utcnow() + timedelta(seconds=ttl))
+        except Exception as e:
+            self.logger.warning(f"Error writing AI response cache: {str(e)}")
+
+        with self._lock:
+            self._counters['stores'] += 1
+
+    def record_bypass(self):
+        """Count a call that skipped the cache"""
+        with self._lock:
+            self._counters['bypassed'] += 1
+
+    def stats(self):
+        """
+        Get this process's cache counters
+
+        Returns:
+            dict: Hits, misses, stores, bypassed calls, memory size and hit rate
+        """
+        with self._lock:
+            stats = dict(self._counters)
+            stats['memory_entries'] = len(self._memory)
+
+        hits = stats.get('memory_hits', 0) + stats.get('store_hits', 0)
+        lookups = hits + stats.get('misses', 0)
+        stats['hit_rate'] = round(hits / lookups, 3) if lookups else 0.0
+
+        return stats
+
+    def clear_memory(self):
+        """Drop all entries held in this process"""
+        with self._lock:
+            self._memory.clear()
+
+    def flush_hits(self):
+        """Add the hits counted in this process to the stored hit counts"""
+        with self._lock:
+            pending, self._hits = self._hits, {}
+            self._last_hit_flush = time.monotonic()
+
+        if not pending or self._app is None:
+            return
+
+        table = AIResponseCache.__table__
+        stmt = table.update().where(table.c.cache_key == bindparam('key')).values(
+            hit_count=table.c.hit_count + bindparam('hits'),
+            last_hit_at=bindparam('last_hit')
+        )
+
+        try:
+            with self._app.app_context(), Session(db.engine) as session:
+                session.execute(stmt, [
+                    {'key': key, 'hits': hits, 'last_hit': last_hit}
+                    for key, (hits, last_hit) in pending.items()
+                ])
+                session.commit()
+        except Exception as e:
+            # Hit counts are statistics; losing a batch is not worth retrying
+            self.logger.warning(f"Error writing AI response cache hits: {str(e)}")
+
+    def _count_hit(self, key):
+        if self._app is None:
+            self._app = current_app._get_current_object()
+            atexit.register(self.flush_hits)
+
+        interval = self._app.config.get('AI_CACHE_HIT_FLUSH_INTERVAL', 60)
+
+        with self._lock:
+            hits = self._hits.get(key, (0, None))[0]
+            self._hits[key] = (hits + 1, datetime.utcnow())
+            due = time.monotonic() - self._last_hit_flush >= interval
+
+        if due:
+            self.flush_hits()
+
+    def _remember(self, key, text, expires):
+        max_entries = current_app.config.get('AI_CACHE_MAX_ENTRIES', 1000)
+
+        with self._lock:
+            self._memory[key] = (text, expires)
+            self._memory.move_to_end(key)
+
+            # Evict least recently used entries
+            while len(self._memory) > max_entries:
+                self._memory.popitem(last=False)
+
+    def _load(self, key):
+        now = datetime.utcnow()
+
+        # A separate session keeps the lookup out of the caller's transaction
+        with Session(db.engine) as session:
+            row = session.query(AIResponseCache.response_text, AIResponseCache.expires_at).filter(
+                AIResponseCache.cache_key == key,
+                AIResponseCache.expires_at > now
+            ).first()
+
+            if row is None:
+                return None
+
+        expires = time.time() + (row.expires_at - now).total_seconds()
+        self._remember(key, row.response_text, expires)
+
+        return row.response_text
+
+    def _store(self, key, model, text, expires_at):
+        table = AIResponseCache.__table__
+        insert = dialect_insert(table)
+        values = {
+            'cache_key': key,
+            'model': model,
+            'response_text': text,
+            'hit_count': 0,
+            'created_at': datetime.utcnow(),
+            'expires_at': expires_at
+        }
+
+        with Session(db.engine) as session:
+            if insert is not None:
+                stmt = insert.values(**values)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=['cache_key'],
+                    set_={
+                        'response_text': stmt.excluded.response_text,
+                        'created_at': stmt.excluded.created_at,
+                        'expires_at': stmt.excluded.expires_at
+                    }
+                )
+                session.execute(stmt)
+            else:
+                session.execute(delete(AIResponseCache).where(AIResponseCache.cache_key == key))
+                session.execute(table.insert().values(**values))
+
+            session.commit()
+
+# Process-wide cache
+response_cache = ResponseCache()
+
+def prune_response_cache(clear=False):
+    """
+    Delete expired entries from the persistent response cache
+
+    Args:
+        clear (bool, optional): Delete every entry instead. Defaults to False.
+
+    Returns:
+        int: Number of entries deleted
+    """
+    stmt = delete(AIResponseCache)
+    if not clear:
+        stmt = stmt.where(AIResponseCache.expires_at <= datetime.utcnow())
+
+    deleted = db.session.execute(stmt).rowcount
+    db.session.commit()
+
+    if clear:
+        response_cache.clear_memory()
+
+    return deleted
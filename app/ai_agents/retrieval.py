@@ -0,0 +1,333 @@
+from flask import current_app
+from sqlalchemy import func
+from app.models.models import LegalDocument
+from app.models.ai_assistant_models import RegulatoryUpdate
+from app import db
+from collections import Counter, namedtuple
+import heapq
+import logging
+import math
+import os
+import pickle
+import re
+import tempfile
+import threading
+import time
+
+# Passage of a legal source returned by a search
+Passage = namedtuple('Passage', ['kind', 'source_id', 'title', 'text', 'score'])
+
+# Chunking: passages of about CHUNK_WORDS words, overlapping by CHUNK_OVERLAP
+CHUNK_WORDS = 120
+CHUNK_OVERLAP = 20
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Rough size of a token, used to turn the token budget into characters
+CHARS_PER_TOKEN = 4
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+STOP_WORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the this to was were will with
+shall may must any all such other which who whom their there these those under upon not no
+""".split())
+
+# Sources indexed for retrieval: kind -> (model, title column, text column, version column)
+SOURCES = {
+    'legal_document': (LegalDocument, LegalDocument.title, LegalDocument.content, LegalDocument.last_updated),
+    'regulatory_update': (RegulatoryUpdate, RegulatoryUpdate.title, RegulatoryUpdate.description, RegulatoryUpdate.updated_at),
+}
+
+def tokenize(text):
+    """Split text into lowercase index terms, dropping stop words"""
+    return [token for token in _TOKEN_RE.findall((text or '').lower()) if token not in STOP_WORDS and len(token) > 1]
+
+def chunk_text(text, words=CHUNK_WORDS, overlap=CHUNK_OVERLAP):
+    """
+    Split text into overlapping passages of about the given number of words
+
+    Args:
+        text (str): Text to split
+        words (int, optional): Words per passage. Defaults to CHUNK_WORDS.
+        overlap (int, optional): Words shared by consecutive passages. Defaults to CHUNK_OVERLAP.
+
+    Returns:
+        list: Passage texts
+    """
+    tokens = (text or '').split()
+    if not tokens:
+        return []
+
+    step = max(words - overlap, 1)
+    chunks = []
+
+    for start in range(0, len(tokens), step):
+        chunks.append(' '.join(tokens[start:start + words]))
+        if start + words >= len(tokens):
+            break
+
+    return chunks
+
+class RetrievalIndex:
+    """BM25 inverted index over passages of legal documents and regulatory updates
+
+    The index lives in memory and is persisted to disk with pickle. It is
+    brought up to date incrementally: only sources whose version (last
+    update time and text length) changed are re-chunked, and deleted
+    sources are dropped.
+    """
+
+    def __init__(self):
+        self.chunks = {}  # chunk ID -> (kind, source ID, title, text, length)
+        self.postings = {}  # term -> {chunk ID: term frequency}
+        self.sources = {}  # (kind, source ID) -> (version, [chunk IDs])
+        self.next_chunk_id = 0
+        self.total_length = 0
+
+    def add_source(self, kind, source_id, version, title, text):
+        """Index a source, replacing any earlier version of it"""
+        self.remove_source(kind, source_id)
+
+        chunk_ids = []
+        for passage in chunk_text(text):
+            terms = Counter(tokenize(f'{title} {passage}'))
+            if not terms:
+                continue
+
+            chunk_id = self.next_chunk_id
+            self.next_chunk_id += 1
+
+            length = sum(terms.values())
+            self.chunks[chunk_id] = (kind, source_id, title, passage, length)
+            self.total_length += length
+
+            for term, count in terms.items():
+                self.postings.setdefault(term, {})[chunk_id] = count
+
+            chunk_ids.append(chunk_id)
+
+        self.sources[(kind, source_id)] = (version, chunk_ids)
+
+    def remove_source(self, kind, source_id):
+        """Drop every passage of a source"""
+        entry = self.sources.pop((kind, source_id), None)
+        if entry is None:
+            return
+
+        for chunk_id in entry[1]:
+            _, _, title, passage, length = self.chunks.pop(chunk_id)
+            self.total_length -= length
+
+            for term in set(tokenize(f'{title} {passage}')):
+                postings = self.postings.get(term)
+                if postings is not None:
+                    postings.pop(chunk_id, None)
+                    if not postings:
+                        del self.postings[term]
+
+    def search(self, query, k=5):
+        """
+        Get the passages that best match a query
+
+        Args:
+            query (str): Free text describing what is being generated
+            k (int, optional): Number of passages. Defaults to 5.
+
+        Returns:
+            list: Passage tuples, best match first
+        """
+        if not self.chunks:
+            return []
+
+        count = len(self.chunks)
+        average_length = self.total_length / count
+        scores = Counter()
+
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+
+            for chunk_id, tf in postings.items():
+                length = self.chunks[chunk_id][4]
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+                scores[chunk_id] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+        return [
+            Passage(kind, source_id, title, text, round(score, 3))
+            for chunk_id, score in best
+            for kind, source_id, title, text, _ in [self.chunks[chunk_id]]
+        ]
+
+class RetrievalStore:
+    """Process-wide retrieval index, loaded from disk and synced with the database"""
+
+    def __init__(self):
+        self._index = None
+        self._lock = threading.Lock()
+        self._last_sync = 0.0
+        self.logger = logging.getLogger(__name__)
+
+    def search(self, query, k=5):
+        """Search the index after bringing it up to date if it is due"""
+        with self._lock:
+            self._ensure_fresh()
+            return self._index.search(query, k)
+
+    def sync(self, force=False):
+        """
+        Re-index changed sources and drop deleted ones
+
+        Args:
+            force (bool, optional): Sync even if RETRIEVAL_SYNC_INTERVAL has not passed. Defaults to False.
+
+        Returns:
+            int: Number of sources added, updated or removed
+        """
+        with self._lock:
+            return self._ensure_fresh(force)
+
+    def rebuild(self):
+        """
+        Re-index every source from scratch
+
+        Returns:
+            int: Number of indexed passages
+        """
+        with self._lock:
+            self._index = RetrievalIndex()
+            self._ensure_fresh(force=True)
+            return len(self._index.chunks)
+
+    def _ensure_fresh(self, force=False):
+        if self._index is None:
+            self._index = self._load()
+
+        interval = current_app.config.get('RETRIEVAL_SYNC_INTERVAL', 300)
+        if not force and time.monotonic() - self._last_sync < interval:
+            return 0
+
+        self._last_sync = time.monotonic()
+        changed = _sync_index(self._index)
+
+        if changed:
+            self._save()
+
+        return changed
+
+    def _path(self):
+        return current_app.config.get('RETRIEVAL_INDEX_PATH') or os.path.join(current_app.instance_path, 'retrieval_index.pkl')
+
+    def _load(self):
+        try:
+            with open(self._path(), 'rb') as f:
+                index = pickle.load(f)
+            if isinstance(index, RetrievalIndex):
+                return index
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            self.logger.warning(f"Discarding unreadable retrieval index: {str(e)}")
+
+        return RetrievalIndex()
+
+    def _save(self):
+        path = self._path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write next to the destination and move into place so readers never see a partial file
+        fd, temp_path = tempfile.mkstemp(prefix='.retrieval-', dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(self._index, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, path)
+        except Exception as e:
+            self.logger.error(f"Error saving retrieval index: {str(e)}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+# Process-wide store
+retrieval_store = RetrievalStore()
+
+def _sync_index(index):
+    changed = 0
+
+    for kind, (model, title_column, text_column, updated_column) in SOURCES.items():
+        # Versions of every source, without loading their text
+        versions = {
+            source_id: f'{updated}:{length}'
+            for source_id, updated, length in db.session.query(
+                model.id, updated_column, func.length(text_column)
+            )
+        }
+
+        stale = [
+            source_id for source_id, version in versions.items()
+            if index.sources.get((kind, source_id), (None,))[0] != version
+        ]
+        deleted = [
+            source_id for indexed_kind, source_id in list(index.sources)
+            if indexed_kind == kind and source_id not in versions
+        ]
+
+        for source_id in deleted:
+            index.remove_source(kind, source_id)
+
+        for start in range(0, len(stale), 500):
+            batch = stale[start:start + 500]
+            rows = db.session.query(model.id, title_column, text_column).filter(model.id.in_(batch))
+            for source_id, title, text in rows:
+                index.add_source(kind, source_id, versions[source_id], title or '', text or '')
+
+        changed += len(stale) + len(deleted)
+
+    return changed
+
+def retrieve_passages(query, k=None):
+    """
+    Get the legal passages most relevant to a query
+
+    Args:
+        query (str): Free text describing what is being generated
+        k (int, optional): Number of passages. Defaults to RETRIEVAL_TOP_K.
+
+    Returns:
+        list: Passage tuples, best match first
+    """
+    return retrieval_store.search(query, k or current_app.config.get('RETRIEVAL_TOP_K', 5))
+
+def build_legal_context(query, max_tokens=None):
+    """
+    Format the most relevant legal passages for inclusion in a prompt
+
+    Passages are added best first until the token budget is used up.
+
+    Args:
+        query (str): Free text describing what is being generated
+        max_tokens (int, optional): Budget for the context. Defaults to RETRIEVAL_CONTEXT_TOKENS.
+
+    Returns:
+        str: Numbered source excerpts, or an empty string if nothing relevant was found
+    """
+    max_tokens = max_tokens or current_app.config.get('RETRIEVAL_CONTEXT_TOKENS', 1500)
+    budget = max_tokens * CHARS_PER_TOKEN
+
+    sections = []
+    used = 0
+
+    for number, passage in enumerate(retrieve_passages(query), start=1):
+        section = f'[{number}] {passage.title}\n{passage.text}'
+        if used + len(section) > budget:
+            break
+
+        sections.append(section)
+        used += len(section)
+
+    return '\n\n'.join(sections)
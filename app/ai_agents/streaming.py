@@ -0,0 +1,122 @@
+from flask import Response, stream_with_context
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+def sse_event(event, data):
+    """
+    Format a server-sent event
+
+    Args:
+        event (str): Event name
+        data (dict): JSON-serializable payload
+
+    Returns:
+        str: Event in text/event-stream format
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def sse_response(events):
+    """
+    Build a streaming text/event-stream response
+
+    Args:
+        events: Iterable of formatted events
+
+    Returns:
+        Response: Unbuffered streaming response
+    """
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            # Stop nginx from buffering the stream
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+def stream_generation(start, on_complete, on_error):
+    """
+    Relay a generation as server-sent events and persist it when it ends
+
+    The stream opens with a comment so the response headers reach the
+    client before the model produces its first token. Every chunk is sent
+    as a ``token`` event. Once the text is complete, ``on_complete`` saves
+    it and its result is sent as a ``done`` event. If the generation fails,
+    or the client disconnects first, ``on_error`` records the failure and
+    a ``failed`` event is sent when the client is still there.
+
+    Args:
+        start (callable): Function returning an iterator of text chunks
+        on_complete (callable): Function taking the full text, returning a dict for the done event
+        on_error (callable): Function taking an error message
+
+    Yields:
+        str: Formatted events
+    """
+    yield ': stream open\n\n'
+
+    chunks = None
+    parts = []
+
+    try:
+        chunks = start()
+        for text in chunks:
+            parts.append(text)
+            yield sse_event('token', {'text': text})
+
+        done = on_complete(''.join(parts))
+
+    except GeneratorExit:
+        on_error('The stream was closed before the generation finished')
+        raise
+
+    except Exception as e:
+        logger.error(f"Error streaming generation: {str(e)}")
+        on_error(str(e))
+        yield sse_event('failed', {'error': str(e)})
+        return
+
+    finally:
+        # Close the upstream API stream if the client went away
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+    yield sse_event('done', done or {})
+
+def relay_generation(chunks, get_status):
+    """
+    Relay the text of a background generation as server-sent events
+
+    Every chunk is sent as a ``token`` event, and a comment keeps the
+    connection open while no text arrives. Once the chunks run out, the
+    job's status is sent: a ``done`` or ``failed`` event if it finished, or
+    a ``status`` event if it runs elsewhere, so the client polls instead.
+    The job is unaffected if the client disconnects.
+
+    Args:
+        chunks: Iterator of text chunks, with None as a keep-alive, e.g. from GenerationQueue.follow
+        get_status (callable): Function returning the job's current status and error message
+
+    Yields:
+        str: Formatted events
+    """
+    yield ': stream open\n\n'
+
+    for text in chunks:
+        if text is None:
+            yield ': keep-alive\n\n'
+        else:
+            yield sse_event('token', {'text': text})
+
+    status, error = get_status()
+
+    if status == 'completed':
+        yield sse_event('done', {'status': status})
+    elif status == 'failed':
+        yield sse_event('failed', {'error': error})
+    else:
+        yield sse_event('status', {'status': status})
@@ -0,0 +1,216 @@
+from flask import current_app
+from sqlalchemy import func, case
+from sqlalchemy.orm import Session
+from app.models.ai_assistant_models import AITokenUsage
+from app.models.subscription_models import Subscription, Tier
+from app.utils.usage_metering import dialect_insert
+from app.utils.usage_rollup import month_start, next_month
+from app import db
+from collections import namedtuple
+from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Rough size of a token, for estimates made before the API reports usage
+CHARS_PER_TOKEN = 4
+
+class TokenBudgetExceeded(Exception):
+    """Raised when a call would take an organization past its monthly token budget"""
+    pass
+
+class TokenUsage(namedtuple('TokenUsage', ['input_tokens', 'output_tokens'])):
+    """Tokens used by one API call"""
+
+    @property
+    def total(self):
+        return self.input_tokens + self.output_tokens
+
+def estimate_tokens(text):
+    """Estimate the number of tokens in a text"""
+    return len(text or '') // CHARS_PER_TOKEN
+
+def get_token_budget(organization_id):
+    """
+    Get an organization's monthly token budget
+
+    The budget is the subscribed tier's max_ai_generations times
+    AI_TOKENS_PER_GENERATION. Tiers that leave max_ai_generations unset or
+    at 0, and organizations without an active subscription, get
+    AI_MONTHLY_TOKEN_BUDGET, where 0 means no cap.
+
+    Args:
+        organization_id (int): Organization ID
+
+    Returns:
+        int: Tokens allowed per month, or None if there is no limit
+    """
+    row = db.session.query(Tier.max_ai_generations).join(
+        Subscription, Subscription.tier_id == Tier.id
+    ).filter(
+        Subscription.organization_id == organization_id,
+        Subscription.is_active == True
+    ).first()
+
+    if row is not None and row.max_ai_generations:
+        return row.max_ai_generations * current_app.config.get('AI_TOKENS_PER_GENERATION', 4000)
+
+    return current_app.config.get('AI_MONTHLY_TOKEN_BUDGET', 0) or None
+
+def get_monthly_token_usage(organization_id, month=None):
+    """
+    Get the tokens an organization has used in a month
+
+    Args:
+        organization_id (int): Organization ID
+        month (date, optional): Any day in the month. Defaults to the current month.
+
+    Returns:
+        int: Input and output tokens used
+    """
+    start = month_start(month or datetime.utcnow().date())
+
+    used = db.session.query(
+        func.sum(AITokenUsage.input_tokens + AITokenUsage.output_tokens)
+    ).filter(
+        AITokenUsage.organization_id == organization_id,
+        AITokenUsage.date >= start,
+        AITokenUsage.date < next_month(start)
+    ).scalar()
+
+    return used or 0
+
+def check_token_budget(organization_id, requested_tokens):
+    """
+    Make sure a call fits in an organization's monthly token budget
+
+    Args:
+        organization_id (int): Organization ID, or None for calls not made for an organization
+        requested_tokens (int): Most tokens the call can use, prompt and completion
+
+    Raises:
+        TokenBudgetExceeded: If the call could take the organization past its budget
+    """
+    if not organization_id:
+        return
+
+    budget = get_token_budget(organization_id)
+    if budget is None:
+        return
+
+    used = get_monthly_token_usage(organization_id)
+
+    if used + requested_tokens > budget:
+        logger.warning(f"Organization {organization_id} token budget exceeded: {used} of {budget} used, {requested_tokens} requested")
+        raise TokenBudgetExceeded("Your organization has used its monthly AI allowance. Please upgrade your subscription or try again next month.")
+
+def record_token_usage(organization_id, feature, model, usage):
+    """
+    Add the tokens of an API call to the daily usage totals
+
+    The totals are written in a separate session, so the caller's
+    transaction is neither committed nor rolled back. Usage is logged
+    either way, and prompts over AI_PROMPT_WARN_TOKENS are flagged.
+
+    Args:
+        organization_id (int): Organization ID, or None for calls not made for an organization
+        feature (str): What the call generated
+        model (str): Model name
+        usage (TokenUsage): Tokens used
+    """
+    logger.info(f"AI call for organization {organization_id}, {feature}: {usage.input_tokens} input and {usage.output_tokens} output tokens")
+
+    warn_tokens = current_app.config.get('AI_PROMPT_WARN_TOKENS', 8000)
+    if usage.input_tokens > warn_tokens:
+        logger.warning(f"Large {feature} prompt for organization {organization_id}: {usage.input_tokens} input tokens")
+
+    if not organization_id:
+        return
+
+    try:
+        _increment_usage(organization_id, feature, model, datetime.utcnow().date(), usage)
+    except Exception as e:
+        logger.error(f"Error recording AI token usage: {str(e)}")
+
+def _increment_usage(organization_id, feature, model, date, usage):
+    table = AITokenUsage.__table__
+    insert = dialect_insert(table)
+    values = {
+        'organization_id': organization_id,
+        'feature': feature,
+        'model': model,
+        'date': date,
+        'calls': 1,
+        'input_tokens': usage.input_tokens,
+        'output_tokens': usage.output_tokens,
+        'max_input_tokens': usage.input_tokens
+    }
+
+    with Session(db.engine) as session:
+        if insert is not None:
+            stmt = insert.values(**values)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['organization_id', 'feature', 'model', 'date'],
+                set_={
+                    'calls': table.c.calls + 1,
+                    'input_tokens': table.c.input_tokens + stmt.excluded.input_tokens,
+                    'output_tokens': table.c.output_tokens + stmt.excluded.output_tokens,
+                    'max_input_tokens': case(
+                        (stmt.excluded.max_input_tokens > table.c.max_input_tokens, stmt.excluded.max_input_tokens),
+                        else_=table.c.max_input_tokens
+                    )
+                }
+            )
+            session.execute(stmt)
+        else:
+            # Generic fallback: increment in place, insert if nothing was updated
+            result = session.execute(
+                table.update().where(
+                    table.c.organization_id == organization_id,
+                    table.c.feature == feature,
+                    table.c.model == model,
+                    table.c.date == date
+                ).values(
+                    calls=table.c.calls + 1,
+                    input_tokens=table.c.input_tokens + usage.input_tokens,
+                    output_tokens=table.c.output_tokens + usage.output_tokens,
+                    max_input_tokens=case(
+                        (table.c.max_input_tokens < usage.input_tokens, usage.input_tokens),
+                        else_=table.c.max_input_tokens
+                    )
+                )
+            )
+
+            if result.rowcount == 0:
+                session.execute(table.insert().values(**values))
+
+        session.commit()
+
+def summarize_token_usage(month=None):
+    """
+    Total token usage per organization, feature and model for a month
+
+    Args:
+        month (date, optional): Any day in the month. Defaults to the current month.
+
+    Returns:
+        list: Rows with organization_id, feature, model, calls, input_tokens,
+            output_tokens and max_input_tokens, largest users first
+    """
+    start = month_start(month or datetime.utcnow().date())
+    total = func.sum(AITokenUsage.input_tokens + AITokenUsage.output_tokens)
+
+    return db.session.query(
+        AITokenUsage.organization_id,
+        AITokenUsage.feature,
+        AITokenUsage.model,
+        func.sum(AITokenUsage.calls).label('calls'),
+        func.sum(AITokenUsage.input_tokens).label('input_tokens'),
+        func.sum(AITokenUsage.output_tokens).label('output_tokens'),
+        func.max(AITokenUsage.max_input_tokens).label('max_input_tokens')
+    ).filter(
+        AITokenUsage.date >= start,
+        AITokenUsage.date < next_month(start)
+    ).group_by(
+        AITokenUsage.organization_id, AITokenUsage.feature, AITokenUsage.model
+    ).order_by(total.desc()).all()
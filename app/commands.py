@@ -0,0 +1,218 @@
+import click
+
+def register_commands(app):
+    """
+    Register maintenance CLI commands with the application
+
+    Args:
+        app: Flask application instance
+    """
+    @app.cli.command('init-db')
+    def init_db():
+        """Create missing tables and seed required data"""
+        from app.utils.db_init import bootstrap_database
+
+        elapsed = bootstrap_database()
+        click.echo(f'Database initialized in {elapsed * 1000:.0f} ms.')
+
+    @app.cli.command('rollup-usage')
+    def rollup_usage():
+        """Summarize feature usage of closed months"""
+        from app.utils.usage_rollup import rollup_closed_months
+
+        written = rollup_closed_months()
+        click.echo(f'Wrote {written} monthly usage summary rows.')
+
+    @app.cli.command('rebuild-quotas')
+    def rebuild_quotas():
+        """Recompute this month's usage quota counters from usage records"""
+        from app.utils.usage_quota import rebuild_quota_ledger
+
+        written = rebuild_quota_ledger()
+        click.echo(f'Rebuilt {written} usage quota counters.')
+
+    @app.cli.command('snapshot-scores')
+    def snapshot_scores():
+        """Score every organization and store compliance snapshots"""
+        from app.utils.batch_scoring import snapshot_all_organizations
+
+        written = snapshot_all_organizations()
+        click.echo(f'Snapshotted compliance scores for {written} organizations.')
+
+    @app.cli.command('rollup-trends')
+    def rollup_trends():
+        """Roll compliance snapshots of closed months up into monthly trends"""
+        from app.utils.compliance_trends import rollup_compliance_trends
+
+        written = rollup_compliance_trends()
+        click.echo(f'Wrote {written} monthly compliance trend rows.')
+
+    @app.cli.command('rebuild-benchmarks')
+    def rebuild_benchmarks():
+        """Recompute sector benchmarks from the latest compliance scores"""
+        from app.utils.benchmarks import rebuild_benchmarks
+
+        written = rebuild_benchmarks()
+        click.echo(f'Wrote {written} compliance benchmark rows.')
+
+    @app.cli.command('prune-charts')
+    def prune_charts():
+        """Delete cached analytics charts that are stale or over the size limit"""
+        from app.utils.chart_cache import evict_charts
+
+        deleted = evict_charts()
+        click.echo(f'Deleted {deleted} cached charts.')
+
+    @app.cli.command('rebuild-search-index')
+    def rebuild_search_index():
+        """Re-index all legal documents and forms for knowledge base search"""
+        from app.utils.kb_search import is_search_index_available, rebuild_search_index
+
+        if not is_search_index_available():
+            raise click.ClickException('The full-text search index is only available on SQLite.')
+
+        indexed = rebuild_search_index()
+        click.echo(f'Indexed {indexed} knowledge base entries.')
+
+    @app.cli.command('rebuild-retrieval-index')
+    def rebuild_retrieval_index():
+        """Re-index legal documents and regulatory updates used to ground AI prompts"""
+        from app.ai_agents.retrieval import retrieval_store
+
+        indexed = retrieval_store.rebuild()
+        click.echo(f'Indexed {indexed} legal passages.')
+
+    @app.cli.command('ai-faq')
+    @click.argument('question', required=False)
+    @click.option('--seed', is_flag=True, help='Add the default answers that are missing.')
+    @click.option('--category', default=None, help='Category to match the question in.')
+    def ai_faq(question, seed, category):
+        """Seed the AI assistant's FAQ answers or show the best matches for a question"""
+        import time
+        from app.ai_agents.faq_index import faq_store, seed_faq_answers
+
+        if seed:
+            added = seed_faq_answers()
+            click.echo(f'Added {added} FAQ answers.')
+
+        indexed = faq_store.rebuild()
+        click.echo(f'Indexed {indexed} FAQ answers.')
+
+        if question:
+            started = time.perf_counter()
+            answers = faq_store.search(question, category, k=3)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+            for answer in answers:
+                click.echo(f'{answer.confidence:>6.3f}  [{answer.category}] {answer.title}')
+            click.echo(f'Searched in {elapsed_ms:.3f} ms.')
+
+    @app.cli.command('ai-cache')
+    @click.option('--prune', is_flag=True, help='Delete expired cached responses.')
+    @click.option('--clear', is_flag=True, help='Delete every cached response.')
+    def ai_cache(prune, clear):
+        """Show or clean up the cache of AI responses"""
+        from sqlalchemy import func
+        from app import db
+        from app.models.ai_assistant_models import AIResponseCache
+        from app.ai_agents.response_cache import prune_response_cache
+
+        if prune or clear:
+            deleted = prune_response_cache(clear=clear)
+            click.echo(f'Deleted {deleted} cached AI responses.')
+
+        entries, hits = db.session.query(func.count(AIResponseCache.id), func.sum(AIResponseCache.hit_count)).one()
+        click.echo(f'{entries} cached AI responses, served {hits or 0} times.')
+
+    @app.cli.command('ai-usage')
+    @click.option('--month', default=None, help='Any day in the month to report, as YYYY-MM-DD. Defaults to this month.')
+    def ai_usage(month):
+        """Show API token usage per organization, feature and model"""
+        from datetime import datetime
+        from app.ai_agents.token_usage import get_token_budget, summarize_token_usage
+
+        try:
+            day = datetime.strptime(month, '%Y-%m-%d').date() if month else None
+        except ValueError:
+            raise click.ClickException('--month must be a date in YYYY-MM-DD format.')
+
+        rows = summarize_token_usage(day)
+        if not rows:
+            click.echo('No AI token usage recorded.')
+            return
+
+        click.echo(f"{'organization':>12} {'feature':<18} {'model':<28} {'calls':>6} {'input':>10} {'output':>10} {'max prompt':>10} {'budget':>10}")
+        for row in rows:
+            budget = get_token_budget(row.organization_id)
+            click.echo(
+                f"{row.organization_id:>12} {row.feature:<18} {row.model:<28} {row.calls:>6} "
+                f"{row.input_tokens:>10} {row.output_tokens:>10} {row.max_input_tokens:>10} {budget if budget is not None else '-':>10}"
+            )
+
+    @app.cli.command('ai-jobs')
+    @click.option('--resume', is_flag=True, help='Run every queued generation and wait for it to finish.')
+    def ai_jobs(resume):
+        """Show or resume background AI generation jobs"""
+        from sqlalchemy import func
+        from app import db
+        from app.models.models import AIGeneratedDocument
+        from app.ai_agents.generation_queue import generation_queue
+
+        if resume:
+            submitted = generation_queue.resume_pending()
+            click.echo(f'Running {submitted} queued generations...')
+            generation_queue.shutdown(wait=True)
+
+        counts = db.session.query(AIGeneratedDocument.status, func.count(AIGeneratedDocument.id)).group_by(AIGeneratedDocument.status)
+        for status, count in counts:
+            click.echo(f'{status}: {count}')
+
+    @app.cli.command('import-report')
+    @click.option('--limit', default=20, show_default=True, help='Number of modules and packages to list.')
+    @click.option('--check', is_flag=True, help='Exit with an error if a heavy dependency is imported at startup.')
+    def import_report(limit, check):
+        """Show how long each module takes to import when the application starts"""
+        from app.utils.import_profile import profile_imports, summarize_by_package, find_heavy_imports
+
+        try:
+            timings = profile_imports()
+        except RuntimeError as e:
+            raise click.ClickException(f'Could not profile application startup: {str(e)}')
+
+        total = sum(timing.self_us for timing in timings)
+        click.echo(f'Imported {len(timings)} modules in {total / 1000:.1f} ms.')
+
+        click.echo('\nSlowest packages:')
+        for package, elapsed in summarize_by_package(timings)[:limit]:
+            click.echo(f'  {elapsed / 1000:9.1f} ms  {package}')
+
+        click.echo('\nSlowest application modules (including their imports):')
+        app_timings = [timing for timing in timings if timing.module.split('.')[0] in ('app', 'config')]
+        for timing in sorted(app_timings, key=lambda timing: timing.cumulative_us, reverse=True)[:limit]:
+            click.echo(f'  {timing.cumulative_us / 1000:9.1f} ms  {timing.module}')
+
+        heavy = find_heavy_imports(timings)
+        if heavy:
+            click.echo(f"\nHeavy dependencies imported at startup: {', '.join(heavy)}")
+            if check:
+                raise click.ClickException('Heavy dependencies must be imported on first use.')
+        else:
+            click.echo('\nNo heavy dependencies are imported at startup.')
+
+    @app.cli.command('boot-time')
+    @click.option('--runs', default=3, show_default=True, help='Number of cold starts to measure.')
+    def boot_time(runs):
+        """Measure cold-start time of the application with and without fast boot"""
+        from app.utils.import_profile import measure_cold_start
+
+        for fast_boot in (True, False):
+            try:
+                durations = sorted(measure_cold_start(runs, fast_boot))
+            except RuntimeError as e:
+                raise click.ClickException(f'Could not start the application: {str(e)}')
+
+            label = 'fast boot' if fast_boot else 'full boot'
+            click.echo(
+                f'{label}: median {durations[len(durations) // 2] * 1000:.0f} ms, '
+                f'min {durations[0] * 1000:.0f} ms, max {durations[-1] * 1000:.0f} ms over {runs} runs'
+            )
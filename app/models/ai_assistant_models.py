@@ -120,3 +120,99 @@ class AIAnalysisResult(db.Model):
         if self.findings:
             return json.loads(self.findings)
         return []
+
+class AIDocument(db.Model):
+    """Model for compliance documents generated by the AI assistant"""
+    id = db.Column(db.Integer, primary_key=True)
+    organization_id = db.Column(db.Integer, db.ForeignKey('organization.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    document_type = db.Column(db.String(50))  # policy, procedure, report, checklist
+    title = db.Column(db.String(120))
+    description = db.Column(db.Text, nullable=True)
+    file_path = db.Column(db.String(200), nullable=True)
+    status = db.Column(db.String(20), default='queued')  # queued, processing, completed, failed
+    error_message = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)  # when a worker or stream claimed the job
+    completed_at = db.Column(db.DateTime, nullable=True)
+    
+    __table_args__ = (
+        db.Index('ix_ai_document_status', 'status'),
+    )
+    
+    # Relationships
+    organization = db.relationship('Organization', backref='ai_assistant_documents')
+    user = db.relationship('User', backref='ai_assistant_documents')
+    
+    def __repr__(self):
+        return f'<AIDocument {self.title}>'
+    
+    @property
+    def is_finished(self):
+        """Whether the generation job has stopped, successfully or not"""
+        return self.status in ('completed', 'failed')
+
+class AIMethodology(db.Model):
+    """Model for compliance methodologies generated by the AI assistant"""
+    id = db.Column(db.Integer, primary_key=True)
+    organization_id = db.Column(db.Integer, db.ForeignKey('organization.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    methodology_type = db.Column(db.String(50))  # audit, risk_assessment, monitoring
+    title = db.Column(db.String(120))
+    description = db.Column(db.Text, nullable=True)
+    file_path = db.Column(db.String(200), nullable=True)
+    status = db.Column(db.String(20), default='queued')  # queued, processing, completed, failed
+    error_message = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)  # when a worker or stream claimed the job
+    completed_at = db.Column(db.DateTime, nullable=True)
+    
+    __table_args__ = (
+        db.Index('ix_ai_methodology_status', 'status'),
+    )
+    
+    # Relationships
+    organization = db.relationship('Organization', backref='ai_methodologies')
+    user = db.relationship('User', backref='ai_methodologies')
+    
+    def __repr__(self):
+        return f'<AIMethodology {self.title}>'
+    
+    @property
+    def is_finished(self):
+        """Whether the generation job has stopped, successfully or not"""
+        return self.status in ('completed', 'failed')
+
+class AIResponseCache(db.Model):
+    """Model for cached AI responses, keyed by a hash of the request"""
+    id = db.Column(db.Integer, primary_key=True)
+    cache_key = db.Column(db.String(64), unique=True, nullable=False)  # sha256 of model, prompt, max_tokens, temperature
+    model = db.Column(db.String(100))
+    response_text = db.Column(db.Text)
+    hit_count = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_hit_at = db.Column(db.DateTime, nullable=True)
+    expires_at = db.Column(db.DateTime, index=True)
+    
+    def __repr__(self):
+        return f'<AIResponseCache {self.cache_key[:12]}>'
+
+class AITokenUsage(db.Model):
+    """Model for daily API token usage per organization, feature and model"""
+    __table_args__ = (
+        db.UniqueConstraint('organization_id', 'feature', 'model', 'date', name='uq_ai_token_usage_day'),
+        db.Index('ix_ai_token_usage_org_date', 'organization_id', 'date'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    organization_id = db.Column(db.Integer, db.ForeignKey('organization.id'), nullable=True)
+    feature = db.Column(db.String(50), nullable=False)  # constitution, minutes, letter, audit_methodology, compliance_document, compliance_methodology, assistant_query
+    model = db.Column(db.String(100), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    calls = db.Column(db.Integer, default=0, nullable=False)
+    input_tokens = db.Column(db.Integer, default=0, nullable=False)
+    output_tokens = db.Column(db.Integer, default=0, nullable=False)
+    max_input_tokens = db.Column(db.Integer, default=0, nullable=False)  # largest prompt of the day
+    
+    def __repr__(self):
+        return f'<AITokenUsage {self.organization_id}:{self.feature}:{self.date}>'
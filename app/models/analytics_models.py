@@ -36,6 +36,10 @@ class ComplianceSnapshot(db.Model):
     risks_mitigated = db.Column(db.Integer)
     metrics_data = db.Column(db.Text)  # JSON string of metrics
     
+    __table_args__ = (
+        db.Index('ix_compliance_snapshot_org_date', 'organization_id', 'snapshot_date'),
+    )
+    
     # Relationships
     organization = db.relationship('Organization', backref='compliance_snapshots')
     
@@ -82,12 +86,27 @@ class ComplianceBenchmark(db.Model):
     median_value = db.Column(db.Float, nullable=True)
     top_quartile_value = db.Column(db.Float, nullable=True)
     sample_size = db.Column(db.Integer)
+    score_distribution = db.Column(db.Text, nullable=True)  # JSON list of sorted scores
     effective_date = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('ix_compliance_benchmark_cohort', 'sector', 'organization_size', 'metric_name'),
+    )
+    
     def __repr__(self):
         return f'<ComplianceBenchmark {self.metric_name}>'
+    
+    def set_score_distribution(self, scores):
+        """Store scores as a sorted JSON list"""
+        self.score_distribution = json.dumps(sorted(scores))
+    
+    def get_score_distribution(self):
+        """Retrieve the sorted scores as a list"""
+        if self.score_distribution:
+            return json.loads(self.score_distribution)
+        return []
 
 class ComplianceReport(db.Model):
     """Model for generated compliance reports"""
@@ -98,8 +117,17 @@ class ComplianceReport(db.Model):
     start_date = db.Column(db.DateTime)
     end_date = db.Column(db.DateTime)
     file_path = db.Column(db.String(200), nullable=True)
+    output_format = db.Column(db.String(10), default='html')  # html, pdf
+    status = db.Column(db.String(20), default='pending')  # pending, running, completed, failed
+    error_message = db.Column(db.Text, nullable=True)
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    completed_at = db.Column(db.DateTime, nullable=True)
+    
+    __table_args__ = (
+        db.Index('ix_compliance_report_org_status', 'organization_id', 'status'),
+    )
     
     # Relationships
     organization = db.relationship('Organization', backref='compliance_reports')
@@ -107,3 +135,45 @@ class ComplianceReport(db.Model):
     
     def __repr__(self):
         return f'<ComplianceReport {self.title}>'
+    
+    @property
+    def is_finished(self):
+        """Whether the export job has stopped, successfully or not"""
+        return self.status in ('completed', 'failed')
+
+class ComplianceScore(db.Model):
+    """Model for calculated compliance scores by category"""
+    id = db.Column(db.Integer, primary_key=True)
+    organization_id = db.Column(db.Integer, db.ForeignKey('organization.id'))
+    category = db.Column(db.String(50))  # overall, registration, financial, governance, program, data_protection
+    score = db.Column(db.Float)  # 0-100 scale
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_compliance_score_org_category', 'organization_id', 'category', 'created_at'),
+    )
+    
+    # Relationships
+    organization = db.relationship('Organization', backref='compliance_scores')
+    
+    def __repr__(self):
+        return f'<ComplianceScore {self.category}: {self.score}>'
+
+class ComplianceTrend(db.Model):
+    """Model for monthly compliance score rollups built from snapshots"""
+    id = db.Column(db.Integer, primary_key=True)
+    organization_id = db.Column(db.Integer, db.ForeignKey('organization.id'))
+    month = db.Column(db.Date)  # First day of the month
+    score = db.Column(db.Float)  # Average snapshot score for the month
+    snapshot_count = db.Column(db.Integer, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('organization_id', 'month', name='uq_compliance_trend_month'),
+    )
+    
+    # Relationships
+    organization = db.relationship('Organization', backref='compliance_trends')
+    
+    def __repr__(self):
+        return f'<ComplianceTrend {self.month}: {self.score}>'
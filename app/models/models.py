@@ -111,7 +111,7 @@ class LegalDocument(db.Model):
     content = db.Column(db.Text)
     file_path = db.Column(db.String(200), nullable=True)
     publication_date = db.Column(db.DateTime, nullable=True)
-    last_updated = db.Column(db.DateTime, default=datetime.utcnow)
+    last_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
 class Form(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -119,7 +119,7 @@ class Form(db.Model):
     form_code = db.Column(db.String(20))  # Form A, Form D, Form H, etc.
     description = db.Column(db.Text)
     file_path = db.Column(db.String(200))
-    last_updated = db.Column(db.DateTime, default=datetime.utcnow)
+    last_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
 class AuditLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -149,7 +149,21 @@ class AIGeneratedDocument(db.Model):
     document_type = db.Column(db.String(50))  # Constitution, Minutes, Letter, Audit Methodology
     organization_id = db.Column(db.Integer, db.ForeignKey('organization.id'), nullable=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    status = db.Column(db.String(20), default='completed', server_default='completed')  # queued, processing, completed, failed
+    generation_params = db.Column(db.Text, nullable=True)  # JSON inputs of a queued generation
+    error_message = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)  # when a worker or stream claimed the job
+    completed_at = db.Column(db.DateTime, nullable=True)
+    
+    __table_args__ = (
+        db.Index('ix_ai_generated_document_status', 'status'),
+    )
     
     organization = db.relationship('Organization', backref='ai_documents')
     user = db.relationship('User', backref='ai_documents')
+    
+    @property
+    def is_finished(self):
+        """Whether the generation job has stopped, successfully or not"""
+        return self.status in ('completed', 'failed')
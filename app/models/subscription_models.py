@@ -44,6 +44,7 @@ class TierFeature(db.Model):
     tier_id = db.Column(db.Integer, db.ForeignKey('subscription_tier.id'))
     feature_id = db.Column(db.Integer, db.ForeignKey('feature.id'))
     is_enabled = db.Column(db.Boolean, default=True)
+    usage_limit = db.Column(db.Integer, nullable=True)  # Uses per month, None = unlimited
     
     def __repr__(self):
         return f'<TierFeature {self.tier_id}:{self.feature_id}>'
@@ -71,6 +72,10 @@ class Subscription(db.Model):
 
 class UsageRecord(db.Model):
     """Model for tracking feature usage"""
+    __table_args__ = (
+        db.UniqueConstraint('subscription_id', 'feature_id', 'date', name='uq_usage_record_day'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     subscription_id = db.Column(db.Integer, db.ForeignKey('subscription.id'))
     feature_id = db.Column(db.Integer, db.ForeignKey('feature.id'))
@@ -83,6 +88,35 @@ class UsageRecord(db.Model):
     def __repr__(self):
         return f'<UsageRecord {self.subscription_id}:{self.feature_id}>'
 
+class UsageMonthlySummary(db.Model):
+    """Model for per-feature usage totals of closed months"""
+    __table_args__ = (
+        db.UniqueConstraint('subscription_id', 'feature_id', 'month', name='uq_usage_summary_month'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    subscription_id = db.Column(db.Integer, db.ForeignKey('subscription.id'), index=True)
+    feature_id = db.Column(db.Integer, db.ForeignKey('feature.id'))
+    month = db.Column(db.Date)  # First day of the month
+    count = db.Column(db.Integer, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Relationship
+    feature = db.relationship('Feature')
+    
+    def __repr__(self):
+        return f'<UsageMonthlySummary {self.subscription_id}:{self.feature_id}:{self.month}>'
+
+class UsageQuota(db.Model):
+    """Model for the running usage count of a feature in a month, checked against tier limits"""
+    subscription_id = db.Column(db.Integer, db.ForeignKey('subscription.id'), primary_key=True)
+    feature_id = db.Column(db.Integer, db.ForeignKey('feature.id'), primary_key=True)
+    month = db.Column(db.Date, primary_key=True)  # First day of the month
+    used = db.Column(db.Integer, default=0, nullable=False)
+    
+    def __repr__(self):
+        return f'<UsageQuota {self.subscription_id}:{self.feature_id}:{self.month}>'
+
 class VoucherCode(db.Model):
     """Model for subscription vouchers/grants"""
     id = db.Column(db.Integer, primary_key=True)
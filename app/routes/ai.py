@@ -1,9 +1,15 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, jsonify, abort
 from flask_login import login_required, current_user
 from app.models.models import AIGeneratedDocument, Organization
-from app import db
+from app import db, csrf
 from app.ai_agents.agents import DocumentGenerationAgent, AuditMethodologyAgent
+from app.ai_agents.token_usage import TokenBudgetExceeded, check_token_budget
+from app.ai_agents.client_pool import anthropic_pool
+from app.ai_agents.generation_queue import generation_queue
+from app.ai_agents.response_cache import response_cache
+from app.ai_agents.streaming import relay_generation, sse_response
 import os
+import json
 from datetime import datetime
 from app.utils.file_handlers import save_file
 import io
@@ -13,7 +19,7 @@ ai_bp = Blueprint('ai', __name__)
 @ai_bp.route('/generate_document', methods=['POST'])
 @login_required
 def generate_document():
-    """Generate a document using AI"""
+    """Queue the AI generation of a document"""
     try:
         document_type = request.form.get('document_type')
         organization_id = request.form.get('organization_id')
@@ -23,75 +29,35 @@ def generate_document():
             flash('Document type is required', 'danger')
             return redirect(url_for('registration.ai_document_generation'))
         
-        # Initialize AI agent
-        doc_agent = DocumentGenerationAgent()
-        
         # Get organization if provided
         organization = None
         if organization_id:
             organization = Organization.query.get(organization_id)
         
-        # Generate document based on type
-        content = ""
-        title = ""
+        org_name = request.form.get('org_name') or (organization.name if organization else "")
         
-        if document_type == 'constitution':
-            org_name = request.form.get('org_name') or (organization.name if organization else "")
-            org_vision = request.form.get('org_vision', "")
-            org_mission = request.form.get('org_mission', "")
-            primary_objective = request.form.get('primary_objective', "")
-            
-            content = doc_agent.generate_constitution(
-                org_name=org_name,
-                org_vision=org_vision,
-                org_mission=org_mission,
-                primary_objective=primary_objective
-            )
-            title = f"Constitution for {org_name}"
-            
-        elif document_type == 'minutes':
-            org_name = request.form.get('org_name') or (organization.name if organization else "")
-            meeting_date = request.form.get('meeting_date', datetime.now().strftime("%Y-%m-%d"))
-            meeting_type = request.form.get('meeting_type', "Board Meeting")
-            attendees = request.form.get('attendees', "").split(',') if request.form.get('attendees') else None
-            
-            content = doc_agent.generate_minutes(
-                org_name=org_name,
-                meeting_date=meeting_date,
-                meeting_type=meeting_type,
-                attendees=attendees
-            )
-            title = f"{meeting_type} Minutes - {meeting_date}"
-            
-        elif document_type == 'letter':
-            org_name = request.form.get('org_name') or (organization.name if organization else "")
-            letter_subject = request.form.get('letter_subject', "")
-            letter_purpose = request.form.get('letter_purpose', "")
-            recipient = request.form.get('recipient', "")
-            
-            content = doc_agent.generate_request_letter(
-                org_name=org_name,
-                letter_subject=letter_subject,
-                letter_purpose=letter_purpose,
-                recipient=recipient
-            )
-            title = f"Letter: {letter_subject}"
+        # Collect the generation inputs; the agent runs in the background
+        spec = build_document_spec(document_type, request.form, org_name)
         
-        else:
+        if spec is None:
             flash('Invalid document type', 'danger')
             return redirect(url_for('registration.ai_document_generation'))
         
-        # Save the generated document
+        title, params = spec
+        
         ai_document = AIGeneratedDocument(
             title=title,
-            content=content,
             document_type=document_type,
             organization_id=organization_id if organization_id else None,
-            user_id=current_user.id
+            user_id=current_user.id,
+            status='queued',
+            generation_params=json.dumps(params)
         )
         db.session.add(ai_document)
         db.session.commit()
         
+        generation_queue.submit(GENERATION_KIND, ai_document.id)
+        
         return redirect(url_for('ai.view_document', doc_id=ai_document.id))
         
     except Exception as e:
@@ -99,10 +65,57 @@ def generate_document():
         flash(f"Error generating document: {str(e)}", 'danger')
         return redirect(url_for('registration.ai_document_generation'))
 
+def build_document_spec(document_type, values, org_name):
+    """
+    Get the title and agent inputs of a document to generate
+
+    Args:
+        document_type (str): constitution, minutes or letter
+        values: Form or dict holding the document fields
+        org_name (str): Organization name used when none is given
+
+    Returns:
+        tuple: (title, agent keyword arguments), or None for an unknown document type
+    """
+    org_name = values.get('org_name') or org_name
+    
+    if document_type == 'constitution':
+        params = {
+            'org_name': org_name,
+            'org_vision': values.get('org_vision', ""),
+            'org_mission': values.get('org_mission', ""),
+            'primary_objective': values.get('primary_objective', "")
+        }
+        title = f"Constitution for {org_name}"
+        
+    elif document_type == 'minutes':
+        attendees = values.get('attendees') or None
+        params = {
+            'org_name': org_name,
+            'meeting_date': values.get('meeting_date', datetime.now().strftime("%Y-%m-%d")),
+            'meeting_type': values.get('meeting_type', "Board Meeting"),
+            'attendees': attendees.split(',') if isinstance(attendees, str) else attendees
+        }
+        title = f"{params['meeting_type']} Minutes - {params['meeting_date']}"
+        
+    elif document_type == 'letter':
+        params = {
+            'org_name': org_name,
+            'letter_subject': values.get('letter_subject', ""),
+            'letter_purpose': values.get('letter_purpose', ""),
+            'recipient': values.get('recipient', "")
+        }
+        title = f"Letter: {params['letter_subject']}"
+    
+    else:
+        return None
+    
+    return title, params
+
 @ai_bp.route('/generate_audit_methodology', methods=['POST'])
 @login_required
 def generate_audit_methodology():
-    """Generate an audit methodology using AI"""
+    """Queue the AI generation of an audit methodology"""
     try:
         org_type = request.form.get('org_type')
         ngo_type = request.form.get('ngo_type')
@@ -113,28 +126,24 @@ def generate_audit_methodology():
             flash('Organization type is required', 'danger')
             return redirect(url_for('compliance.audit_support'))
         
-        # Initialize AI agent
-        audit_agent = AuditMethodologyAgent()
-        
-        # Generate audit methodology
-        content = audit_agent.generate_audit_methodology(
-            org_type=org_type,
-            ngo_type=ngo_type if org_type == 'NGO' else None,
-            focus_areas=focus_areas if focus_areas else None
-        )
-        
         title = f"Compliance Audit Methodology for {ngo_type + ' ' if ngo_type else ''}{org_type}"
         
-        # Save the generated methodology
         ai_document = AIGeneratedDocument(
             title=title,
-            content=content,
             document_type='Audit Methodology',
-            user_id=current_user.id
+            user_id=current_user.id,
+            status='queued',
+            generation_params=json.dumps({
+                'org_type': org_type,
+                'ngo_type': ngo_type if org_type == 'NGO' else None,
+                'focus_areas': focus_areas if focus_areas else None
+            })
         )
         db.session.add(ai_document)
         db.session.commit()
         
+        generation_queue.submit(GENERATION_KIND, ai_document.id)
+        
         return redirect(url_for('ai.view_methodology', methodology_id=ai_document.id))
         
     except Exception as e:
@@ -142,6 +151,179 @@ def generate_audit_methodology():
         flash(f"Error generating audit methodology: {str(e)}", 'danger')
         return redirect(url_for('compliance.audit_support'))
 
+@ai_bp.route('/generate_batch', methods=['POST'])
+@csrf.exempt
+@login_required
+def generate_batch():
+    """
+    Queue the generation of several documents at once
+    
+    The request body is ``{"organization_id": ..., "documents": [...]}``,
+    where every document has a ``document_type`` and the fields of the
+    matching form. Every document is queued on the background generation
+    pool, so the request returns at once with 202 and, per document, the
+    URL to poll its status at. The pool's AI_GENERATION_WORKERS threads and
+    the ANTHROPIC_MAX_CONCURRENCY_PER_ORG limit decide how many of them are
+    generated at the same time.
+    
+    No CSRF token is needed. The body must be sent as application/json,
+    which a cross-site form cannot do.
+    """
+    if not request.is_json:
+        return jsonify({'error': 'The request body must be JSON.'}), 415
+    
+    data = request.get_json(silent=True) or {}
+    specs = data.get('documents')
+    
+    if not isinstance(specs, list) or not specs:
+        return jsonify({'error': 'A non-empty "documents" list is required.'}), 400
+    
+    max_size = current_app.config.get('AI_BATCH_MAX_SIZE', 20)
+    if len(specs) > max_size:
+        return jsonify({'error': f'A batch can hold at most {max_size} documents.'}), 400
+    
+    organization_id = data.get('organization_id') or current_user.organization_id
+    try:
+        organization_id = int(organization_id) if organization_id is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'error': '"organization_id" must be an integer.'}), 400
+    
+    if organization_id != current_user.organization_id and current_user.role != 'admin':
+        return jsonify({'error': 'Access denied.'}), 403
+    
+    organization = Organization.query.get(organization_id) if organization_id else None
+    org_name = organization.name if organization else ""
+    
+    # Validate every document before queueing any of them
+    items = []
+    for index, values in enumerate(specs):
+        spec = build_document_spec(values.get('document_type'), values, org_name) if isinstance(values, dict) else None
+        if spec is None:
+            return jsonify({'error': f'Document {index} has an invalid or missing document_type.'}), 400
+        items.append((values['document_type'], spec[0], spec[1]))
+    
+    # Items are checked one by one only as they start, before any of them has
+    # used tokens, so the whole batch is checked against the budget up front
+    try:
+        check_token_budget(organization_id, len(items) * current_app.config.get('AI_TOKENS_PER_GENERATION', 4000))
+    except TokenBudgetExceeded as e:
+        return jsonify({'error': str(e)}), 402
+    
+    # Queue every document in one transaction
+    ai_documents = [
+        AIGeneratedDocument(
+            title=title,
+            document_type=document_type,
+            organization_id=organization_id,
+            user_id=current_user.id,
+            status='queued',
+            generation_params=json.dumps(params)
+        )
+        for document_type, title, params in items
+    ]
+    db.session.add_all(ai_documents)
+    db.session.commit()
+    
+    for ai_document in ai_documents:
+        generation_queue.submit(GENERATION_KIND, ai_document.id)
+    
+    return jsonify({
+        'queued': len(ai_documents),
+        'documents': [
+            {
+                'index': index,
+                'id': ai_document.id,
+                'document_type': ai_document.document_type,
+                'title': ai_document.title,
+                'status': ai_document.status,
+                'status_url': url_for('ai.generation_status', doc_id=ai_document.id),
+                'url': url_for('ai.view_document', doc_id=ai_document.id)
+            }
+            for index, ai_document in enumerate(ai_documents)
+        ]
+    }), 202
+
+def generate_content(ai_document, stream=False):
+    """
+    Generate the content of a queued document with the matching agent
+
+    Args:
+        ai_document (AIGeneratedDocument): Claimed document whose generation_params hold the agent inputs
+        stream (bool, optional): Whether to return the text in chunks as it is generated. Defaults to False.
+
+    Returns:
+        str: Generated content, or an iterator of text chunks when streaming
+    """
+    params = json.loads(ai_document.generation_params or '{}')
+    
+    # Calls are limited per organization; methodologies belong to the requesting user's
+    organization_id = ai_document.organization_id or (ai_document.user.organization_id if ai_document.user else None)
+    
+    if ai_document.document_type == 'Audit Methodology':
+        return AuditMethodologyAgent(organization_id=organization_id).generate_audit_methodology(stream=stream, **params)
+    
+    doc_agent = DocumentGenerationAgent(organization_id=organization_id)
+    generators = {
+        'constitution': doc_agent.generate_constitution,
+        'minutes': doc_agent.generate_minutes,
+        'letter': doc_agent.generate_request_letter
+    }
+    
+    return generators[ai_document.document_type](stream=stream, **params)
+
+def save_content(ai_document, content):
+    """Store the generated text of a document"""
+    ai_document.content = content
+
+# Generated documents and methodologies share one job kind
+GENERATION_KIND = 'ai_generated_document'
+generation_queue.register(GENERATION_KIND, AIGeneratedDocument, generate_content, save_content)
+
+def _check_access(document):
+    if document.user_id != current_user.id and not current_user.role == 'admin':
+        if document.organization_id is None or document.organization_id != current_user.organization_id:
+            abort(403)
+
+@ai_bp.route('/document/<int:doc_id>/status')
+@login_required
+def generation_status(doc_id):
+    """Get the generation status of an AI generated document or methodology as JSON"""
+    document = AIGeneratedDocument.query.get_or_404(doc_id)
+    _check_access(document)
+    
+    generation_queue.check(GENERATION_KIND, document)
+    
+    return jsonify({
+        'status': document.status,
+        'error': document.error_message if document.status == 'failed' else None
+    })
+
+@ai_bp.route('/metrics')
+@login_required
+def metrics():
+    """Get this process's AI call, queue-wait and response cache counters as JSON"""
+    if current_user.role != 'admin':
+        abort(403)
+    
+    return jsonify({
+        'calls': anthropic_pool.stats(),
+        'response_cache': response_cache.stats()
+    })
+
+@ai_bp.route('/document/<int:doc_id>/stream')
+@login_required
+def stream_generation_events(doc_id):
+    """Relay the text of a document or methodology being generated as server-sent events"""
+    document = AIGeneratedDocument.query.get_or_404(doc_id)
+    _check_access(document)
+    
+    generation_queue.check(GENERATION_KIND, document)
+    
+    return sse_response(relay_generation(
+        generation_queue.follow(GENERATION_KIND, doc_id),
+        lambda: generation_queue.current_status(GENERATION_KIND, doc_id)
+    ))
+
 @ai_bp.route('/document/<int:doc_id>')
 @login_required
 def view_document(doc_id):
@@ -153,7 +335,9 @@ def view_document(doc_id):
         if document.organization_id is None or document.organization_id != current_user.organization_id:
             abort(403)
     
-    return render_template('ai/view_document.html', document=document)
+    generation_queue.check(GENERATION_KIND, document)
+    
+    return render_template('ai/view_document.html', document=document, streaming=current_app.config.get('AI_STREAMING', False))
 
 @ai_bp.route('/methodology/<int:methodology_id>')
 @login_required
@@ -166,7 +350,9 @@ def view_methodology(methodology_id):
         if methodology.organization_id is None or methodology.organization_id != current_user.organization_id:
             abort(403)
     
-    return render_template('ai/view_methodology.html', methodology=methodology)
+    generation_queue.check(GENERATION_KIND, methodology)
+    
+    return render_template('ai/view_methodology.html', methodology=methodology, streaming=current_app.config.get('AI_STREAMING', False))
 
 @ai_bp.route('/download_document/<int:doc_id>')
 @login_required
@@ -179,6 +365,10 @@ def download_document(doc_id):
         if document.organization_id is None or document.organization_id != current_user.organization_id:
             abort(403)
     
+    if document.status != 'completed':
+        flash('The document has not been generated yet.', 'warning')
+        return redirect(url_for('ai.view_document', doc_id=doc_id))
+    
     try:
         from weasyprint import HTML, CSS
         from weasyprint.text.fonts import FontConfiguration
@@ -239,6 +429,10 @@ def download_methodology(methodology_id):
         if methodology.organization_id is None or methodology.organization_id != current_user.organization_id:
             abort(403)
     
+    if methodology.status != 'completed':
+        flash('The methodology has not been generated yet.', 'warning')
+        return redirect(url_for('ai.view_methodology', methodology_id=methodology_id))
+    
     try:
         from weasyprint import HTML, CSS
         from weasyprint.text.fonts import FontConfiguration
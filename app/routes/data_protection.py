@@ -2,8 +2,10 @@ from flask import Blueprint, render_template, redirect, url_for, flash, request,
 from flask_login import login_required, current_user
 from app.models.data_protection_models import DataProtectionAssessment, ConsentRecord, DataBreachRecord, PDPORegistration, DataProtectionPolicy
 from app.models.models import Organization, User, Document
-from app.models.subscription_models import Subscription, Feature, UsageRecord
 from app import db
+from app.utils.entitlements import has_feature_access
+from app.utils.usage_metering import record_feature_usage
+from app.utils.compliance_scoring import compute_compliance_scores
 from datetime import datetime, timedelta
 import os
 from werkzeug.utils import secure_filename
@@ -582,122 +584,4 @@ def compliance_report():
 # Helper functions
 def calculate_data_protection_compliance_score(organization_id):
     """Calculate data protection compliance score (0-100)"""
-    score = 0
-    
-    # Check PDPO registration
-    pdpo_registration = PDPORegistration.query.filter_by(organization_id=organization_id).first()
-    if pdpo_registration:
-        if pdpo_registration.status == 'registered':
-            score += 30
-        elif pdpo_registration.status == 'pending':
-            score += 15
-        
-        if pdpo_registration.annual_report_submitted:
-            score += 10
-    
-    # Check if has active policies
-    policies = DataProtectionPolicy.query.filter_by(
-        organization_id=organization_id,
-        status='active'
-    ).count()
-    
-    if policies > 0:
-        score += 20
-    
-    # Check if has completed assessments
-    assessments = DataProtectionAssessment.query.filter_by(
-        organization_id=organization_id,
-        status='completed'
-    ).count()
-    
-    if assessments > 0:
-        score += 20
-    
-    # Check if has consent records
-    consent_records = ConsentRecord.query.filter_by(
-        organization_id=organization_id
-    ).count()
-    
-    if consent_records > 0:
-        score += 10
-    
-    # Check if has properly handled data breaches
-    breaches = DataBreachRecord.query.filter_by(
-        organization_id=organization_id
-    ).all()
-    
-    if breaches:
-        properly_handled = all(b.reported_to_authority and b.subjects_notified for b in breaches)
-        if properly_handled:
-            score += 10
-    else:
-        # No breaches is good
-        score += 10
-    
-    return min(score, 100)  # Cap at 100
-
-def has_feature_access(organization_id, feature_name):
-    """Check if organization has access to a feature based on subscription tier"""
-    # Get active subscription
-    subscription = Subscription.query.filter_by(
-        organization_id=organization_id,
-        is_active=True
-    ).first()
-    
-    if not subscription:
-        return False
-    
-    # Get feature
-    feature = Feature.query.filter_by(name=feature_name).first()
-    
-    if not feature:
-        return False
-    
-    # Check if feature is enabled for tier
-    tier_feature = db.session.query(TierFeature).filter(
-        TierFeature.tier_id == subscription.tier_id,
-        TierFeature.feature_id == feature.id,
-        TierFeature.is_enabled == True
-    ).first()
-    
-    return tier_feature is not None
-
-def record_feature_usage(organization_id, feature_name):
-    """Record usage of a feature"""
-    # Get active subscription
-    subscription = Subscription.query.filter_by(
-        organization_id=organization_id,
-        is_active=True
-    ).first()
-    
-    if not subscription:
-        return
-    
-    # Get feature
-    feature = Feature.query.filter_by(name=feature_name).first()
-    
-    if not feature:
-        return
-    
-    # Check if there's a usage record for today
-    today = datetime.utcnow().date()
-    usage_record = UsageRecord.query.filter_by(
-        subscription_id=subscription.id,
-        feature_id=feature.id,
-        date=today
-    ).first()
-    
-    if usage_record:
-        # Increment count
-        usage_record.count += 1
-    else:
-        # Create new record
-        usage_record = UsageRecord(
-            subscription_id=subscription.id,
-            feature_id=feature.id,
-            count=1,
-            date=today
-        )
-    
-    db.session.add(usage_record)
-    db.session.commit()
+    return compute_compliance_scores(organization_id, ['data_protection'])['data_protection']
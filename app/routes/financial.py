@@ -2,8 +2,10 @@ from flask import Blueprint, render_template, redirect, url_for, flash, request,
 from flask_login import login_required, current_user
 from app.models.financial_models import FinancialReport, BudgetItem, TaxExemption, AuditFinding, FinancialPolicy
 from app.models.models import Organization, User, Document
-from app.models.subscription_models import Subscription, Feature, UsageRecord
 from app import db
+from app.utils.entitlements import has_feature_access
+from app.utils.usage_metering import record_feature_usage
+from app.utils.compliance_scoring import compute_compliance_scores
 from datetime import datetime, timedelta
 import os
 from werkzeug.utils import secure_filename
@@ -710,125 +712,4 @@ def compliance_report():
 # Helper functions
 def calculate_financial_compliance_score(organization_id):
     """Calculate financial compliance score (0-100)"""
-    score = 0
-    
-    # Check annual returns
-    current_year = datetime.utcnow().year
-    last_year = current_year - 1
-    
-    annual_return = FinancialReport.query.filter(
-        FinancialReport.organization_id == organization_id,
-        FinancialReport.report_type == 'annual_return',
-        FinancialReport.fiscal_year.like(f"%{last_year}%")
-    ).first()
-    
-    if annual_return:
-        if annual_return.status == 'submitted':
-            score += 30
-        elif annual_return.status == 'final':
-            score += 20
-        elif annual_return.status == 'draft':
-            score += 10
-    
-    # Check tax exemptions
-    exemptions = TaxExemption.query.filter_by(
-        organization_id=organization_id,
-        status='active'
-    ).count()
-    
-    if exemptions > 0:
-        score += 20
-    
-    # Check financial policies
-    policies = FinancialPolicy.query.filter_by(
-        organization_id=organization_id,
-        status='approved'
-    ).count()
-    
-    if policies >= 3:  # Has multiple policies
-        score += 20
-    elif policies > 0:  # Has at least one policy
-        score += 10
-    
-    # Check audit findings
-    open_findings = db.session.query(AuditFinding).join(
-        FinancialReport, AuditFinding.report_id == FinancialReport.id
-    ).filter(
-        FinancialReport.organization_id == organization_id,
-        AuditFinding.status == 'open'
-    ).count()
-    
-    if open_findings == 0:
-        score += 30
-    elif open_findings <= 3:
-        score += 15
-    else:
-        score += 5
-    
-    return min(score, 100)  # Cap at 100
-
-def has_feature_access(organization_id, feature_name):
-    """Check if organization has access to a feature based on subscription tier"""
-    # Get active subscription
-    subscription = Subscription.query.filter_by(
-        organization_id=organization_id,
-        is_active=True
-    ).first()
-    
-    if not subscription:
-        return False
-    
-    # Get feature
-    feature = Feature.query.filter_by(name=feature_name).first()
-    
-    if not feature:
-        return False
-    
-    # Check if feature is enabled for tier
-    tier_feature = db.session.query(TierFeature).filter(
-        TierFeature.tier_id == subscription.tier_id,
-        TierFeature.feature_id == feature.id,
-        TierFeature.is_enabled == True
-    ).first()
-    
-    return tier_feature is not None
-
-def record_feature_usage(organization_id, feature_name):
-    """Record usage of a feature"""
-    # Get active subscription
-    subscription = Subscription.query.filter_by(
-        organization_id=organization_id,
-        is_active=True
-    ).first()
-    
-    if not subscription:
-        return
-    
-    # Get feature
-    feature = Feature.query.filter_by(name=feature_name).first()
-    
-    if not feature:
-        return
-    
-    # Check if there's a usage record for today
-    today = datetime.utcnow().date()
-    usage_record = UsageRecord.query.filter_by(
-        subscription_id=subscription.id,
-        feature_id=feature.id,
-        date=today
-    ).first()
-    
-    if usage_record:
-        # Increment count
-        usage_record.count += 1
-    else:
-        # Create new record
-        usage_record = UsageRecord(
-            subscription_id=subscription.id,
-            feature_id=feature.id,
-            count=1,
-            date=today
-        )
-    
-    db.session.add(usage_record)
-    db.session.commit()
+    return compute_compliance_scores(organization_id, ['financial'])['financial']
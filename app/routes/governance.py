@@ -2,8 +2,10 @@ from flask import Blueprint, render_template, redirect, url_for, flash, request,
 from flask_login import login_required, current_user
 from app.models.governance_models import BoardMeeting, BoardMember, ConflictOfInterest, GovernancePolicy, BoardEvaluation
 from app.models.models import Organization, User, Document
-from app.models.subscription_models import Subscription, Feature, UsageRecord, TierFeature
 from app import db
+from app.utils.entitlements import has_feature_access
+from app.utils.usage_metering import record_feature_usage
+from app.utils.compliance_scoring import compute_compliance_scores
 from datetime import datetime, timedelta
 import os
 from werkzeug.utils import secure_filename
@@ -669,123 +671,4 @@ def compliance_report():
 # Helper functions
 def calculate_governance_score(organization_id):
     """Calculate governance compliance score (0-100)"""
-    score = 0
-    
-    # Check board composition
-    board_members = BoardMember.query.filter_by(
-        organization_id=organization_id,
-        is_active=True
-    ).count()
-    
-    if board_members >= 5:  # Good board size
-        score += 20
-    elif board_members >= 3:  # Minimum board size
-        score += 10
-    
-    # Check board meetings
-    meetings_last_year = BoardMeeting.query.filter(
-        BoardMeeting.organization_id == organization_id,
-        BoardMeeting.meeting_date >= datetime.utcnow() - timedelta(days=365),
-        BoardMeeting.status == 'completed'
-    ).count()
-    
-    if meetings_last_year >= 4:  # Quarterly meetings
-        score += 20
-    elif meetings_last_year >= 2:  # Semi-annual meetings
-        score += 10
-    
-    # Check governance policies
-    policies = GovernancePolicy.query.filter_by(
-        organization_id=organization_id,
-        status='approved'
-    ).count()
-    
-    if policies >= 3:  # Multiple policies
-        score += 20
-    elif policies >= 1:  # At least one policy
-        score += 10
-    
-    # Check conflict of interest management
-    conflicts = ConflictOfInterest.query.filter_by(
-        organization_id=organization_id
-    ).count()
-    
-    if conflicts > 0:  # Has conflict declarations
-        score += 20
-    
-    # Check board evaluations
-    evaluations = BoardEvaluation.query.filter_by(
-        organization_id=organization_id,
-        status='completed'
-    ).count()
-    
-    if evaluations > 0:  # Has completed evaluations
-        score += 20
-    
-    return min(score, 100)  # Cap at 100
-
-def has_feature_access(organization_id, feature_name):
-    """Check if organization has access to a feature based on subscription tier"""
-    # Get active subscription
-    subscription = Subscription.query.filter_by(
-        organization_id=organization_id,
-        is_active=True
-    ).first()
-    
-    if not subscription:
-        return False
-    
-    # Get feature
-    feature = Feature.query.filter_by(name=feature_name).first()
-    
-    if not feature:
-        return False
-    
-    # Check if feature is enabled for tier
-    tier_feature = db.session.query(TierFeature).filter(
-        TierFeature.tier_id == subscription.tier_id,
-        TierFeature.feature_id == feature.id,
-        TierFeature.is_enabled == True
-    ).first()
-    
-    return tier_feature is not None
-
-def record_feature_usage(organization_id, feature_name):
-    """Record usage of a feature"""
-    # Get active subscription
-    subscription = Subscription.query.filter_by(
-        organization_id=organization_id,
-        is_active=True
-    ).first()
-    
-    if not subscription:
-        return
-    
-    # Get feature
-    feature = Feature.query.filter_by(name=feature_name).first()
-    
-    if not feature:
-        return
-    
-    # Check if there's a usage record for today
-    today = datetime.utcnow().date()
-    usage_record = UsageRecord.query.filter_by(
-        subscription_id=subscription.id,
-        feature_id=feature.id,
-        date=today
-    ).first()
-    
-    if usage_record:
-        # Increment count
-        usage_record.count += 1
-    else:
-        # Create new record
-        usage_record = UsageRecord(
-            subscription_id=subscription.id,
-            feature_id=feature.id,
-            count=1,
-            date=today
-        )
-    
-    db.session.add(usage_record)
-    db.session.commit()
+    return compute_compliance_scores(organization_id, ['governance'])['governance']
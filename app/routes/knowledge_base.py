@@ -2,6 +2,8 @@ from flask import Blueprint, render_template, redirect, url_for, flash, request,
 from flask_login import login_required, current_user
 from app.models.models import LegalDocument, Form, Organization
 from app import db
+from app.utils.kb_search import search_knowledge_base
+from app.utils.json_api import paginated_collection
 from datetime import datetime
 import os
 
@@ -87,47 +89,14 @@ def search():
     if not query:
         return render_template('knowledge_base/search.html')
     
-    # Search legal documents
-    legal_documents = LegalDocument.query.filter(
-        (LegalDocument.title.ilike(f'%{query}%')) | 
-        (LegalDocument.content.ilike(f'%{query}%'))
-    ).all()
-    
-    # Search forms
-    forms = Form.query.filter(
-        (Form.name.ilike(f'%{query}%')) | 
-        (Form.form_code.ilike(f'%{query}%')) |
-        (Form.description.ilike(f'%{query}%'))
-    ).all()
-    
-    # Combine results
-    results = []
-    
-    for doc in legal_documents:
-        snippet = doc.content[:200] + '...' if len(doc.content) > 200 else doc.content
-        results.append({
-            'title': doc.title,
-            'type': doc.document_type,
-            'snippet': snippet,
-            'last_updated': doc.last_updated,
-            'url': url_for('knowledge_base.view_document', document_id=doc.id)
-        })
-    
-    for form in forms:
-        results.append({
-            'title': form.name,
-            'type': f'Form {form.form_code}',
-            'snippet': form.description[:200] + '...' if len(form.description) > 200 else form.description,
-            'last_updated': form.last_updated,
-            'url': url_for('knowledge_base.download_form', form_id=form.id)
-        })
-    
-    # Sort results by last updated date
-    results.sort(key=lambda x: x['last_updated'], reverse=True)
+    # Ranked full-text search over legal documents and forms
+    page = request.args.get('page', 1, type=int)
+    search_page = search_knowledge_base(query, page=page)
     
     return render_template('knowledge_base/search_results.html', 
                           query=query,
-                          results=results)
+                          results=search_page.results,
+                          search_page=search_page)
 
 @knowledge_base_bp.route('/guides')
 @login_required
@@ -162,35 +131,39 @@ def renewal_guide():
 @knowledge_base_bp.route('/api/documents')
 @login_required
 def api_documents():
-    """API endpoint for legal documents"""
-    documents = LegalDocument.query.all()
-    result = []
-    
-    for doc in documents:
-        result.append({
-            'id': doc.id,
-            'title': doc.title,
-            'document_type': doc.document_type,
-            'publication_date': doc.publication_date.isoformat() if doc.publication_date else None,
-            'last_updated': doc.last_updated.isoformat()
-        })
-    
-    return jsonify(result)
+    """API endpoint for legal documents, paginated with ?cursor= and ?limit="""
+    return paginated_collection(
+        LegalDocument,
+        LegalDocument.last_updated,
+        DOCUMENT_FIELDS,
+        ['id', 'title', 'document_type', 'publication_date', 'last_updated']
+    )
 
 @knowledge_base_bp.route('/api/forms')
 @login_required
 def api_forms():
-    """API endpoint for forms"""
-    forms = Form.query.all()
-    result = []
-    
-    for form in forms:
-        result.append({
-            'id': form.id,
-            'name': form.name,
-            'form_code': form.form_code,
-            'description': form.description,
-            'last_updated': form.last_updated.isoformat()
-        })
-    
-    return jsonify(result)
+    """API endpoint for forms, paginated with ?cursor= and ?limit="""
+    return paginated_collection(
+        Form,
+        Form.last_updated,
+        FORM_FIELDS,
+        ['id', 'name', 'form_code', 'description', 'last_updated']
+    )
+
+# Fields available through ?fields= on the API endpoints
+DOCUMENT_FIELDS = {
+    'id': lambda doc: doc.id,
+    'title': lambda doc: doc.title,
+    'document_type': lambda doc: doc.document_type,
+    'content': lambda doc: doc.content,
+    'publication_date': lambda doc: doc.publication_date.isoformat() if doc.publication_date else None,
+    'last_updated': lambda doc: doc.last_updated.isoformat() if doc.last_updated else None
+}
+
+FORM_FIELDS = {
+    'id': lambda form: form.id,
+    'name': lambda form: form.name,
+    'form_code': lambda form: form.form_code,
+    'description': lambda form: form.description,
+    'last_updated': lambda form: form.last_updated.isoformat() if form.last_updated else None
+}
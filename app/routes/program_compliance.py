@@ -2,8 +2,10 @@ from flask import Blueprint, render_template, redirect, url_for, flash, request,
 from flask_login import login_required, current_user
 from app.models.program_compliance_models import ProgramArea, SectorRequirement, OrganizationProgram, LocalPermit, ComplianceRisk
 from app.models.models import Organization, User, Document
-from app.models.subscription_models import Subscription, Feature, UsageRecord, TierFeature
 from app import db
+from app.utils.entitlements import has_feature_access
+from app.utils.usage_metering import record_feature_usage
+from app.utils.compliance_scoring import compute_compliance_scores
 from datetime import datetime, timedelta
 import os
 from werkzeug.utils import secure_filename
@@ -533,133 +535,4 @@ def compliance_report():
 # Helper functions
 def calculate_program_compliance_score(organization_id):
     """Calculate program compliance score (0-100)"""
-    score = 0
-    
-    # Check program areas
-    program_areas = OrganizationProgram.query.filter_by(
-        organization_id=organization_id,
-        is_active=True
-    ).count()
-    
-    if program_areas > 0:
-        score += 10  # Has defined program areas
-    
-    # Check local permits
-    active_permits = LocalPermit.query.filter_by(
-        organization_id=organization_id,
-        status='active'
-    ).count()
-    
-    expired_permits = LocalPermit.query.filter_by(
-        organization_id=organization_id,
-        status='expired'
-    ).count()
-    
-    if active_permits > 0 and expired_permits == 0:
-        score += 30  # All permits active
-    elif active_permits > 0:
-        score += 15  # Some permits active
-    
-    # Check compliance risks
-    critical_risks = ComplianceRisk.query.filter_by(
-        organization_id=organization_id,
-        risk_level='critical',
-        status='identified'
-    ).count()
-    
-    high_risks = ComplianceRisk.query.filter_by(
-        organization_id=organization_id,
-        risk_level='high',
-        status='identified'
-    ).count()
-    
-    mitigated_risks = ComplianceRisk.query.filter_by(
-        organization_id=organization_id,
-        status='mitigated'
-    ).count()
-    
-    if critical_risks == 0 and high_risks == 0:
-        score += 30  # No critical or high risks
-    elif critical_risks == 0:
-        score += 20  # No critical risks
-    elif high_risks == 0:
-        score += 10  # No high risks
-    
-    if mitigated_risks > 0:
-        score += 10  # Has mitigated risks
-    
-    # Check if has any risks identified (showing risk assessment activity)
-    total_risks = ComplianceRisk.query.filter_by(
-        organization_id=organization_id
-    ).count()
-    
-    if total_risks > 0:
-        score += 10  # Has conducted risk assessment
-    
-    return min(score, 100)  # Cap at 100
-
-def has_feature_access(organization_id, feature_name):
-    """Check if organization has access to a feature based on subscription tier"""
-    # Get active subscription
-    subscription = Subscription.query.filter_by(
-        organization_id=organization_id,
-        is_active=True
-    ).first()
-    
-    if not subscription:
-        return False
-    
-    # Get feature
-    feature = Feature.query.filter_by(name=feature_name).first()
-    
-    if not feature:
-        return False
-    
-    # Check if feature is enabled for tier
-    tier_feature = db.session.query(TierFeature).filter(
-        TierFeature.tier_id == subscription.tier_id,
-        TierFeature.feature_id == feature.id,
-        TierFeature.is_enabled == True
-    ).first()
-    
-    return tier_feature is not None
-
-def record_feature_usage(organization_id, feature_name):
-    """Record usage of a feature"""
-    # Get active subscription
-    subscription = Subscription.query.filter_by(
-        organization_id=organization_id,
-        is_active=True
-    ).first()
-    
-    if not subscription:
-        return
-    
-    # Get feature
-    feature = Feature.query.filter_by(name=feature_name).first()
-    
-    if not feature:
-        return
-    
-    # Check if there's a usage record for today
-    today = datetime.utcnow().date()
-    usage_record = UsageRecord.query.filter_by(
-        subscription_id=subscription.id,
-        feature_id=feature.id,
-        date=today
-    ).first()
-    
-    if usage_record:
-        # Increment count
-        usage_record.count += 1
-    else:
-        # Create new record
-        usage_record = UsageRecord(
-            subscription_id=subscription.id,
-            feature_id=feature.id,
-            count=1,
-            date=today
-        )
-    
-    db.session.add(usage_record)
-    db.session.commit()
+    return compute_compliance_scores(organization_id, ['program'])['program']
@@ -7,7 +7,9 @@ from datetime import datetime, timedelta
 import json
 import uuid
 import stripe
-from app.utils.security import feature_required, has_feature_access, record_feature_usage
+from app.utils.security import feature_required, has_feature_access
+from app.utils.usage_metering import record_feature_usage
+from app.utils.usage_rollup import get_month_totals, get_usage_rollup
 
 subscription_bp = Blueprint('subscription', __name__)
 
@@ -35,33 +37,23 @@ def index():
     usage_data = {}
     if active_subscription:
         # Get current month's usage
-        current_month = datetime.utcnow().replace(day=1).date()
-        usage_records = UsageRecord.query.filter(
-            UsageRecord.subscription_id == active_subscription.id,
-            UsageRecord.date >= current_month
-        ).all()
-        
-        # Group by feature
-        for record in usage_records:
-            feature = Feature.query.get(record.feature_id)
-            if feature.name not in usage_data:
-                usage_data[feature.name] = 0
-            usage_data[feature.name] += record.count
+        usage_data.update(get_month_totals(active_subscription.id))
         
         # Get tier features with limits
-        tier_features = TierFeature.query.filter_by(
-            tier_id=active_subscription.tier_id
+        tier_features = db.session.query(TierFeature, Feature.name).join(
+            Feature, Feature.id == TierFeature.feature_id
+        ).filter(
+            TierFeature.tier_id == active_subscription.tier_id
         ).all()
         
         # Add limits to usage data
-        for tf in tier_features:
-            feature = Feature.query.get(tf.feature_id)
-            if feature.name not in usage_data:
-                usage_data[feature.name] = 0
+        for tf, feature_name in tier_features:
+            if feature_name not in usage_data:
+                usage_data[feature_name] = 0
             
             # Add limit information
-            usage_data[f"{feature.name}_limit"] = tf.usage_limit
-            usage_data[f"{feature.name}_enabled"] = tf.is_enabled
+            usage_data[f"{feature_name}_limit"] = tf.usage_limit
+            usage_data[f"{feature_name}_enabled"] = tf.is_enabled
     
     return render_template('subscription/index.html',
                           organization=organization,
@@ -268,25 +260,11 @@ def usage_report():
         flash('No active subscription found.', 'warning')
         return redirect(url_for('subscription.index'))
     
-    # Get usage records for active subscription
-    usage_records = UsageRecord.query.filter_by(
-        subscription_id=active_subscription.id
-    ).order_by(UsageRecord.date.desc()).all()
-    
-    # Group by feature and date
-    usage_data = {}
-    feature_names = {}
-    
-    for record in usage_records:
-        feature = Feature.query.get(record.feature_id)
-        feature_names[feature.id] = feature.name
-        
-        date_str = record.date.strftime('%Y-%m-%d')
-        
-        if feature.id not in usage_data:
-            usage_data[feature.id] = {}
-        
-        usage_data[feature.id][date_str] = record.count
+    # Get aggregated usage for active subscription
+    rollup = get_usage_rollup(active_subscription.id)
+    usage_data = rollup['daily']
+    monthly_usage = rollup['monthly']
+    feature_names = rollup['feature_names']
     
     # Get tier features with limits
     tier_features = TierFeature.query.filter_by(
@@ -302,6 +280,7 @@ def usage_report():
                           organization=organization,
                           subscription=active_subscription,
                           usage_data=usage_data,
+                          monthly_usage=monthly_usage,
                           feature_names=feature_names,
                           limits=limits)
 
@@ -459,44 +438,3 @@ def freemium():
     
     flash('Freemium tier activated successfully.', 'success')
     return redirect(url_for('subscription.index'))
-
-# Helper function to record feature usage
-def record_feature_usage(organization_id, feature_name):
-    """Record usage of a feature"""
-    # Get active subscription
-    subscription = Subscription.query.filter_by(
-        organization_id=organization_id,
-        is_active=True
-    ).first()
-    
-    if not subscription:
-        return
-    
-    # Get feature
-    feature = Feature.query.filter_by(name=feature_name).first()
-    
-    if not feature:
-        return
-    
-    # Check if there's a usage record for today
-    today = datetime.utcnow().date()
-    usage_record = UsageRecord.query.filter_by(
-        subscription_id=subscription.id,
-        feature_id=feature.id,
-        date=today
-    ).first()
-    
-    if usage_record:
-        # Increment count
-        usage_record.count += 1
-    else:
-        # Create new record
-        usage_record = UsageRecord(
-            subscription_id=subscription.id,
-            feature_id=feature.id,
-            count=1,
-            date=today
-        )
-    
-    db.session.add(usage_record)
-    db.session.commit()
@@ -0,0 +1,241 @@
+from sqlalchemy import select, func, case, and_, or_
+from app.models.analytics_models import ComplianceScore, ComplianceSnapshot
+from app.models.models import Organization, Document, ComplianceTask
+from app.models.financial_models import FinancialReport, TaxExemption, AuditFinding, FinancialPolicy
+from app.models.governance_models import BoardMeeting, BoardMember, ConflictOfInterest, GovernancePolicy, BoardEvaluation
+from app.models.program_compliance_models import OrganizationProgram, LocalPermit, ComplianceRisk
+from app.models.data_protection_models import DataProtectionAssessment, ConsentRecord, DataBreachRecord, PDPORegistration, DataProtectionPolicy
+from app.utils.compliance_scoring import SCORE_CATEGORIES, OVERALL_CATEGORIES, SCORING_RULES
+from app import db
+from datetime import datetime, timedelta
+import json
+import pandas as pd
+
+# Rows written per INSERT statement
+INSERT_CHUNK_SIZE = 5000
+
+def score_all_organizations(now=None):
+    """
+    Compute every category score for all organizations
+
+    The figures behind the scores are collected with one GROUP BY query per
+    source table, so the cost does not grow with a query per organization.
+    The scoring rules of app.utils.compliance_scoring are then applied to
+    each organization's figures.
+
+    Args:
+        now (datetime, optional): Reference time. Defaults to the current time.
+
+    Returns:
+        DataFrame: One row per organization ID with the collected figures,
+            a column per category score and an 'overall' column
+    """
+    now = now or datetime.utcnow()
+    frame = collect_measures(now)
+
+    # The figures are all in memory, so applying the rules per organization is cheap
+    records = frame.to_dict(orient='records')
+
+    for category in SCORE_CATEGORIES:
+        frame[category] = [float(SCORING_RULES[category](counts)) for counts in records]
+
+    frame['overall'] = frame[OVERALL_CATEGORIES].mean(axis=1)
+
+    return frame
+
+def snapshot_all_organizations(now=None):
+    """
+    Score all organizations and store a ComplianceSnapshot and ComplianceScore rows for each
+
+    Everything is written with chunked multi-row inserts in one transaction.
+
+    Args:
+        now (datetime, optional): Snapshot time. Defaults to the current time.
+
+    Returns:
+        int: Number of organizations snapshotted
+    """
+    now = now or datetime.utcnow()
+    frame = score_all_organizations(now)
+
+    if frame.empty:
+        return 0
+
+    categories = SCORE_CATEGORIES + ['overall']
+    metrics = frame[categories].round(2).to_dict(orient='records')
+
+    snapshots = pd.DataFrame({
+        'organization_id': frame.index,
+        'snapshot_date': now,
+        'compliance_score': frame['overall'].to_numpy(),
+        'tasks_total': frame['tasks_total'].to_numpy(),
+        'tasks_completed': frame['tasks_completed'].to_numpy(),
+        'documents_total': frame['documents'].to_numpy(),
+        # Documents carry no expiry date, so every document on file is valid
+        'documents_valid': frame['documents'].to_numpy(),
+        'risks_total': frame['total_risks'].to_numpy(),
+        'risks_mitigated': frame['mitigated_risks'].to_numpy(),
+        'metrics_data': [json.dumps(scores) for scores in metrics]
+    })
+
+    scores = frame[categories].rename_axis('organization_id').reset_index().melt(
+        id_vars='organization_id', var_name='category', value_name='score'
+    )
+    scores['created_at'] = now
+
+    _bulk_insert(ComplianceSnapshot.__table__, snapshots)
+    _bulk_insert(ComplianceScore.__table__, scores)
+    # Every organization was just scored, so older scores are superseded
+    db.session.execute(ComplianceScore.__table__.delete().where(ComplianceScore.created_at < now))
+    db.session.commit()
+
+    return len(frame)
+
+def collect_measures(now):
+    """
+    Collect the figures the scoring rules read for every organization
+
+    Args:
+        now (datetime): Reference time
+
+    Returns:
+        DataFrame: Figures indexed by organization ID, zero where a table has no rows
+    """
+    last_year = now.year - 1
+
+    frame = _grouped(
+        Organization.id,
+        registration_number=_count_if(
+            Organization.registration_number != None,
+            Organization.registration_number != ''
+        ),
+        permit_valid=_count_if(Organization.permit_expiry_date > now),
+        permit_expiring=_count_if(
+            Organization.permit_expiry_date > now,
+            Organization.permit_expiry_date <= now + timedelta(days=90)
+        )
+    )
+
+    parts = [
+        _grouped(Document.organization_id, documents=func.count()),
+        _grouped(
+            ComplianceTask.organization_id,
+            tasks_total=func.count(),
+            tasks_completed=_count_if(ComplianceTask.completed == True),
+            tasks_overdue=_count_if(ComplianceTask.completed == False, ComplianceTask.due_date < now)
+        ),
+        _first_per_organization(
+            FinancialReport,
+            'annual_return_points',
+            case(
+                (FinancialReport.status == 'submitted', 30),
+                (FinancialReport.status == 'final', 20),
+                (FinancialReport.status == 'draft', 10),
+                else_=0
+            ),
+            FinancialReport.report_type == 'annual_return',
+            FinancialReport.fiscal_year.like(f"%{last_year}%")
+        ),
+        _grouped(TaxExemption.organization_id, tax_exemptions=_count_if(TaxExemption.status == 'active')),
+        _grouped(FinancialPolicy.organization_id, financial_policies=_count_if(FinancialPolicy.status == 'approved')),
+        _grouped(
+            FinancialReport.organization_id,
+            open_findings=_count_if(AuditFinding.status == 'open'),
+            join=(AuditFinding, AuditFinding.report_id == FinancialReport.id)
+        ),
+        _grouped(BoardMember.organization_id, board_members=_count_if(BoardMember.is_active == True)),
+        _grouped(
+            BoardMeeting.organization_id,
+            meetings_last_year=_count_if(
+                BoardMeeting.meeting_date >= now - timedelta(days=365),
+                BoardMeeting.status == 'completed'
+            )
+        ),
+        _grouped(GovernancePolicy.organization_id, governance_policies=_count_if(GovernancePolicy.status == 'approved')),
+        _grouped(ConflictOfInterest.organization_id, conflict_declarations=func.count()),
+        _grouped(BoardEvaluation.organization_id, board_evaluations=_count_if(BoardEvaluation.status == 'completed')),
+        _grouped(OrganizationProgram.organization_id, program_areas=_count_if(OrganizationProgram.is_active == True)),
+        _grouped(
+            LocalPermit.organization_id,
+            active_permits=_count_if(LocalPermit.status == 'active'),
+            expired_permits=_count_if(LocalPermit.status == 'expired')
+        ),
+        _grouped(
+            ComplianceRisk.organization_id,
+            critical_risks=_count_if(ComplianceRisk.risk_level == 'critical', ComplianceRisk.status == 'identified'),
+            high_risks=_count_if(ComplianceRisk.risk_level == 'high', ComplianceRisk.status == 'identified'),
+            mitigated_risks=_count_if(ComplianceRisk.status == 'mitigated'),
+            total_risks=func.count()
+        ),
+        _first_per_organization(
+            PDPORegistration,
+            'pdpo_points',
+            case(
+                (PDPORegistration.status == 'registered', 30),
+                (PDPORegistration.status == 'pending', 15),
+                else_=0
+            ) + case(
+                (PDPORegistration.annual_report_submitted == True, 10),
+                else_=0
+            )
+        ),
+        _grouped(
+            DataProtectionPolicy.organization_id,
+            data_protection_policies=_count_if(DataProtectionPolicy.status == 'active')
+        ),
+        _grouped(
+            DataProtectionAssessment.organization_id,
+            completed_assessments=_count_if(DataProtectionAssessment.status == 'completed')
+        ),
+        _grouped(ConsentRecord.organization_id, consent_records=func.count()),
+        _grouped(
+            DataBreachRecord.organization_id,
+            mishandled_breaches=_count_if(or_(
+                DataBreachRecord.reported_to_authority.isnot(True),
+                DataBreachRecord.subjects_notified.isnot(True)
+            ))
+        )
+    ]
+
+    # Left join onto the organizations so rows from deleted organizations are dropped
+    frame = frame.join(parts, how='left')
+
+    return frame.fillna(0).astype('int64')
+
+def _count_if(*criteria):
+    return func.sum(case((and_(*criteria), 1), else_=0))
+
+def _grouped(organization_column, join=None, **columns):
+    """Run one GROUP BY organization query and return it as a DataFrame"""
+    stmt = select(
+        organization_column.label('organization_id'),
+        *[expression.label(name) for name, expression in columns.items()]
+    )
+
+    if join is not None:
+        stmt = stmt.join(*join)
+
+    rows = db.session.execute(stmt.group_by(organization_column)).all()
+
+    return pd.DataFrame(
+        rows, columns=['organization_id'] + list(columns)
+    ).dropna(subset=['organization_id']).set_index('organization_id')
+
+def _first_per_organization(model, name, expression, *criteria):
+    """Get a value from each organization's first matching row, matching .first() ordering by ID"""
+    stmt = select(
+        model.organization_id, model.id, expression.label(name)
+    ).where(*criteria)
+
+    frame = pd.DataFrame(db.session.execute(stmt).all(), columns=['organization_id', 'id', name])
+
+    return frame.dropna(subset=['organization_id']).sort_values('id').drop_duplicates(
+        'organization_id'
+    ).set_index('organization_id')[[name]]
+
+def _bulk_insert(table, frame):
+    """Insert a DataFrame into a table in chunks of multi-row inserts"""
+    records = frame.to_dict(orient='records')
+
+    for start in range(0, len(records), INSERT_CHUNK_SIZE):
+        db.session.execute(table.insert(), records[start:start + INSERT_CHUNK_SIZE])
@@ -0,0 +1,285 @@
+from flask import current_app
+from sqlalchemy import func
+from app.models.analytics_models import ComplianceBenchmark, ComplianceScore
+from app.models.models import User
+from app.models.program_compliance_models import ProgramArea, OrganizationProgram
+from app.utils.compliance_scoring import SCORE_CATEGORIES, get_compliance_scores
+from app import db
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from datetime import datetime
+import json
+import threading
+import time
+
+# Sector used for organizations without an active program area
+DEFAULT_SECTOR = 'General'
+
+# Organization size by number of user accounts: (upper bound, size)
+ORGANIZATION_SIZE_BANDS = [(5, 'small'), (20, 'medium')]
+LARGEST_SIZE = 'large'
+
+# Cohort of every organization, used when a sector cohort is too small
+ALL_SECTORS = 'All'
+ALL_SIZES = 'all'
+MIN_SAMPLE_SIZE = 5
+
+BENCHMARK_CATEGORIES = SCORE_CATEGORIES + ['overall']
+
+# Benchmark figures for one category of a cohort
+CohortBenchmark = namedtuple('CohortBenchmark', ['average', 'median', 'top_quartile', 'sample_size', 'scores'])
+
+# In-process cache of cohort benchmarks, keyed by (sector, organization_size).
+# Each entry is (loaded_at, {category: CohortBenchmark}).
+_cohort_cache = {}
+_cache_lock = threading.Lock()
+
+DEFAULT_CACHE_TTL = 3600
+
+def rebuild_benchmarks(now=None):
+    """
+    Recompute benchmarks for every (sector, organization size, category) cohort
+
+    Uses the latest stored score of each organization. All cohorts are
+    aggregated in one vectorized pass and the previous benchmarks are
+    replaced in a single transaction.
+
+    Args:
+        now (datetime, optional): Effective date. Defaults to the current time.
+
+    Returns:
+        int: Number of benchmark rows written
+    """
+    # Imported on first use; the request path only needs the cached lookups
+    import pandas as pd
+
+    now = now or datetime.utcnow()
+
+    scores = get_latest_score_frame()
+
+    if scores.empty:
+        return 0
+
+    scores = scores.join(get_organization_cohorts(), on='organization_id')
+    scores['sector'] = scores['sector'].fillna(DEFAULT_SECTOR)
+    scores['organization_size'] = scores['organization_size'].fillna(organization_size(0))
+
+    # Every organization also counts towards the fleet-wide cohort
+    fleet = scores.assign(sector=ALL_SECTORS, organization_size=ALL_SIZES)
+    scores = pd.concat([scores, fleet], ignore_index=True).sort_values('score')
+
+    grouped = scores.groupby(['sector', 'organization_size', 'category'])['score']
+    stats = grouped.agg(['mean', 'median', 'count', list]).join(
+        grouped.quantile(0.75).rename('top_quartile')
+    ).reset_index()
+
+    db.session.query(ComplianceBenchmark).delete(synchronize_session=False)
+    db.session.execute(ComplianceBenchmark.__table__.insert(), [
+        {
+            'sector': row.sector,
+            'organization_size': row.organization_size,
+            'metric_name': row.category,
+            'average_value': float(row.mean),
+            'median_value': float(row.median),
+            'top_quartile_value': float(row.top_quartile),
+            'sample_size': int(row.count),
+            # Already sorted, since the frame was sorted before grouping
+            'score_distribution': json.dumps(row.list),
+            'effective_date': now,
+            'created_at': now,
+            'updated_at': now
+        }
+        for row in stats.itertuples(index=False)
+    ])
+    db.session.commit()
+
+    invalidate_benchmarks()
+
+    return len(stats)
+
+def get_latest_score_frame():
+    """
+    Get the latest stored score of every organization and category
+
+    Returns:
+        DataFrame: Columns organization_id, category and score
+    """
+    import pandas as pd
+
+    latest = db.session.query(
+        func.max(ComplianceScore.id).label('id')
+    ).group_by(ComplianceScore.organization_id, ComplianceScore.category).subquery()
+
+    rows = db.session.query(
+        ComplianceScore.organization_id, ComplianceScore.category, ComplianceScore.score
+    ).join(
+        latest, ComplianceScore.id == latest.c.id
+    ).filter(
+        ComplianceScore.category.in_(BENCHMARK_CATEGORIES)
+    ).all()
+
+    return pd.DataFrame(rows, columns=['organization_id', 'category', 'score'])
+
+def get_organization_cohorts():
+    """
+    Get the sector and size of every organization with users or programs
+
+    Returns:
+        DataFrame: Columns sector and organization_size, indexed by organization ID
+    """
+    import pandas as pd
+
+    sectors = pd.DataFrame(_sector_rows(), columns=['organization_id', 'id', 'sector'])
+    sectors = sectors.sort_values('id').drop_duplicates('organization_id').set_index('organization_id')[['sector']]
+
+    users = pd.DataFrame(_user_count_rows(), columns=['organization_id', 'users']).set_index('organization_id')
+
+    cohorts = sectors.join(users, how='outer')
+    cohorts['sector'] = cohorts['sector'].fillna(DEFAULT_SECTOR)
+    cohorts['organization_size'] = cohorts['users'].fillna(0).map(organization_size)
+
+    return cohorts[['sector', 'organization_size']]
+
+def get_organization_cohort(organization_id):
+    """
+    Get the sector and size of an organization
+
+    Args:
+        organization_id (int): Organization ID
+
+    Returns:
+        tuple: (sector, organization_size)
+    """
+    sector = db.session.query(ProgramArea.name).join(
+        OrganizationProgram, OrganizationProgram.program_area_id == ProgramArea.id
+    ).filter(
+        OrganizationProgram.organization_id == organization_id,
+        OrganizationProgram.is_active == True
+    ).order_by(OrganizationProgram.id).limit(1).scalar()
+
+    users = db.session.query(func.count(User.id)).filter(
+        User.organization_id == organization_id
+    ).scalar()
+
+    return sector or DEFAULT_SECTOR, organization_size(users or 0)
+
+def organization_size(user_count):
+    """Get the size band for an organization with a number of user accounts"""
+    for upper_bound, size in ORGANIZATION_SIZE_BANDS:
+        if user_count < upper_bound:
+            return size
+    return LARGEST_SIZE
+
+def get_cohort_benchmarks(sector, size):
+    """Get a cohort's benchmarks keyed by category, cached in-process"""
+    ttl = current_app.config.get('BENCHMARK_CACHE_TTL', DEFAULT_CACHE_TTL)
+    now = time.monotonic()
+    key = (sector, size)
+
+    with _cache_lock:
+        entry = _cohort_cache.get(key)
+
+    if entry and now - entry[0] < ttl:
+        return entry[1]
+
+    rows = ComplianceBenchmark.query.filter_by(
+        sector=sector,
+        organization_size=size
+    ).all()
+
+    benchmarks = {
+        row.metric_name: CohortBenchmark(
+            row.average_value,
+            row.median_value,
+            row.top_quartile_value,
+            row.sample_size,
+            row.get_score_distribution()
+        )
+        for row in rows
+    }
+
+    with _cache_lock:
+        _cohort_cache[key] = (now, benchmarks)
+
+    return benchmarks
+
+def invalidate_benchmarks():
+    """Drop all cached cohort benchmarks"""
+    with _cache_lock:
+        _cohort_cache.clear()
+
+def percentile_rank(sorted_scores, score):
+    """
+    Get the percentile rank of a score within a sorted list of scores
+
+    Ties count as half below and half above the score.
+
+    Args:
+        sorted_scores (list): Scores in ascending order
+        score (float): Score to rank
+
+    Returns:
+        float: Percentile rank (0-100), or None if there are no scores
+    """
+    if not sorted_scores:
+        return None
+
+    below = bisect_left(sorted_scores, score)
+    at_or_below = bisect_right(sorted_scores, score)
+
+    return 100 * (below + at_or_below) / (2 * len(sorted_scores))
+
+def get_benchmarks(organization_id):
+    """Get compliance benchmarks against similar organizations"""
+    scores = get_compliance_scores(organization_id)
+    sector, size = get_organization_cohort(organization_id)
+
+    cohort = get_cohort_benchmarks(sector, size)
+    fleet = get_cohort_benchmarks(ALL_SECTORS, ALL_SIZES)
+
+    benchmark_data = {}
+    for category in BENCHMARK_CATEGORIES:
+        your_score = scores.get(category, 0)
+
+        # Fall back to all organizations when the cohort is too small to compare against
+        benchmark = cohort.get(category)
+        if benchmark is None or benchmark.sample_size < MIN_SAMPLE_SIZE:
+            benchmark = fleet.get(category)
+
+        if benchmark is None:
+            benchmark_data[category] = {
+                'your_score': your_score,
+                'sector_avg': your_score,
+                'median': your_score,
+                'top_quartile': your_score,
+                'percentile': None,
+                'sample_size': 0
+            }
+            continue
+
+        benchmark_data[category] = {
+            'your_score': your_score,
+            'sector_avg': round(benchmark.average, 1),
+            'median': round(benchmark.median, 1),
+            'top_quartile': round(benchmark.top_quartile, 1),
+            'percentile': round(percentile_rank(benchmark.scores, your_score), 1),
+            'sample_size': benchmark.sample_size
+        }
+
+    return benchmark_data
+
+def _sector_rows():
+    return db.session.query(
+        OrganizationProgram.organization_id, OrganizationProgram.id, ProgramArea.name
+    ).join(
+        ProgramArea, OrganizationProgram.program_area_id == ProgramArea.id
+    ).filter(
+        OrganizationProgram.is_active == True
+    ).all()
+
+def _user_count_rows():
+    return db.session.query(
+        User.organization_id, func.count(User.id)
+    ).filter(
+        User.organization_id != None
+    ).group_by(User.organization_id).all()
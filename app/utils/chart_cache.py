@@ -0,0 +1,161 @@
+from flask import current_app
+from app.utils.chart_renderer import chart_renderer
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+# Bump to invalidate every cached chart after changing how charts are drawn
+CHART_VERSION = 2
+
+_janitor_lock = threading.Lock()
+_last_janitor_run = 0.0
+
+logger = logging.getLogger(__name__)
+
+def chart_key(chart_type, data):
+    """
+    Get the content address of a chart
+
+    Args:
+        chart_type (str): Kind of chart, e.g. 'compliance_trends'
+        data: JSON-serializable data the chart is drawn from
+
+    Returns:
+        str: Hex digest identifying the rendered chart
+    """
+    payload = json.dumps(
+        {'type': chart_type, 'version': CHART_VERSION, 'data': data},
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def get_charts_folder():
+    """Get the directory rendered charts are stored in, creating it if needed"""
+    charts_folder = os.path.join(current_app.root_path, 'static', 'charts')
+
+    if not os.path.exists(charts_folder):
+        os.makedirs(charts_folder, exist_ok=True)
+
+    return charts_folder
+
+def get_or_render_chart(chart_type, data):
+    """
+    Get a chart for some data, rendering it only if it is not cached
+
+    Charts are stored under a name derived from their type and data, so an
+    unchanged chart is served from the existing file without any plotting.
+
+    Args:
+        chart_type (str): Kind of chart, e.g. 'compliance_trends'
+        data: JSON-serializable data the chart is drawn from
+
+    Returns:
+        str: Path of the chart relative to the static folder, or None if it could not be rendered
+    """
+    return get_or_render_charts({chart_type: (chart_type, data)})[chart_type]
+
+def get_or_render_charts(charts):
+    """
+    Get several charts, rendering the ones that are not cached in parallel
+
+    Args:
+        charts (dict): Mapping of a name to a (chart_type, data) tuple
+
+    Returns:
+        dict: Mapping of each name to the chart path relative to the static
+            folder, or None if that chart could not be rendered
+    """
+    charts_folder = get_charts_folder()
+    paths = {}
+    jobs = []
+
+    for name, (chart_type, data) in charts.items():
+        filename = f'{chart_type}_{chart_key(chart_type, data)[:32]}.png'
+        filepath = os.path.join(charts_folder, filename)
+        paths[name] = (filepath, os.path.join('charts', filename))
+
+        if os.path.exists(filepath):
+            # Refresh the modification time so eviction drops least recently used charts
+            try:
+                os.utime(filepath)
+            except OSError:
+                pass
+        else:
+            jobs.append((chart_type, data, filepath))
+
+    errors = {}
+    if jobs:
+        errors = chart_renderer.render_many(jobs)
+        maybe_evict_charts()
+
+    return {
+        name: None if filepath in errors else relative_path
+        for name, (filepath, relative_path) in paths.items()
+    }
+
+def maybe_evict_charts():
+    """Run the eviction janitor if it has not run within CHART_JANITOR_INTERVAL"""
+    global _last_janitor_run
+
+    interval = current_app.config.get('CHART_JANITOR_INTERVAL', 600)
+    now = time.monotonic()
+
+    if now - _last_janitor_run < interval or not _janitor_lock.acquire(blocking=False):
+        return
+
+    try:
+        _last_janitor_run = now
+        evict_charts()
+    except OSError as e:
+        logger.error(f"Error evicting cached charts: {str(e)}")
+    finally:
+        _janitor_lock.release()
+
+def evict_charts(max_bytes=None, max_age=None):
+    """
+    Delete cached charts that are too old, then the least recently used until under the size limit
+
+    Args:
+        max_bytes (int, optional): Size limit of the charts directory. Defaults to CHART_CACHE_MAX_BYTES.
+        max_age (int, optional): Maximum age in seconds since last use. Defaults to CHART_CACHE_MAX_AGE.
+
+    Returns:
+        int: Number of files deleted
+    """
+    if max_bytes is None:
+        max_bytes = current_app.config.get('CHART_CACHE_MAX_BYTES', 100 * 1024 * 1024)
+    if max_age is None:
+        max_age = current_app.config.get('CHART_CACHE_MAX_AGE', 7 * 24 * 3600)
+
+    charts_folder = get_charts_folder()
+    cutoff = time.time() - max_age
+
+    files = []
+    for entry in os.scandir(charts_folder):
+        if entry.is_file() and entry.name.endswith('.png') and not entry.name.startswith('.'):
+            stat = entry.stat()
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+
+    # Oldest first
+    files.sort()
+
+    deleted = 0
+    total_size = sum(size for _, size, _ in files)
+
+    for mtime, size, path in files:
+        if mtime >= cutoff and total_size <= max_bytes:
+            break
+
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+        total_size -= size
+        deleted += 1
+
+    return deleted
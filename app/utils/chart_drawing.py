@@ -0,0 +1,166 @@
+"""Chart drawing run inside the chart renderer's worker processes
+
+Worker processes import this module to unpickle their jobs, so it must not
+import the application factory, models or anything that needs an
+application context. Only the standard library and matplotlib are used.
+"""
+import os
+import tempfile
+
+def render_chart(chart_type, data, filepath):
+    """
+    Render a chart and move it into place atomically
+
+    Runs inside the worker processes. The chart is written to a temporary
+    file next to its destination first, so readers never see a partial PNG.
+
+    Args:
+        chart_type (str): Kind of chart, a key of CHART_RENDERERS
+        data: Data the chart is drawn from
+        filepath (str): Where to write the PNG
+    """
+    fd, temp_path = tempfile.mkstemp(prefix='.render-', suffix='.png', dir=os.path.dirname(filepath))
+    os.close(fd)
+
+    try:
+        CHART_RENDERERS[chart_type](data, temp_path)
+        os.replace(temp_path, filepath)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def _new_figure(figsize):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+
+    return fig
+
+def render_compliance_health_chart(data, filepath):
+    """Draw the compliance health radar chart to a file"""
+    import numpy as np
+
+    categories = data['categories']
+    values = list(data['values'])
+
+    # Number of variables
+    N = len(categories)
+
+    # What will be the angle of each axis in the plot
+    angles = [n / float(N) * 2 * np.pi for n in range(N)]
+    angles += angles[:1]
+
+    # Values need to be repeated for the plot to be closed
+    values += values[:1]
+
+    fig = _new_figure((8, 8))
+    ax = fig.add_subplot(111, polar=True)
+
+    # Draw one axis per variable and add labels
+    ax.set_xticks(angles[:-1])
+    ax.set_xticklabels(categories, size=12)
+
+    # Draw ylabels
+    ax.set_rlabel_position(0)
+    ax.set_yticks([20, 40, 60, 80, 100])
+    ax.set_yticklabels(["20", "40", "60", "80", "100"], color="grey", size=10)
+    ax.set_ylim(0, 100)
+
+    # Plot data
+    ax.plot(angles, values, linewidth=2, linestyle='solid')
+
+    # Fill area
+    ax.fill(angles, values, 'b', alpha=0.1)
+
+    ax.set_title('Compliance Health Score', size=15, y=1.1)
+
+    fig.savefig(filepath, format='png')
+
+def render_trends_chart(data, filepath):
+    """Draw the compliance trends line chart to a file"""
+    fig = _new_figure((10, 6))
+    ax = fig.add_subplot(111)
+
+    ax.plot(data['months'], data['scores'], marker='o', linestyle='-', linewidth=2)
+
+    ax.set_xlabel('Month')
+    ax.set_ylabel('Compliance Score')
+    ax.set_title('Compliance Score Trend')
+    ax.grid(True, linestyle='--', alpha=0.7)
+    ax.set_ylim(0, 100)
+
+    # Rotate x-axis labels for better readability
+    ax.tick_params(axis='x', labelrotation=45)
+
+    fig.tight_layout()
+    fig.savefig(filepath, format='png')
+
+def render_benchmarks_chart(data, filepath):
+    """Draw the compliance benchmarks bar chart to a file"""
+    import numpy as np
+
+    categories = data['categories']
+
+    # Set up bar positions
+    x = np.arange(len(categories))
+    width = 0.25
+
+    fig = _new_figure((12, 7))
+    ax = fig.add_subplot(111)
+
+    ax.bar(x - width, data['your_scores'], width, label='Your Score')
+    ax.bar(x, data['sector_avgs'], width, label='Sector Average')
+    ax.bar(x + width, data['top_quartiles'], width, label='Top Quartile')
+
+    ax.set_xlabel('Compliance Category')
+    ax.set_ylabel('Score')
+    ax.set_title('Compliance Benchmarks')
+    ax.set_xticks(x)
+    ax.set_xticklabels(categories)
+    ax.set_ylim(0, 100)
+    ax.legend()
+    ax.grid(True, linestyle='--', alpha=0.3, axis='y')
+
+    fig.tight_layout()
+    fig.savefig(filepath, format='png')
+
+def render_cost_chart(costs, filepath):
+    """Draw the compliance cost pie and bar charts to a file"""
+    from matplotlib.ticker import FuncFormatter
+
+    fig = _new_figure((15, 7))
+    ax1, ax2 = fig.subplots(1, 2)
+
+    # Pie chart for category distribution
+    categories = list(costs['categories'].keys())
+    amounts = [costs['categories'][cat]['amount'] for cat in categories]
+    display_categories = [cat.capitalize() for cat in categories]
+
+    ax1.pie(amounts, labels=display_categories, autopct='%1.1f%%', startangle=90)
+    ax1.axis('equal')  # Equal aspect ratio ensures that pie is drawn as a circle
+    ax1.set_title('Compliance Cost Distribution by Category')
+
+    # Bar chart for monthly costs
+    months = [item['month'] for item in costs['monthly']]
+    monthly_amounts = [item['amount'] for item in costs['monthly']]
+
+    ax2.bar(months, monthly_amounts)
+    ax2.set_xlabel('Month')
+    ax2.set_ylabel('Cost (UGX)')
+    ax2.set_title('Monthly Compliance Costs')
+    ax2.grid(True, linestyle='--', alpha=0.3, axis='y')
+
+    # Format y-axis labels with commas for thousands
+    ax2.yaxis.set_major_formatter(FuncFormatter(lambda x, loc: "{:,}".format(int(x))))
+
+    fig.tight_layout()
+    fig.savefig(filepath, format='png')
+
+CHART_RENDERERS = {
+    'compliance_health': render_compliance_health_chart,
+    'compliance_trends': render_trends_chart,
+    'compliance_benchmarks': render_benchmarks_chart,
+    'compliance_costs': render_cost_chart
+}
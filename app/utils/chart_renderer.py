@@ -0,0 +1,161 @@
+from flask import current_app
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from app.utils.chart_drawing import render_chart
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+import time
+
+class ChartRenderError(Exception):
+    """Raised when a chart could not be rendered in time"""
+    pass
+
+class ChartRenderer:
+    """Process pool that renders analytics charts outside request threads
+
+    Charts are drawn with the object-oriented Figure/Agg API, so no pyplot
+    global state is shared. The number of charts waiting for or being
+    rendered is bounded, and callers wait at most CHART_RENDER_TIMEOUT
+    seconds for a chart before giving up on it.
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._slots = None
+        self._lock = threading.Lock()
+        self._app = None
+        self.logger = logging.getLogger(__name__)
+
+    def init_app(self, app):
+        """
+        Bind the renderer to an application and register the pool shutdown
+
+        Args:
+            app: Flask application instance
+        """
+        app.config.setdefault('CHART_RENDER_WORKERS', 2)
+        app.config.setdefault('CHART_RENDER_TIMEOUT', 30)
+        app.config.setdefault('CHART_RENDER_QUEUE_SIZE', 16)
+
+        if self._app is None:
+            atexit.register(self.shutdown)
+
+        self._app = app
+        self._slots = threading.BoundedSemaphore(app.config['CHART_RENDER_QUEUE_SIZE'])
+
+    def render(self, chart_type, data, filepath):
+        """
+        Render a single chart to a file
+
+        Args:
+            chart_type (str): Kind of chart, a key of CHART_RENDERERS
+            data: Data the chart is drawn from
+            filepath (str): Where to write the PNG
+
+        Raises:
+            ChartRenderError: If the chart could not be rendered in time
+        """
+        errors = self.render_many([(chart_type, data, filepath)])
+
+        if errors:
+            raise ChartRenderError(errors[filepath])
+
+    def render_many(self, jobs):
+        """
+        Render several charts in parallel
+
+        Args:
+            jobs (list): (chart_type, data, filepath) tuples
+
+        Returns:
+            dict: Mapping of filepath to error message for charts that failed or timed out
+        """
+        if self._app is None:
+            self.init_app(current_app._get_current_object())
+
+        if not self._app.config['CHART_RENDER_WORKERS']:
+            # Rendering in-process is configured
+            errors = {}
+            for chart_type, data, filepath in jobs:
+                try:
+                    render_chart(chart_type, data, filepath)
+                except Exception as e:
+                    errors[filepath] = str(e)
+            return errors
+
+        deadline = time.monotonic() + self._app.config['CHART_RENDER_TIMEOUT']
+        futures = {}
+        errors = {}
+
+        for chart_type, data, filepath in jobs:
+            try:
+                futures[filepath] = self._submit(chart_type, data, filepath)
+            except ChartRenderError as e:
+                errors[filepath] = str(e)
+
+        for filepath, future in futures.items():
+            try:
+                future.result(timeout=max(deadline - time.monotonic(), 0))
+            except FutureTimeoutError:
+                # The job keeps running and still fills the cache when it finishes
+                errors[filepath] = 'Chart rendering timed out'
+            except BrokenProcessPool as e:
+                self._reset_pool()
+                errors[filepath] = str(e)
+            except Exception as e:
+                errors[filepath] = str(e)
+
+        for filepath, error in errors.items():
+            self.logger.warning(f"Error rendering chart {os.path.basename(filepath)}: {error}")
+
+        return errors
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, chart_type, data, filepath):
+        # Fail fast instead of queueing behind slow charts
+        if not self._slots.acquire(blocking=False):
+            raise ChartRenderError('Chart render queue is full')
+
+        try:
+            future = self._get_executor().submit(render_chart, chart_type, data, filepath)
+        except Exception as e:
+            self._slots.release()
+            raise ChartRenderError(str(e))
+
+        future.add_done_callback(lambda _: self._slots.release())
+
+        return future
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # Workers are spawned rather than forked so they do not inherit
+                # the web worker's threads, locks or database connections. They
+                # only import app.utils.chart_drawing, which never builds an
+                # application; the script that started the server is imported
+                # too, so it must not call create_app() under __mp_main__.
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self._app.config['CHART_RENDER_WORKERS'],
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
+
+    def _reset_pool(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+# Process-wide renderer
+chart_renderer = ChartRenderer()
@@ -0,0 +1,679 @@
+from flask import current_app
+from sqlalchemy import event, select, func, case, or_
+from sqlalchemy.orm import Session
+from app.models.analytics_models import ComplianceScore
+from app.models.models import Organization, Document, ComplianceTask
+from app.models.financial_models import FinancialReport, TaxExemption, AuditFinding, FinancialPolicy
+from app.models.governance_models import BoardMeeting, BoardMember, ConflictOfInterest, GovernancePolicy, BoardEvaluation
+from app.models.program_compliance_models import OrganizationProgram, LocalPermit, ComplianceRisk
+from app.models.data_protection_models import DataProtectionAssessment, ConsentRecord, DataBreachRecord, PDPORegistration, DataProtectionPolicy
+from app import db
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import atexit
+import functools
+import logging
+import threading
+
+# Categories scored by the engine
+SCORE_CATEGORIES = ['registration', 'financial', 'governance', 'program', 'data_protection']
+
+# Categories averaged into the overall score
+OVERALL_CATEGORIES = ['registration', 'financial', 'governance', 'program']
+
+def compute_compliance_scores(organization_id, categories=None, session=None):
+    """
+    Compute compliance scores for an organization in a single query
+
+    Every figure the scoring rules need is collected as a scalar subquery of
+    one SELECT, so all categories cost one database round trip.
+
+    Args:
+        organization_id (int): Organization ID
+        categories (list, optional): Categories to compute. Defaults to all categories.
+        session (Session, optional): Session to query with. Defaults to db.session.
+
+    Returns:
+        dict: Mapping of category to score (0-100). Includes 'overall' when
+            every category it averages was computed.
+    """
+    session = session or db.session
+    categories = list(categories or SCORE_CATEGORIES)
+    now = datetime.utcnow()
+
+    measures = {}
+    for category in categories:
+        measures.update(_MEASURES[category](organization_id, now))
+
+    row = session.execute(select(*[
+        subquery.label(name) for name, subquery in measures.items()
+    ])).one()
+    counts = {name: int(value or 0) for name, value in row._asdict().items()}
+
+    scores = {category: SCORING_RULES[category](counts) for category in categories}
+
+    if all(category in scores for category in OVERALL_CATEGORIES):
+        scores['overall'] = calculate_overall_score(scores)
+
+    return scores
+
+def refresh_compliance_scores(organization_id, categories=None, session=None):
+    """
+    Recompute compliance scores and store them in one transaction
+
+    When only some categories are refreshed, the stored scores of the other
+    categories are reused for the overall score. Categories that have never
+    been scored are computed as well.
+
+    Args:
+        organization_id (int): Organization ID
+        categories (list, optional): Categories to compute. Defaults to all categories.
+        session (Session, optional): Session to write with. Defaults to db.session.
+
+    Returns:
+        dict: Mapping of category to its current score, including 'overall'
+    """
+    session = session or db.session
+    categories = set(categories or SCORE_CATEGORIES)
+    latest = {}
+
+    if categories != set(SCORE_CATEGORIES):
+        latest = get_latest_scores(organization_id, session)
+        categories |= set(SCORE_CATEGORIES) - set(latest)
+
+    scores = compute_compliance_scores(
+        organization_id,
+        [category for category in SCORE_CATEGORIES if category in categories],
+        session
+    )
+
+    if 'overall' not in scores and categories & set(OVERALL_CATEGORIES):
+        scores['overall'] = calculate_overall_score({**latest, **scores})
+
+    now = datetime.utcnow()
+
+    session.execute(ComplianceScore.__table__.insert(), [
+        {
+            'organization_id': organization_id,
+            'category': category,
+            'score': score,
+            'created_at': now
+        }
+        for category, score in scores.items()
+    ])
+
+    # Only the latest score of a category is read; history lives in ComplianceSnapshot
+    session.execute(ComplianceScore.__table__.delete().where(
+        ComplianceScore.organization_id == organization_id,
+        ComplianceScore.category.in_(list(scores)),
+        ComplianceScore.created_at < now
+    ))
+    session.commit()
+
+    return {**latest, **scores}
+
+def get_latest_scores(organization_id, session=None):
+    """
+    Get the most recently stored score of each category
+
+    Args:
+        organization_id (int): Organization ID
+        session (Session, optional): Session to query with. Defaults to db.session.
+
+    Returns:
+        dict: Mapping of category to score
+    """
+    return {
+        category: score
+        for category, (score, _) in _latest_score_rows(organization_id, session).items()
+    }
+
+def get_compliance_scores(organization_id):
+    """
+    Get the precomputed compliance scores for all categories
+
+    Scores are kept current by the change hooks below, so this is a single
+    read. Scores also depend on the date, e.g. through deadlines that pass,
+    so categories scored longer than COMPLIANCE_SCORE_MAX_AGE ago are queued
+    for rescoring in the background and their stored scores returned
+    meanwhile. Only categories that were never scored are scored here.
+
+    Args:
+        organization_id (int): Organization ID
+
+    Returns:
+        dict: Mapping of category to score, including 'overall'
+    """
+    max_age = current_app.config.get('COMPLIANCE_SCORE_MAX_AGE', 3600)
+    cutoff = datetime.utcnow() - timedelta(seconds=max_age)
+
+    rows = _latest_score_rows(organization_id)
+    scores = {category: score for category, (score, _) in rows.items()}
+
+    missing = [category for category in SCORE_CATEGORIES if category not in rows]
+    if missing or 'overall' not in rows:
+        return refresh_compliance_scores(organization_id, missing or None)
+
+    stale = {category for category in SCORE_CATEGORIES if rows[category][1] < cutoff}
+    if stale:
+        score_refresher.submit({organization_id: stale})
+
+    return scores
+
+def _latest_score_rows(organization_id, session=None):
+    session = session or db.session
+
+    latest = session.query(
+        func.max(ComplianceScore.id).label('id')
+    ).filter(
+        ComplianceScore.organization_id == organization_id
+    ).group_by(ComplianceScore.category).subquery()
+
+    rows = session.query(
+        ComplianceScore.category, ComplianceScore.score, ComplianceScore.created_at
+    ).join(
+        latest, ComplianceScore.id == latest.c.id
+    ).all()
+
+    return {category: (score, created_at) for category, score, created_at in rows}
+
+def calculate_overall_score(scores):
+    """Average the category scores that make up the overall score"""
+    return sum(scores[category] for category in OVERALL_CATEGORIES) / len(OVERALL_CATEGORIES)
+
+# Measures
+#
+# Each function returns the scalar subqueries a category's scoring rules
+# read, keyed by a name unique across all categories.
+def _count(model, *criteria):
+    return select(func.count()).select_from(model).where(*criteria).scalar_subquery()
+
+def _registration_measures(organization_id, now):
+    return {
+        'registration_number': _count(
+            Organization,
+            Organization.id == organization_id,
+            Organization.registration_number != None,
+            Organization.registration_number != ''
+        ),
+        'permit_valid': _count(
+            Organization,
+            Organization.id == organization_id,
+            Organization.permit_expiry_date > now
+        ),
+        'permit_expiring': _count(
+            Organization,
+            Organization.id == organization_id,
+            Organization.permit_expiry_date > now,
+            Organization.permit_expiry_date <= now + timedelta(days=90)
+        ),
+        'documents': _count(Document, Document.organization_id == organization_id),
+        'tasks_total': _count(ComplianceTask, ComplianceTask.organization_id == organization_id),
+        'tasks_completed': _count(
+            ComplianceTask,
+            ComplianceTask.organization_id == organization_id,
+            ComplianceTask.completed == True
+        ),
+        'tasks_overdue': _count(
+            ComplianceTask,
+            ComplianceTask.organization_id == organization_id,
+            ComplianceTask.completed == False,
+            ComplianceTask.due_date < now
+        )
+    }
+
+def _financial_measures(organization_id, now):
+    last_year = now.year - 1
+
+    return {
+        'annual_return_points': select(
+            case(
+                (FinancialReport.status == 'submitted', 30),
+                (FinancialReport.status == 'final', 20),
+                (FinancialReport.status == 'draft', 10),
+                else_=0
+            )
+        ).where(
+            FinancialReport.organization_id == organization_id,
+            FinancialReport.report_type == 'annual_return',
+            FinancialReport.fiscal_year.like(f"%{last_year}%")
+        ).order_by(FinancialReport.id).limit(1).scalar_subquery(),
+        'tax_exemptions': _count(
+            TaxExemption,
+            TaxExemption.organization_id == organization_id,
+            TaxExemption.status == 'active'
+        ),
+        'financial_policies': _count(
+            FinancialPolicy,
+            FinancialPolicy.organization_id == organization_id,
+            FinancialPolicy.status == 'approved'
+        ),
+        'open_findings': select(func.count()).select_from(AuditFinding).join(
+            FinancialReport, AuditFinding.report_id == FinancialReport.id
+        ).where(
+            FinancialReport.organization_id == organization_id,
+            AuditFinding.status == 'open'
+        ).scalar_subquery()
+    }
+
+def _governance_measures(organization_id, now):
+    return {
+        'board_members': _count(
+            BoardMember,
+            BoardMember.organization_id == organization_id,
+            BoardMember.is_active == True
+        ),
+        'meetings_last_year': _count(
+            BoardMeeting,
+            BoardMeeting.organization_id == organization_id,
+            BoardMeeting.meeting_date >= now - timedelta(days=365),
+            BoardMeeting.status == 'completed'
+        ),
+        'governance_policies': _count(
+            GovernancePolicy,
+            GovernancePolicy.organization_id == organization_id,
+            GovernancePolicy.status == 'approved'
+        ),
+        'conflict_declarations': _count(
+            ConflictOfInterest,
+            ConflictOfInterest.organization_id == organization_id
+        ),
+        'board_evaluations': _count(
+            BoardEvaluation,
+            BoardEvaluation.organization_id == organization_id,
+            BoardEvaluation.status == 'completed'
+        )
+    }
+
+def _program_measures(organization_id, now):
+    return {
+        'program_areas': _count(
+            OrganizationProgram,
+            OrganizationProgram.organization_id == organization_id,
+            OrganizationProgram.is_active == True
+        ),
+        'active_permits': _count(
+            LocalPermit,
+            LocalPermit.organization_id == organization_id,
+            LocalPermit.status == 'active'
+        ),
+        'expired_permits': _count(
+            LocalPermit,
+            LocalPermit.organization_id == organization_id,
+            LocalPermit.status == 'expired'
+        ),
+        'critical_risks': _count(
+            ComplianceRisk,
+            ComplianceRisk.organization_id == organization_id,
+            ComplianceRisk.risk_level == 'critical',
+            ComplianceRisk.status == 'identified'
+        ),
+        'high_risks': _count(
+            ComplianceRisk,
+            ComplianceRisk.organization_id == organization_id,
+            ComplianceRisk.risk_level == 'high',
+            ComplianceRisk.status == 'identified'
+        ),
+        'mitigated_risks': _count(
+            ComplianceRisk,
+            ComplianceRisk.organization_id == organization_id,
+            ComplianceRisk.status == 'mitigated'
+        ),
+        'total_risks': _count(ComplianceRisk, ComplianceRisk.organization_id == organization_id)
+    }
+
+def _data_protection_measures(organization_id, now):
+    return {
+        'pdpo_points': select(
+            case(
+                (PDPORegistration.status == 'registered', 30),
+                (PDPORegistration.status == 'pending', 15),
+                else_=0
+            ) + case(
+                (PDPORegistration.annual_report_submitted == True, 10),
+                else_=0
+            )
+        ).where(
+            PDPORegistration.organization_id == organization_id
+        ).order_by(PDPORegistration.id).limit(1).scalar_subquery(),
+        'data_protection_policies': _count(
+            DataProtectionPolicy,
+            DataProtectionPolicy.organization_id == organization_id,
+            DataProtectionPolicy.status == 'active'
+        ),
+        'completed_assessments': _count(
+            DataProtectionAssessment,
+            DataProtectionAssessment.organization_id == organization_id,
+            DataProtectionAssessment.status == 'completed'
+        ),
+        'consent_records': _count(ConsentRecord, ConsentRecord.organization_id == organization_id),
+        'mishandled_breaches': _count(
+            DataBreachRecord,
+            DataBreachRecord.organization_id == organization_id,
+            or_(
+                DataBreachRecord.reported_to_authority.isnot(True),
+                DataBreachRecord.subjects_notified.isnot(True)
+            )
+        )
+    }
+
+# Scoring rules
+#
+# The rules take a mapping of figure names to counts. app.utils.batch_scoring
+# applies the same rules to the figures of every organization.
+def score_registration(counts):
+    """Calculate registration compliance score (0-100)"""
+    score = 0
+
+    # Check registration details
+    if counts['registration_number'] > 0:
+        score += 30
+
+    # Check operating permit
+    if counts['permit_valid'] > 0 and counts['permit_expiring'] == 0:
+        score += 30
+    elif counts['permit_valid'] > 0:  # Expires within 90 days
+        score += 15
+
+    # Check compliance deadlines
+    if counts['tasks_overdue'] == 0:
+        score += 20
+    elif counts['tasks_overdue'] <= 2:
+        score += 10
+
+    # Check task completion
+    if counts['tasks_total'] > 0:
+        score += 10 * counts['tasks_completed'] / counts['tasks_total']
+
+    # Check documents on file
+    if counts['documents'] > 0:
+        score += 10
+
+    return min(score, 100)  # Cap at 100
+
+def score_financial(counts):
+    """Calculate financial compliance score (0-100)"""
+    # Check annual returns
+    score = counts['annual_return_points']
+
+    # Check tax exemptions
+    if counts['tax_exemptions'] > 0:
+        score += 20
+
+    # Check financial policies
+    if counts['financial_policies'] >= 3:  # Has multiple policies
+        score += 20
+    elif counts['financial_policies'] > 0:  # Has at least one policy
+        score += 10
+
+    # Check audit findings
+    if counts['open_findings'] == 0:
+        score += 30
+    elif counts['open_findings'] <= 3:
+        score += 15
+    else:
+        score += 5
+
+    return min(score, 100)  # Cap at 100
+
+def score_governance(counts):
+    """Calculate governance compliance score (0-100)"""
+    score = 0
+
+    # Check board composition
+    if counts['board_members'] >= 5:  # Good board size
+        score += 20
+    elif counts['board_members'] >= 3:  # Minimum board size
+        score += 10
+
+    # Check board meetings
+    if counts['meetings_last_year'] >= 4:  # Quarterly meetings
+        score += 20
+    elif counts['meetings_last_year'] >= 2:  # Semi-annual meetings
+        score += 10
+
+    # Check governance policies
+    if counts['governance_policies'] >= 3:  # Multiple policies
+        score += 20
+    elif counts['governance_policies'] >= 1:  # At least one policy
+        score += 10
+
+    # Check conflict of interest management
+    if counts['conflict_declarations'] > 0:
+        score += 20
+
+    # Check board evaluations
+    if counts['board_evaluations'] > 0:
+        score += 20
+
+    return min(score, 100)  # Cap at 100
+
+def score_program(counts):
+    """Calculate program compliance score (0-100)"""
+    score = 0
+
+    # Check program areas
+    if counts['program_areas'] > 0:
+        score += 10  # Has defined program areas
+
+    # Check local permits
+    if counts['active_permits'] > 0 and counts['expired_permits'] == 0:
+        score += 30  # All permits active
+    elif counts['active_permits'] > 0:
+        score += 15  # Some permits active
+
+    # Check compliance risks
+    if counts['critical_risks'] == 0 and counts['high_risks'] == 0:
+        score += 30  # No critical or high risks
+    elif counts['critical_risks'] == 0:
+        score += 20  # No critical risks
+    elif counts['high_risks'] == 0:
+        score += 10  # No high risks
+
+    if counts['mitigated_risks'] > 0:
+        score += 10  # Has mitigated risks
+
+    if counts['total_risks'] > 0:
+        score += 10  # Has conducted risk assessment
+
+    return min(score, 100)  # Cap at 100
+
+def score_data_protection(counts):
+    """Calculate data protection compliance score (0-100)"""
+    # Check PDPO registration
+    score = counts['pdpo_points']
+
+    # Check if has active policies
+    if counts['data_protection_policies'] > 0:
+        score += 20
+
+    # Check if has completed assessments
+    if counts['completed_assessments'] > 0:
+        score += 20
+
+    # Check if has consent records
+    if counts['consent_records'] > 0:
+        score += 10
+
+    # Check if all data breaches were reported and notified (no breaches is good)
+    if counts['mishandled_breaches'] == 0:
+        score += 10
+
+    return min(score, 100)  # Cap at 100
+
+_MEASURES = {
+    'registration': _registration_measures,
+    'financial': _financial_measures,
+    'governance': _governance_measures,
+    'program': _program_measures,
+    'data_protection': _data_protection_measures
+}
+
+# Scoring rule of each category
+SCORING_RULES = {
+    'registration': score_registration,
+    'financial': score_financial,
+    'governance': score_governance,
+    'program': score_program,
+    'data_protection': score_data_protection
+}
+
+# Models that feed each category
+_CATEGORY_SOURCES = {
+    ComplianceTask: 'registration',
+    Document: 'registration',
+    FinancialReport: 'financial',
+    TaxExemption: 'financial',
+    FinancialPolicy: 'financial',
+    AuditFinding: 'financial',
+    BoardMember: 'governance',
+    BoardMeeting: 'governance',
+    GovernancePolicy: 'governance',
+    ConflictOfInterest: 'governance',
+    BoardEvaluation: 'governance',
+    OrganizationProgram: 'program',
+    LocalPermit: 'program',
+    ComplianceRisk: 'program',
+    PDPORegistration: 'data_protection',
+    DataProtectionPolicy: 'data_protection',
+    DataProtectionAssessment: 'data_protection',
+    ConsentRecord: 'data_protection',
+    DataBreachRecord: 'data_protection'
+}
+
+# Incremental recomputation
+#
+# Changed rows mark their organization's category dirty on the session
+# while they are flushed. Once the transaction commits, the dirty
+# categories are handed to a background thread to be rescored, so the
+# committing request does not wait for the scoring queries.
+class ScoreRefresher:
+    """Background thread that rescores the categories of committed changes
+
+    Work for the same organization is merged while it waits, so a burst of
+    commits costs one rescoring per organization.
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = {}  # organization ID -> set of categories, None for all
+        self._app = None
+        self.logger = logging.getLogger(__name__)
+
+    def init_app(self, app):
+        """
+        Bind the refresher to an application and register the thread shutdown
+
+        Args:
+            app: Flask application instance
+        """
+        if self._app is None:
+            atexit.register(self.shutdown)
+
+        self._app = app
+
+    def submit(self, categories_by_organization):
+        """
+        Queue organizations to be rescored
+
+        Args:
+            categories_by_organization (dict): Mapping of organization ID to
+                the set of dirty categories, containing None to rescore all
+        """
+        if self._app is None:
+            self.init_app(current_app._get_current_object())
+
+        with self._lock:
+            idle = not self._pending
+
+            for organization_id, categories in categories_by_organization.items():
+                pending = self._pending.setdefault(organization_id, set())
+                pending |= categories
+
+            if idle:
+                self._get_executor().submit(self._run)
+
+    def shutdown(self):
+        """Stop the worker thread after it has rescored the queued organizations"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _run(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        with self._app.app_context():
+            with Session(bind=db.engine) as session:
+                for organization_id, categories in pending.items():
+                    try:
+                        refresh_compliance_scores(
+                            organization_id,
+                            None if None in categories else categories,
+                            session
+                        )
+                    except Exception as e:
+                        session.rollback()
+                        self.logger.error(f"Error recomputing compliance scores: {str(e)}")
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='compliance-scores')
+        return self._executor
+
+# Process-wide refresher
+score_refresher = ScoreRefresher()
+
+def _mark_dirty(session, organization_id, category):
+    if organization_id is None:
+        return
+
+    pending = session.info.setdefault('compliance_scores_dirty', set())
+    pending.add((organization_id, category))
+
+def _source_changed(category, mapper, connection, target):
+    session = Session.object_session(target)
+    if session is None:
+        return
+
+    if isinstance(target, AuditFinding):
+        # Audit findings belong to an organization through their report
+        organization_id = connection.scalar(
+            select(FinancialReport.organization_id).where(FinancialReport.id == target.report_id)
+        )
+    else:
+        organization_id = target.organization_id
+
+    _mark_dirty(session, organization_id, category)
+
+for _model, _category in _CATEGORY_SOURCES.items():
+    for _event_name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _event_name, functools.partial(_source_changed, _category))
+
+@event.listens_for(Organization, 'after_insert')
+def _organization_created(mapper, connection, target):
+    # Score new organizations up front so the first reader does not pay for it
+    session = Session.object_session(target)
+    if session is not None:
+        _mark_dirty(session, target.id, None)
+
+@event.listens_for(Organization, 'after_update')
+def _organization_changed(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        _mark_dirty(session, target.id, 'registration')
+
+@event.listens_for(Session, 'after_commit')
+def _recompute_dirty(session):
+    pending = session.info.pop('compliance_scores_dirty', None)
+    if not pending:
+        return
+
+    categories_by_organization = {}
+    for organization_id, category in pending:
+        categories_by_organization.setdefault(organization_id, set()).add(category)
+
+    score_refresher.submit(categories_by_organization)
@@ -0,0 +1,181 @@
+from sqlalchemy import func
+from app.models.analytics_models import ComplianceSnapshot, ComplianceTrend
+from app.utils.usage_metering import dialect_insert
+from app.utils.usage_rollup import month_start, next_month, previous_month
+from app import db
+from collections import namedtuple
+from datetime import datetime
+
+# One month of an organization's compliance trend. Months without
+# snapshots repeat the previous month's score and are marked as filled.
+TrendPoint = namedtuple('TrendPoint', ['month', 'score', 'snapshot_count', 'filled'])
+
+def get_compliance_trends(organization_id, months=6):
+    """
+    Get monthly compliance scores for the most recent calendar months
+
+    Closed months are read from the ComplianceTrend rollup. Months the
+    rollup does not cover yet are bucketed from ComplianceSnapshot rows
+    with a single range query. Nothing is written on this path.
+
+    Args:
+        organization_id (int): Organization ID
+        months (int, optional): Number of months to return. Defaults to 6.
+
+    Returns:
+        list: TrendPoint per month, newest first
+    """
+    current = month_start(datetime.utcnow().date())
+
+    window = [current]
+    while len(window) < months:
+        window.append(previous_month(window[-1]))
+
+    start = window[-1]
+    monthly = {}
+
+    # Closed months
+    rollups = ComplianceTrend.query.filter(
+        ComplianceTrend.organization_id == organization_id,
+        ComplianceTrend.month >= start
+    ).all()
+
+    raw_since = start
+    for trend in rollups:
+        monthly[trend.month] = (trend.score, trend.snapshot_count)
+        raw_since = max(raw_since, next_month(trend.month))
+
+    # Months not yet rolled up
+    snapshots = db.session.query(
+        ComplianceSnapshot.snapshot_date, ComplianceSnapshot.compliance_score
+    ).filter(
+        ComplianceSnapshot.organization_id == organization_id,
+        ComplianceSnapshot.snapshot_date >= datetime.combine(raw_since, datetime.min.time())
+    ).all()
+
+    totals = {}
+    for snapshot_date, score in snapshots:
+        if score is None:
+            continue
+        total, count = totals.get(month_start(snapshot_date), (0, 0))
+        totals[month_start(snapshot_date)] = (total + score, count + 1)
+
+    for month, (total, count) in totals.items():
+        monthly[month] = (total / count, count)
+
+    # Fill gaps with the last known score, oldest month first
+    previous = _score_before(organization_id, start) if start not in monthly else None
+    trends = []
+    for month in reversed(window):
+        if month in monthly:
+            score, count = monthly[month]
+            trends.append(TrendPoint(month, score, count, False))
+            previous = score
+        else:
+            trends.append(TrendPoint(month, previous, 0, True))
+
+    trends.reverse()
+
+    return trends
+
+def rollup_compliance_trends(today=None):
+    """
+    Roll compliance snapshots of closed months up into ComplianceTrend
+
+    The previous month is always rolled up again so that snapshots taken
+    shortly after a month boundary are included. Re-running is idempotent.
+
+    Args:
+        today (date, optional): Reference date. Defaults to the current date.
+
+    Returns:
+        int: Number of monthly trend rows written
+    """
+    cutoff = month_start(today or datetime.utcnow().date())
+
+    latest = db.session.query(func.max(ComplianceTrend.month)).scalar()
+
+    if latest is not None:
+        month = min(next_month(latest), previous_month(cutoff))
+    else:
+        first = db.session.query(func.min(ComplianceSnapshot.snapshot_date)).scalar()
+        if first is None:
+            return 0
+        month = month_start(first)
+
+    written = 0
+    while month < cutoff:
+        # Set-based average per organization for one calendar month
+        rows = db.session.query(
+            ComplianceSnapshot.organization_id,
+            func.avg(ComplianceSnapshot.compliance_score),
+            func.count(ComplianceSnapshot.compliance_score)
+        ).filter(
+            ComplianceSnapshot.snapshot_date >= datetime.combine(month, datetime.min.time()),
+            ComplianceSnapshot.snapshot_date < datetime.combine(next_month(month), datetime.min.time()),
+            ComplianceSnapshot.compliance_score != None
+        ).group_by(ComplianceSnapshot.organization_id).all()
+
+        for organization_id, score, count in rows:
+            write_monthly_trend(organization_id, month, score, count)
+
+        written += len(rows)
+        month = next_month(month)
+
+    db.session.commit()
+
+    return written
+
+def write_monthly_trend(organization_id, month, score, snapshot_count):
+    """
+    Insert or replace an organization's trend row for a month
+
+    Args:
+        organization_id (int): Organization ID
+        month (date): First day of the month
+        score (float): Average compliance score for the month
+        snapshot_count (int): Number of snapshots averaged
+    """
+    table = ComplianceTrend.__table__
+    insert = dialect_insert(table)
+    now = datetime.utcnow()
+
+    if insert is not None:
+        stmt = insert.values(
+            organization_id=organization_id,
+            month=month,
+            score=score,
+            snapshot_count=snapshot_count,
+            updated_at=now
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['organization_id', 'month'],
+            set_={
+                'score': stmt.excluded.score,
+                'snapshot_count': stmt.excluded.snapshot_count,
+                'updated_at': stmt.excluded.updated_at
+            }
+        )
+        db.session.execute(stmt)
+        return
+
+    trend = ComplianceTrend.query.filter_by(
+        organization_id=organization_id,
+        month=month
+    ).first()
+
+    if trend is None:
+        trend = ComplianceTrend(organization_id=organization_id, month=month)
+
+    trend.score = score
+    trend.snapshot_count = snapshot_count
+    db.session.add(trend)
+
+def _score_before(organization_id, start):
+    """Get the last known monthly score before a month, used to fill leading gaps"""
+    trend = ComplianceTrend.query.filter(
+        ComplianceTrend.organization_id == organization_id,
+        ComplianceTrend.month < start
+    ).order_by(ComplianceTrend.month.desc()).first()
+
+    return trend.score if trend else None
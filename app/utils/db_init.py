@@ -1,8 +1,70 @@
-from app.utils.db_init import initialize_database
+from flask import current_app
+from sqlalchemy import text
 from app.models.subscription_models import Tier, Feature, TierFeature
 from app.models.value_added_models import ConsultingService, TrainingService
 from app import db
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+import os
+import time
+
+# Key of the Postgres advisory lock held while the database is set up
+DATABASE_INIT_LOCK_KEY = 7240315
+
+def bootstrap_database():
+    """
+    Create missing tables and seed required data, once across all processes
+
+    Safe to run from several processes at the same time: the first one to
+    take the lock does the work and the others find it already done.
+
+    Returns:
+        float: Seconds spent, including waiting for the lock
+    """
+    started = time.perf_counter()
+
+    # Imported here; the AI package is not needed to set up the rest of the database
+    from app.ai_agents.faq_index import seed_faq_answers
+
+    with database_init_lock():
+        db.create_all()
+        initialize_database()
+        seed_faq_answers()
+
+    return time.perf_counter() - started
+
+@contextmanager
+def database_init_lock():
+    """
+    Hold a lock that serializes schema creation and seeding
+
+    Uses a Postgres advisory lock, which also covers workers on other
+    hosts, and a lock file in the instance folder for other databases.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        with db.engine.connect() as connection:
+            connection.execute(text('SELECT pg_advisory_lock(:key)'), {'key': DATABASE_INIT_LOCK_KEY})
+            try:
+                yield
+            finally:
+                connection.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': DATABASE_INIT_LOCK_KEY})
+        return
+
+    try:
+        import fcntl
+    except ImportError:
+        # No file locking on this platform
+        yield
+        return
+
+    os.makedirs(current_app.instance_path, exist_ok=True)
+
+    with open(os.path.join(current_app.instance_path, 'db-init.lock'), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
 
 def initialize_database():
     """Initialize database with required data for new modules"""
@@ -0,0 +1,128 @@
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.models.subscription_models import Subscription, Feature, TierFeature
+from app import db
+from collections import namedtuple
+import threading
+import time
+
+# What an organization's active subscription grants for one feature
+FeatureEntitlement = namedtuple('FeatureEntitlement', ['subscription_id', 'feature_id', 'usage_limit'])
+
+# In-process cache of entitlements, keyed by organization ID.
+# Each entry is (loaded_at, {feature name: FeatureEntitlement}).
+_feature_cache = {}
+_cache_lock = threading.Lock()
+
+# Invalidation counters, per organization and for invalidations of every
+# organization. A load only caches its result if neither counter moved
+# while it ran, so a load that read the old rows cannot re-cache them
+# after the invalidation.
+_generations = {}
+_global_generation = 0
+
+# Default lifetime of a cache entry in seconds. Commits in this process
+# invalidate entries immediately; the TTL bounds staleness for changes
+# committed by other worker processes.
+DEFAULT_CACHE_TTL = 300
+
+def get_entitlements(organization_id):
+    """Get the features enabled for an organization's active subscription, keyed by feature name"""
+    if not organization_id:
+        return {}
+
+    ttl = current_app.config.get('ENTITLEMENT_CACHE_TTL', DEFAULT_CACHE_TTL)
+    now = time.monotonic()
+
+    with _cache_lock:
+        entry = _feature_cache.get(organization_id)
+        generation = (_global_generation, _generations.get(organization_id, 0))
+
+    if entry and now - entry[0] < ttl:
+        return entry[1]
+
+    entitlements = load_entitlements(organization_id)
+
+    with _cache_lock:
+        if generation == (_global_generation, _generations.get(organization_id, 0)):
+            _feature_cache[organization_id] = (now, entitlements)
+
+    return entitlements
+
+def load_entitlements(organization_id):
+    """Load an organization's enabled features in a single joined query"""
+    rows = db.session.query(
+        Feature.name, Subscription.id, Feature.id, TierFeature.usage_limit
+    ).join(
+        TierFeature, TierFeature.feature_id == Feature.id
+    ).join(
+        Subscription, Subscription.tier_id == TierFeature.tier_id
+    ).filter(
+        Subscription.organization_id == organization_id,
+        Subscription.is_active == True,
+        TierFeature.is_enabled == True
+    ).all()
+
+    return {
+        name: FeatureEntitlement(subscription_id, feature_id, usage_limit)
+        for name, subscription_id, feature_id, usage_limit in rows
+    }
+
+def get_feature_entitlement(organization_id, feature_name):
+    """Get an organization's entitlement to a feature, or None if it has no access"""
+    return get_entitlements(organization_id).get(feature_name)
+
+def has_feature_access(organization_id, feature_name):
+    """Check if organization has access to a feature based on subscription tier"""
+    return feature_name in get_entitlements(organization_id)
+
+def invalidate_entitlements(organization_id=None):
+    """Drop cached entitlements for one organization, or for all organizations"""
+    global _global_generation
+
+    with _cache_lock:
+        if organization_id is None:
+            _global_generation += 1
+            _feature_cache.clear()
+        else:
+            _generations[organization_id] = _generations.get(organization_id, 0) + 1
+            _feature_cache.pop(organization_id, None)
+
+# Cache invalidation
+#
+# Changes are collected per session while rows are flushed and applied
+# once the transaction commits, so a concurrent reader cannot re-cache
+# the old feature set between the flush and the commit.
+def _mark_dirty(session, organization_id):
+    pending = session.info.setdefault('entitlements_dirty', set())
+    pending.add(organization_id)
+
+@event.listens_for(Subscription, 'after_insert')
+@event.listens_for(Subscription, 'after_update')
+@event.listens_for(Subscription, 'after_delete')
+def _subscription_changed(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        _mark_dirty(session, target.organization_id)
+
+@event.listens_for(TierFeature, 'after_insert')
+@event.listens_for(TierFeature, 'after_update')
+@event.listens_for(TierFeature, 'after_delete')
+def _tier_feature_changed(mapper, connection, target):
+    # A tier change affects every organization on that tier
+    session = Session.object_session(target)
+    if session is not None:
+        _mark_dirty(session, None)
+
+@event.listens_for(Session, 'after_commit')
+def _apply_invalidations(session):
+    pending = session.info.pop('entitlements_dirty', None)
+    if not pending:
+        return
+
+    if None in pending:
+        invalidate_entitlements()
+    else:
+        for organization_id in pending:
+            invalidate_entitlements(organization_id)
@@ -0,0 +1,140 @@
+from collections import namedtuple
+import os
+import subprocess
+import sys
+
+# Dependencies that must only be imported on first use, never at startup
+HEAVY_MODULES = ('anthropic', 'matplotlib', 'numpy', 'pandas', 'plotly', 'seaborn', 'weasyprint')
+
+# Import cost of one module, in microseconds
+ImportTiming = namedtuple('ImportTiming', ['module', 'self_us', 'cumulative_us', 'depth'])
+
+def measure_cold_start(runs=3, fast_boot=True):
+    """
+    Measure how long a fresh interpreter takes to create the application
+
+    Args:
+        runs (int, optional): Number of interpreters to start. Defaults to 3.
+        fast_boot (bool, optional): Whether to boot with FAST_BOOT. Defaults to True.
+
+    Returns:
+        list: Seconds per run, from interpreter start to create_app returning
+
+    Raises:
+        RuntimeError: If the application fails to start
+    """
+    statement = (
+        'import time; started = time.perf_counter(); '
+        'from app import create_app; create_app(); '
+        'print(time.perf_counter() - started)'
+    )
+    env = dict(os.environ, FAST_BOOT='True' if fast_boot else 'False')
+
+    durations = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, '-c', statement],
+            capture_output=True,
+            text=True,
+            cwd=_project_root(),
+            env=env
+        )
+
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'Application failed to start')
+
+        durations.append(float(result.stdout.strip().splitlines()[-1]))
+
+    return durations
+
+def profile_imports(statement='from app import create_app; create_app()'):
+    """
+    Measure how long every module takes to import while running a statement
+
+    The statement runs in a fresh interpreter with ``-X importtime``, so
+    modules already loaded in this process do not hide their cost.
+
+    Args:
+        statement (str, optional): Python code to run. Defaults to creating the application.
+
+    Returns:
+        list: ImportTiming per imported module, in import order
+
+    Raises:
+        RuntimeError: If the statement fails
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        capture_output=True,
+        text=True,
+        cwd=_project_root()
+    )
+
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'Import profiling failed')
+
+    return parse_importtime(result.stderr)
+
+def parse_importtime(output):
+    """
+    Parse the ``-X importtime`` report
+
+    Args:
+        output (str): Standard error of an interpreter run with ``-X importtime``
+
+    Returns:
+        list: ImportTiming per imported module, in import order
+    """
+    timings = []
+
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            # Header line
+            continue
+
+        name = fields[2].rstrip()
+        module = name.lstrip()
+        depth = (len(name) - len(module) - 1) // 2
+
+        timings.append(ImportTiming(module, int(fields[0]), int(fields[1]), depth))
+
+    return timings
+
+def summarize_by_package(timings):
+    """
+    Total the import cost of each top-level package
+
+    Args:
+        timings (list): ImportTiming entries
+
+    Returns:
+        list: (package, microseconds) tuples, most expensive first
+    """
+    totals = {}
+
+    for timing in timings:
+        package = timing.module.split('.')[0]
+        totals[package] = totals.get(package, 0) + timing.self_us
+
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+def find_heavy_imports(timings):
+    """
+    Get the heavy dependencies that were imported
+
+    Args:
+        timings (list): ImportTiming entries
+
+    Returns:
+        list: Names from HEAVY_MODULES that appear in the timings
+    """
+    imported = {timing.module.split('.')[0] for timing in timings}
+
+    return [name for name in HEAVY_MODULES if name in imported]
+
+def _project_root():
+    return os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,127 @@
+from flask import current_app, request, jsonify, url_for, make_response, abort
+from sqlalchemy import func
+from datetime import timezone
+import base64
+import hashlib
+import json
+
+def encode_cursor(last_id):
+    """Encode the position after a row as an opaque cursor"""
+    return base64.urlsafe_b64encode(json.dumps({'after': last_id}).encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor made by encode_cursor
+
+    Args:
+        cursor (str): Cursor from a previous page, or None for the first page
+
+    Returns:
+        int: ID of the last row of the previous page, or None for the first page
+    """
+    if not cursor:
+        return None
+
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        after = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))['after']
+    except (ValueError, KeyError, TypeError):
+        abort(400, description='Invalid cursor.')
+
+    if not isinstance(after, int):
+        abort(400, description='Invalid cursor.')
+
+    return after
+
+def parse_fields(serializers, default_fields):
+    """
+    Get the fields requested with ?fields=, validated against the serializers
+
+    Args:
+        serializers (dict): Mapping of field name to a function of the row
+        default_fields (list): Fields returned when none are requested
+
+    Returns:
+        list: Field names, in request order
+    """
+    requested = request.args.get('fields')
+
+    if not requested:
+        return list(default_fields)
+
+    fields = [field.strip() for field in requested.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in serializers]
+
+    if unknown or not fields:
+        abort(400, description=f"Unknown fields: {', '.join(unknown)}. Available fields: {', '.join(serializers)}.")
+
+    return fields
+
+def paginated_collection(model, updated_column, serializers, default_fields):
+    """
+    Build a cursor-paginated, conditional JSON response for a model collection
+
+    Rows are returned in ID order as a JSON array. The next page is linked
+    with a ``Link: <...>; rel="next"`` header. The ETag covers the newest
+    ``updated_column`` value, the row count and the request parameters, so
+    a poll of an unchanged collection gets a 304 before any row is loaded.
+
+    Args:
+        model: SQLAlchemy model of the collection
+        updated_column: Column holding each row's last update time
+        serializers (dict): Mapping of field name to a function of the row
+        default_fields (list): Fields returned when none are requested
+
+    Returns:
+        Response: JSON array of rows, or 304 Not Modified
+    """
+    fields = parse_fields(serializers, default_fields)
+    after = decode_cursor(request.args.get('cursor'))
+
+    max_page_size = current_app.config.get('KB_API_MAX_PAGE_SIZE', 500)
+    limit = request.args.get('limit', current_app.config.get('KB_API_PAGE_SIZE', 100), type=int)
+    limit = min(max(limit, 1), max_page_size)
+
+    # One aggregate query decides whether anything changed
+    last_updated, count = model.query.with_entities(func.max(updated_column), func.count(model.id)).one()
+
+    etag = hashlib.sha256(json.dumps(
+        [str(last_updated), count, after, limit, fields, request.endpoint]
+    ).encode('utf-8')).hexdigest()[:32]
+    last_modified = last_updated.replace(tzinfo=timezone.utc, microsecond=0) if last_updated else None
+
+    if _is_not_modified(etag, last_modified):
+        response = make_response('', 304)
+    else:
+        query = model.query
+        if after is not None:
+            query = query.filter(model.id > after)
+
+        # Fetch one extra row to know whether there is a next page
+        rows = query.order_by(model.id).limit(limit + 1).all()
+        has_next = len(rows) > limit
+        rows = rows[:limit]
+
+        response = jsonify([{field: serializers[field](row) for field in fields} for row in rows])
+
+        if has_next:
+            args = request.args.to_dict()
+            args['cursor'] = encode_cursor(rows[-1].id)
+            response.headers['Link'] = f'<{url_for(request.endpoint, **args)}>; rel="next"'
+
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'private, no-cache'
+
+    return response
+
+def _is_not_modified(etag, last_modified):
+    # If-None-Match takes precedence over If-Modified-Since (RFC 9110)
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+
+    if request.if_modified_since and last_modified:
+        return last_modified <= request.if_modified_since
+
+    return False
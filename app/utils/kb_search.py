@@ -0,0 +1,243 @@
+from flask import current_app, url_for
+from markupsafe import Markup, escape
+from sqlalchemy import event, text
+from app.models.models import LegalDocument, Form
+from app import db
+from collections import namedtuple
+import re
+
+# Full-text index over legal documents and forms. Rows of both tables share
+# the index, so the row ID encodes the source: id * 2 for legal documents
+# and id * 2 + 1 for forms.
+SEARCH_TABLE = 'kb_search'
+
+# Relative weight of the title, code and body columns in BM25 ranking
+COLUMN_WEIGHTS = (10.0, 5.0, 1.0)
+
+# Markers placed around matches by the index, replaced by <mark> after escaping
+_MATCH_START = '\x02'
+_MATCH_END = '\x03'
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+SearchPage = namedtuple('SearchPage', ['results', 'total', 'page', 'per_page', 'pages'])
+
+_INDEX_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        title, code, body, kind UNINDEXED,
+        tokenize = 'porter unicode61 remove_diacritics 2'
+    )""",
+]
+
+def _sync_triggers(table, offset, kind, title, code, body):
+    row = f"(rowid, title, code, body, kind) VALUES (new.id * 2 + {offset}, new.{title}, {code}, new.{body}, '{kind}')"
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_search_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {SEARCH_TABLE} {row};
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_search_ad AFTER DELETE ON {table} BEGIN
+            DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id * 2 + {offset};
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {table}_search_au AFTER UPDATE ON {table} BEGIN
+            DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id * 2 + {offset};
+            INSERT INTO {SEARCH_TABLE} {row};
+        END""",
+    ]
+
+_TRIGGER_DDL = (
+    _sync_triggers(LegalDocument.__tablename__, 0, 'document', 'title', "''", 'content') +
+    _sync_triggers(Form.__tablename__, 1, 'form', 'name', 'new.form_code', 'description')
+)
+
+_REBUILD_SQL = [
+    f"DELETE FROM {SEARCH_TABLE}",
+    f"""INSERT INTO {SEARCH_TABLE} (rowid, title, code, body, kind)
+        SELECT id * 2, title, '', content, 'document' FROM {LegalDocument.__tablename__}""",
+    f"""INSERT INTO {SEARCH_TABLE} (rowid, title, code, body, kind)
+        SELECT id * 2 + 1, name, form_code, description, 'form' FROM {Form.__tablename__}""",
+]
+
+@event.listens_for(db.metadata, 'after_create')
+def create_search_index(target, connection, **kw):
+    """Create the search index and its sync triggers along with the schema"""
+    if connection.dialect.name != 'sqlite':
+        return
+
+    tables = {
+        row[0] for row in connection.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table'")
+    }
+
+    if LegalDocument.__tablename__ not in tables or Form.__tablename__ not in tables:
+        return
+
+    exists = SEARCH_TABLE in tables
+
+    for statement in _INDEX_DDL + _TRIGGER_DDL:
+        connection.exec_driver_sql(statement)
+
+    if not exists:
+        # Index rows that were created before the index existed
+        for statement in _REBUILD_SQL:
+            connection.exec_driver_sql(statement)
+
+def rebuild_search_index():
+    """
+    Re-index every legal document and form and optimize the index
+
+    Returns:
+        int: Number of indexed rows
+    """
+    for statement in _INDEX_DDL + _TRIGGER_DDL + _REBUILD_SQL:
+        db.session.execute(text(statement))
+
+    db.session.execute(text(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')"))
+    db.session.commit()
+
+    return db.session.execute(text(f"SELECT count(*) FROM {SEARCH_TABLE}")).scalar()
+
+def is_search_index_available():
+    """Check whether searches can use the full-text index"""
+    return db.engine.dialect.name == 'sqlite'
+
+def build_match_query(query):
+    """
+    Turn free text into an FTS5 query
+
+    Every word must match, the last one as a prefix so that partially typed
+    words still find results. Words are quoted so FTS5 operators typed by
+    users are searched for literally.
+
+    Args:
+        query (str): Search text
+
+    Returns:
+        str: FTS5 MATCH expression, or None if the text has no words
+    """
+    tokens = _TOKEN_RE.findall(query)
+
+    if not tokens:
+        return None
+
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += '*'
+
+    return ' '.join(terms)
+
+def search_knowledge_base(query, page=1, per_page=None):
+    """
+    Search legal documents and forms
+
+    Args:
+        query (str): Search text
+        page (int, optional): 1-based page number. Defaults to 1.
+        per_page (int, optional): Results per page. Defaults to KB_SEARCH_PER_PAGE.
+
+    Returns:
+        SearchPage: Results of the page, best match first, with the total number of matches
+    """
+    per_page = per_page or current_app.config.get('KB_SEARCH_PER_PAGE', 20)
+    page = max(page, 1)
+
+    if is_search_index_available():
+        hits, total = _search_index(query, page, per_page)
+    else:
+        hits, total = _search_like(query, page, per_page)
+
+    return SearchPage(_build_results(hits), total, page, per_page, max((total + per_page - 1) // per_page, 1))
+
+def _search_index(query, page, per_page):
+    match = build_match_query(query)
+    if match is None:
+        return [], 0
+
+    total = db.session.execute(
+        text(f"SELECT count(*) FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :match"),
+        {'match': match}
+    ).scalar()
+
+    if not total:
+        return [], 0
+
+    weights = ', '.join(str(weight) for weight in COLUMN_WEIGHTS)
+    rows = db.session.execute(text(f"""
+        SELECT rowid, kind,
+               highlight({SEARCH_TABLE}, 0, :start, :end) AS title,
+               snippet({SEARCH_TABLE}, 2, :start, :end, '...', 32) AS snippet
+        FROM {SEARCH_TABLE}
+        WHERE {SEARCH_TABLE} MATCH :match
+        ORDER BY bm25({SEARCH_TABLE}, {weights})
+        LIMIT :limit OFFSET :offset
+    """), {
+        'match': match,
+        'start': _MATCH_START,
+        'end': _MATCH_END,
+        'limit': per_page,
+        'offset': (page - 1) * per_page
+    }).all()
+
+    hits = [(row.kind, row.rowid // 2, row.title, row.snippet) for row in rows]
+
+    return hits, total
+
+def _search_like(query, page, per_page):
+    # Unranked fallback for databases without the full-text index
+    pattern = f'%{query}%'
+
+    documents = LegalDocument.query.filter(
+        (LegalDocument.title.ilike(pattern)) |
+        (LegalDocument.content.ilike(pattern))
+    ).order_by(LegalDocument.last_updated.desc()).all()
+
+    forms = Form.query.filter(
+        (Form.name.ilike(pattern)) |
+        (Form.form_code.ilike(pattern)) |
+        (Form.description.ilike(pattern))
+    ).order_by(Form.last_updated.desc()).all()
+
+    hits = [('document', doc.id, doc.title, _leading_snippet(doc.content)) for doc in documents]
+    hits += [('form', form.id, form.name, _leading_snippet(form.description)) for form in forms]
+
+    start = (page - 1) * per_page
+
+    return hits[start:start + per_page], len(hits)
+
+def _leading_snippet(value):
+    value = value or ''
+    return value[:200] + '...' if len(value) > 200 else value
+
+def _build_results(hits):
+    document_ids = [ref_id for kind, ref_id, _, _ in hits if kind == 'document']
+    form_ids = [ref_id for kind, ref_id, _, _ in hits if kind == 'form']
+
+    documents = {doc.id: doc for doc in LegalDocument.query.filter(LegalDocument.id.in_(document_ids))} if document_ids else {}
+    forms = {form.id: form for form in Form.query.filter(Form.id.in_(form_ids))} if form_ids else {}
+
+    results = []
+
+    for kind, ref_id, title, snippet in hits:
+        if kind == 'document' and ref_id in documents:
+            doc = documents[ref_id]
+            results.append({
+                'title': _highlight(title),
+                'type': doc.document_type,
+                'snippet': _highlight(snippet),
+                'last_updated': doc.last_updated,
+                'url': url_for('knowledge_base.view_document', document_id=doc.id)
+            })
+        elif kind == 'form' and ref_id in forms:
+            form = forms[ref_id]
+            results.append({
+                'title': _highlight(title),
+                'type': f'Form {form.form_code}',
+                'snippet': _highlight(snippet),
+                'last_updated': form.last_updated,
+                'url': url_for('knowledge_base.download_form', form_id=form.id)
+            })
+
+    return results
+
+def _highlight(value):
+    """Escape indexed text and turn match markers into <mark> tags"""
+    escaped = str(escape(value or ''))
+
+    return Markup(escaped.replace(_MATCH_START, '<mark>').replace(_MATCH_END, '</mark>'))
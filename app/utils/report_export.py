@@ -0,0 +1,173 @@
+from flask import current_app
+from sqlalchemy import update
+from app.models.analytics_models import ComplianceReport
+from app import db
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import atexit
+import logging
+import os
+import threading
+
+def get_reports_folder():
+    """
+    Get the folder exported reports are written to
+
+    Reports are kept under the instance folder, outside the static folder,
+    so they can only be fetched through the download route and its
+    organization check.
+
+    Returns:
+        str: REPORT_EXPORT_FOLDER, or the reports folder in the instance folder
+    """
+    folder = current_app.config.get('REPORT_EXPORT_FOLDER') or os.path.join(current_app.instance_path, 'reports')
+    os.makedirs(folder, exist_ok=True)
+
+    return folder
+
+class ReportExporter:
+    """Thread pool that builds exported reports outside request threads
+
+    Each job is tracked by a ComplianceReport row whose status moves from
+    pending to running to completed or failed, so any web worker can answer
+    status polls. Every move is a conditional update, so a report that timed
+    out stays failed when its job finishes late. Jobs running for longer
+    than REPORT_EXPORT_TIMEOUT, and jobs no worker started within
+    REPORT_EXPORT_QUEUE_TIMEOUT, e.g. because the process holding them
+    exited, are failed.
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._lock = threading.Lock()
+        self._app = None
+        self.logger = logging.getLogger(__name__)
+
+    def init_app(self, app):
+        """
+        Bind the exporter to an application and register the pool shutdown
+
+        Args:
+            app: Flask application instance
+        """
+        app.config.setdefault('REPORT_EXPORT_WORKERS', 2)
+        app.config.setdefault('REPORT_EXPORT_TIMEOUT', 300)
+        app.config.setdefault('REPORT_EXPORT_QUEUE_TIMEOUT', 3600)
+
+        if self._app is None:
+            atexit.register(self.shutdown)
+
+        self._app = app
+
+    def submit(self, report_id, build):
+        """
+        Queue a report to be built in the background
+
+        Args:
+            report_id (int): ID of a pending ComplianceReport
+            build (callable): Function taking the report and returning the
+                path of the generated file relative to the reports folder
+        """
+        if self._app is None:
+            self.init_app(current_app._get_current_object())
+
+        self._get_executor().submit(self._run, report_id, build)
+
+    def expire_stale(self, report):
+        """
+        Fail a report whose job has run or waited for too long
+
+        A running job times out REPORT_EXPORT_TIMEOUT seconds after it
+        started, and a pending one REPORT_EXPORT_QUEUE_TIMEOUT seconds after
+        it was queued.
+
+        Args:
+            report (ComplianceReport): Report to check
+
+        Returns:
+            bool: True if the report was marked as failed
+        """
+        now = datetime.utcnow()
+
+        if report.status == 'running':
+            timeout = current_app.config.get('REPORT_EXPORT_TIMEOUT', 300)
+            since = report.started_at or report.created_at
+        elif report.status == 'pending':
+            timeout = current_app.config.get('REPORT_EXPORT_QUEUE_TIMEOUT', 3600)
+            since = report.created_at
+        else:
+            return False
+
+        if since > now - timedelta(seconds=timeout):
+            return False
+
+        failed = _finish(report.id, report.status, status='failed', error_message='Report export timed out')
+        db.session.refresh(report)
+
+        return failed
+
+    def shutdown(self):
+        """Stop the worker threads, abandoning queued jobs"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, report_id, build):
+        with self._app.app_context():
+            # Conditional update; the report may have timed out in the queue
+            claimed = db.session.execute(
+                update(ComplianceReport)
+                .where(ComplianceReport.id == report_id, ComplianceReport.status == 'pending')
+                .values(status='running', started_at=datetime.utcnow())
+            ).rowcount
+            db.session.commit()
+
+            if not claimed:
+                return
+
+            report = db.session.get(ComplianceReport, report_id)
+
+            try:
+                file_path = build(report)
+            except Exception as e:
+                db.session.rollback()
+                self.logger.error(f"Error exporting report {report_id}: {str(e)}")
+                _finish(report_id, 'running', status='failed', error_message=str(e))
+                return
+
+            if not _finish(report_id, 'running', status='completed', file_path=file_path):
+                self.logger.warning(f"Discarding report {report_id}, which timed out before it was built")
+                _remove_report_file(file_path)
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._app.config['REPORT_EXPORT_WORKERS'],
+                    thread_name_prefix='report-export'
+                )
+            return self._executor
+
+# Process-wide exporter
+report_exporter = ReportExporter()
+
+def _finish(report_id, expected_status, **values):
+    """Finish a report that is still in the expected status, returning whether it was"""
+    db.session.rollback()
+
+    finished = db.session.execute(
+        update(ComplianceReport)
+        .where(ComplianceReport.id == report_id, ComplianceReport.status == expected_status)
+        .values(completed_at=datetime.utcnow(), **values)
+    ).rowcount
+    db.session.commit()
+
+    return bool(finished)
+
+def _remove_report_file(file_path):
+    try:
+        os.remove(os.path.join(get_reports_folder(), file_path))
+    except OSError:
+        pass
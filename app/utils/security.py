@@ -3,6 +3,8 @@ from flask_login import login_required, current_user, logout_user
 from app.models.models import Organization, User, Document
 from app.models.subscription_models import Subscription, Feature, UsageRecord, TierFeature, Tier
 from app import db
+from app.utils.entitlements import has_feature_access, get_feature_entitlement
+from app.utils.usage_quota import get_quota_usage
 from datetime import datetime, timedelta
 import os
 import json
@@ -212,49 +214,23 @@ def check_usage_limits():
     if not feature_name:
         return jsonify({'within_limits': False, 'error': 'No feature specified'})
     
-    # Get active subscription
-    subscription = Subscription.query.filter_by(
-        organization_id=organization.id,
-        is_active=True
-    ).first()
-    
-    if not subscription:
-        return jsonify({'within_limits': False, 'error': 'No active subscription'})
-    
-    # Get feature
-    feature = Feature.query.filter_by(name=feature_name).first()
-    
-    if not feature:
-        return jsonify({'within_limits': False, 'error': 'Invalid feature'})
+    # Get the feature as granted by the active subscription's tier
+    entitlement = get_feature_entitlement(organization.id, feature_name)
     
-    # Get tier feature
-    tier_feature = db.session.query(TierFeature).filter(
-        TierFeature.tier_id == subscription.tier_id,
-        TierFeature.feature_id == feature.id
-    ).first()
-    
-    if not tier_feature:
+    if not entitlement:
         return jsonify({'within_limits': False, 'error': 'Feature not available in subscription tier'})
     
-    if not tier_feature.is_enabled:
-        return jsonify({'within_limits': False, 'error': 'Feature not enabled in subscription tier'})
-    
     # Check usage limits
-    if tier_feature.usage_limit is not None:
-        # Get current month's usage
-        current_month = datetime.utcnow().replace(day=1).date()
-        month_usage = db.session.query(db.func.sum(UsageRecord.count)).filter(
-            UsageRecord.subscription_id == subscription.id,
-            UsageRecord.feature_id == feature.id,
-            UsageRecord.date >= current_month
-        ).scalar() or 0
+    if entitlement.usage_limit is not None:
+        # Get current month's usage from the quota ledger
+        month_usage = get_quota_usage(entitlement.subscription_id, entitlement.feature_id)
         
-        if month_usage >= tier_feature.usage_limit:
+        if month_usage >= entitlement.usage_limit:
             return jsonify({
                 'within_limits': False, 
                 'error': 'Usage limit exceeded',
                 'current_usage': month_usage,
-                'limit': tier_feature.usage_limit
+                'limit': entitlement.usage_limit
             })
     
     # Within limits
@@ -422,29 +398,3 @@ def feature_required(feature_name):
             return f(*args, **kwargs)
         return decorated_function
     return decorator
-
-def has_feature_access(organization_id, feature_name):
-    """Check if organization has access to a feature based on subscription tier"""
-    # Get active subscription
-    subscription = Subscription.query.filter_by(
-        organization_id=organization_id,
-        is_active=True
-    ).first()
-    
-    if not subscription:
-        return False
-    
-    # Get feature
-    feature = Feature.query.filter_by(name=feature_name).first()
-    
-    if not feature:
-        return False
-    
-    # Check if feature is enabled for tier
-    tier_feature = db.session.query(TierFeature).filter(
-        TierFeature.tier_id == subscription.tier_id,
-        TierFeature.feature_id == feature.id,
-        TierFeature.is_enabled == True
-    ).first()
-    
-    return tier_feature is not None
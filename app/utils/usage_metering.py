@@ -0,0 +1,249 @@
+from flask import current_app
+from sqlalchemy.dialects import postgresql, sqlite
+from app.models.subscription_models import Subscription, Feature, UsageRecord
+from app import db
+from collections import Counter
+from datetime import datetime
+import atexit
+import logging
+import threading
+
+class UsageMeter:
+    """Write-behind buffer for feature usage events
+
+    Usage events are counted in memory per worker process and periodically
+    flushed to UsageRecord as aggregated atomic increments, so recording
+    usage does not cost a write transaction per request.
+    """
+
+    def __init__(self):
+        self._buffer = Counter()  # (organization_id, feature_name, date, quota_consumed) -> count
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._app = None
+        self._thread = None
+        self.logger = logging.getLogger(__name__)
+
+    def init_app(self, app):
+        """
+        Bind the meter to an application and register the shutdown flush
+
+        Args:
+            app: Flask application instance
+        """
+        app.config.setdefault('USAGE_FLUSH_INTERVAL', 10)
+        app.config.setdefault('USAGE_BUFFER_MAX_KEYS', 10000)
+
+        if self._app is None:
+            atexit.register(self.shutdown)
+
+        self._app = app
+
+    def record(self, organization_id, feature_name, quota_consumed=False):
+        """
+        Buffer a single usage event
+
+        Args:
+            organization_id (int): ID of the organization using the feature
+            feature_name (str): Name of the feature being used
+            quota_consumed (bool, optional): Whether the use was already counted
+                against the monthly quota. Defaults to False.
+        """
+        if not organization_id or not feature_name:
+            return
+
+        if self._app is None:
+            self.init_app(current_app._get_current_object())
+
+        key = (organization_id, feature_name, datetime.utcnow().date(), quota_consumed)
+
+        with self._lock:
+            self._buffer[key] += 1
+            buffered_keys = len(self._buffer)
+
+        interval = self._app.config['USAGE_FLUSH_INTERVAL']
+
+        if interval <= 0 or buffered_keys >= self._app.config['USAGE_BUFFER_MAX_KEYS']:
+            # Write-through mode, or the buffer is full: flush on the caller
+            self.flush()
+        else:
+            self._ensure_flusher(interval)
+
+    def flush(self):
+        """Write all buffered usage to the database"""
+        if self._app is None:
+            return
+
+        with self._flush_lock:
+            with self._lock:
+                pending, self._buffer = self._buffer, Counter()
+
+            if not pending:
+                return
+
+            try:
+                with self._app.app_context():
+                    write_usage_counts(pending)
+            except Exception as e:
+                self.logger.error(f"Error flushing feature usage: {str(e)}")
+                self._requeue(pending)
+
+    def shutdown(self):
+        """Stop the background flush thread and write any remaining usage"""
+        self._stopped.set()
+        self.flush()
+
+    def _requeue(self, pending):
+        """Put unwritten counts back into the buffer, dropping them if it is full"""
+        max_keys = self._app.config['USAGE_BUFFER_MAX_KEYS']
+
+        with self._lock:
+            for key, count in pending.items():
+                if key in self._buffer or len(self._buffer) < max_keys:
+                    self._buffer[key] += count
+
+    def _ensure_flusher(self, interval):
+        """Start the background flush thread if it is not running"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+
+            self._thread = threading.Thread(
+                target=self._run_flusher,
+                args=(interval,),
+                name='usage-meter-flush',
+                daemon=True
+            )
+            self._thread.start()
+
+    def _run_flusher(self, interval):
+        while not self._stopped.wait(interval):
+            self.flush()
+
+# Process-wide meter
+usage_meter = UsageMeter()
+
+def record_feature_usage(organization_id, feature_name, quota_consumed=False):
+    """Record usage of a feature"""
+    usage_meter.record(organization_id, feature_name, quota_consumed)
+
+def flush_feature_usage():
+    """Flush buffered feature usage to the database"""
+    usage_meter.flush()
+
+def write_usage_counts(counts):
+    """
+    Write aggregated usage counts as atomic increments
+
+    Daily UsageRecord rows and the monthly quota ledger are updated in
+    the same transaction.
+
+    Args:
+        counts (dict): Mapping of (organization_id, feature_name, date, quota_consumed) to count
+    """
+    from app.utils.usage_quota import add_quota_usage
+
+    organization_ids = {key[0] for key in counts}
+    feature_names = {key[1] for key in counts}
+
+    # Resolve active subscriptions and features for the whole batch
+    subscription_ids = dict(db.session.query(
+        Subscription.organization_id, Subscription.id
+    ).filter(
+        Subscription.organization_id.in_(organization_ids),
+        Subscription.is_active == True
+    ).all())
+
+    feature_ids = dict(db.session.query(
+        Feature.name, Feature.id
+    ).filter(
+        Feature.name.in_(feature_names)
+    ).all())
+
+    rows = Counter()
+    quotas = Counter()
+    for (organization_id, feature_name, date, quota_consumed), count in counts.items():
+        subscription_id = subscription_ids.get(organization_id)
+        feature_id = feature_ids.get(feature_name)
+
+        if subscription_id and feature_id:
+            rows[(subscription_id, feature_id, date)] += count
+
+            # Uses reserved up front were already counted in the ledger
+            if not quota_consumed:
+                quotas[(subscription_id, feature_id, date.replace(day=1))] += count
+
+    for (subscription_id, feature_id, date), count in rows.items():
+        increment_usage_record(subscription_id, feature_id, date, count)
+
+    for (subscription_id, feature_id, month), count in quotas.items():
+        add_quota_usage(subscription_id, feature_id, month, count)
+
+    db.session.commit()
+
+def increment_usage_record(subscription_id, feature_id, date, count):
+    """
+    Atomically add to a daily usage record, creating it if needed
+
+    Args:
+        subscription_id (int): Subscription ID
+        feature_id (int): Feature ID
+        date (date): Usage date
+        count (int): Number of uses to add
+    """
+    table = UsageRecord.__table__
+    insert = dialect_insert(table)
+
+    if insert is not None:
+        stmt = insert.values(
+            subscription_id=subscription_id,
+            feature_id=feature_id,
+            date=date,
+            count=count
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['subscription_id', 'feature_id', 'date'],
+            set_={'count': table.c.count + stmt.excluded.count}
+        )
+        db.session.execute(stmt)
+        return
+
+    # Generic fallback: increment in place, insert if nothing was updated
+    result = db.session.execute(
+        table.update().where(
+            table.c.subscription_id == subscription_id,
+            table.c.feature_id == feature_id,
+            table.c.date == date
+        ).values(count=table.c.count + count)
+    )
+
+    if result.rowcount == 0:
+        db.session.execute(table.insert().values(
+            subscription_id=subscription_id,
+            feature_id=feature_id,
+            date=date,
+            count=count
+        ))
+
+def dialect_insert(table):
+    """
+    Get an INSERT construct that supports ON CONFLICT for the current database
+
+    Args:
+        table: SQLAlchemy Table to insert into
+
+    Returns:
+        Insert: Dialect-specific insert, or None if the database has no upsert support
+    """
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect == 'sqlite':
+        return sqlite.insert(table)
+    if dialect == 'postgresql':
+        return postgresql.insert(table)
+
+    return None
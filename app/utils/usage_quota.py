@@ -0,0 +1,175 @@
+from sqlalchemy import func, case
+from app.models.subscription_models import UsageRecord, UsageQuota
+from app.utils.entitlements import get_feature_entitlement
+from app.utils.usage_metering import dialect_insert
+from app.utils.usage_rollup import month_start, next_month
+from app import db
+from datetime import datetime
+
+def get_quota_usage(subscription_id, feature_id, month=None):
+    """
+    Get how many uses of a feature have been counted against a month's quota
+
+    Args:
+        subscription_id (int): Subscription ID
+        feature_id (int): Feature ID
+        month (date, optional): Any day in the month. Defaults to the current month.
+
+    Returns:
+        int: Uses counted so far
+    """
+    month = month_start(month or datetime.utcnow().date())
+    quota = db.session.get(UsageQuota, (subscription_id, feature_id, month))
+
+    return quota.used if quota else 0
+
+def add_quota_usage(subscription_id, feature_id, month, amount):
+    """
+    Atomically add uses to a month's quota counter without checking the limit
+
+    The caller is responsible for committing the session.
+
+    Args:
+        subscription_id (int): Subscription ID
+        feature_id (int): Feature ID
+        month (date): Any day in the month
+        amount (int): Number of uses to add (negative to give uses back)
+    """
+    month = month_start(month)
+
+    _ensure_quota_row(subscription_id, feature_id, month)
+
+    table = UsageQuota.__table__
+    db.session.execute(
+        table.update().where(
+            table.c.subscription_id == subscription_id,
+            table.c.feature_id == feature_id,
+            table.c.month == month
+        ).values(used=case((table.c.used + amount < 0, 0), else_=table.c.used + amount))
+    )
+
+def consume_quota(subscription_id, feature_id, limit, amount=1):
+    """
+    Atomically count uses against the current month's quota if they fit
+
+    The check and the increment are a single conditional UPDATE, so
+    concurrent requests cannot push usage past the limit. Commits the session.
+
+    Args:
+        subscription_id (int): Subscription ID
+        feature_id (int): Feature ID
+        limit (int): Monthly usage limit, or None for unlimited
+        amount (int, optional): Number of uses to consume. Defaults to 1.
+
+    Returns:
+        bool: True if the uses were counted, False if they would exceed the limit
+    """
+    month = month_start(datetime.utcnow().date())
+
+    _ensure_quota_row(subscription_id, feature_id, month)
+
+    table = UsageQuota.__table__
+    stmt = table.update().where(
+        table.c.subscription_id == subscription_id,
+        table.c.feature_id == feature_id,
+        table.c.month == month
+    ).values(used=table.c.used + amount)
+
+    if limit is not None:
+        stmt = stmt.where(table.c.used + amount <= limit)
+
+    result = db.session.execute(stmt)
+    db.session.commit()
+
+    return result.rowcount == 1
+
+def consume_feature_quota(organization_id, feature_name):
+    """
+    Reserve one use of a feature for an organization, respecting its tier limit
+
+    Use release_feature_quota to give the use back if the work fails, and
+    record_feature_usage(..., quota_consumed=True) once it succeeds.
+
+    Args:
+        organization_id (int): Organization ID
+        feature_name (str): Name of the feature
+
+    Returns:
+        bool: True if the use was reserved, False if the feature is unavailable or the limit is reached
+    """
+    entitlement = get_feature_entitlement(organization_id, feature_name)
+
+    if not entitlement:
+        return False
+
+    return consume_quota(entitlement.subscription_id, entitlement.feature_id, entitlement.usage_limit)
+
+def release_feature_quota(organization_id, feature_name, reserved_on=None):
+    """
+    Give back a use reserved with consume_feature_quota
+
+    The use goes back to the month it was reserved in, so work that fails
+    after a month boundary does not free up a use in the new month.
+
+    Args:
+        organization_id (int): Organization ID
+        feature_name (str): Name of the feature
+        reserved_on (date or datetime, optional): When the use was reserved. Defaults to today.
+    """
+    entitlement = get_feature_entitlement(organization_id, feature_name)
+
+    if not entitlement:
+        return
+
+    add_quota_usage(entitlement.subscription_id, entitlement.feature_id, reserved_on or datetime.utcnow().date(), -1)
+    db.session.commit()
+
+def rebuild_quota_ledger(month=None):
+    """
+    Recompute a month's quota counters from the daily usage records
+
+    Args:
+        month (date, optional): Any day in the month. Defaults to the current month.
+
+    Returns:
+        int: Number of quota counters written
+    """
+    start = month_start(month or datetime.utcnow().date())
+
+    rows = db.session.query(
+        UsageRecord.subscription_id, UsageRecord.feature_id, func.sum(UsageRecord.count)
+    ).filter(
+        UsageRecord.date >= start,
+        UsageRecord.date < next_month(start)
+    ).group_by(UsageRecord.subscription_id, UsageRecord.feature_id).all()
+
+    for subscription_id, feature_id, total in rows:
+        quota = db.session.get(UsageQuota, (subscription_id, feature_id, start))
+
+        if quota is None:
+            quota = UsageQuota(subscription_id=subscription_id, feature_id=feature_id, month=start)
+
+        quota.used = int(total or 0)
+        db.session.add(quota)
+
+    db.session.commit()
+
+    return len(rows)
+
+def _ensure_quota_row(subscription_id, feature_id, month):
+    """Create a zeroed quota counter if one does not exist yet"""
+    table = UsageQuota.__table__
+    insert = dialect_insert(table)
+
+    if insert is not None:
+        db.session.execute(insert.values(
+            subscription_id=subscription_id,
+            feature_id=feature_id,
+            month=month,
+            used=0
+        ).on_conflict_do_nothing())
+        return
+
+    if db.session.get(UsageQuota, (subscription_id, feature_id, month)) is None:
+        db.session.add(UsageQuota(subscription_id=subscription_id, feature_id=feature_id, month=month, used=0))
+        db.session.flush()
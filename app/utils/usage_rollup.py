@@ -0,0 +1,202 @@
+from sqlalchemy import func
+from app.models.subscription_models import Feature, UsageRecord, UsageMonthlySummary
+from app.utils.usage_metering import dialect_insert
+from app import db
+from collections import Counter
+from datetime import datetime, date
+
+def month_start(day):
+    """Get the first day of the month containing a date"""
+    return date(day.year, day.month, 1)
+
+def next_month(day):
+    """Get the first day of the month after a date"""
+    if day.month == 12:
+        return date(day.year + 1, 1, 1)
+    return date(day.year, day.month + 1, 1)
+
+def previous_month(day):
+    """Get the first day of the month before a date"""
+    if day.month == 1:
+        return date(day.year - 1, 12, 1)
+    return date(day.year, day.month - 1, 1)
+
+def get_month_totals(subscription_id, month=None):
+    """
+    Get per-feature usage totals for a single month
+
+    Args:
+        subscription_id (int): Subscription ID
+        month (date, optional): Any day in the month. Defaults to the current month.
+
+    Returns:
+        dict: Mapping of feature name to total usage count
+    """
+    start = month_start(month or datetime.utcnow().date())
+
+    rows = db.session.query(
+        Feature.name, func.sum(UsageRecord.count)
+    ).join(
+        Feature, Feature.id == UsageRecord.feature_id
+    ).filter(
+        UsageRecord.subscription_id == subscription_id,
+        UsageRecord.date >= start,
+        UsageRecord.date < next_month(start)
+    ).group_by(Feature.name).all()
+
+    return {name: int(total or 0) for name, total in rows}
+
+def get_usage_rollup(subscription_id):
+    """
+    Get daily and monthly per-feature usage totals for a subscription
+
+    Closed months are read from UsageMonthlySummary. Only usage recorded after
+    the last summarized month is aggregated from the daily UsageRecord rows.
+
+    Args:
+        subscription_id (int): Subscription ID
+
+    Returns:
+        dict: Rollup with the following keys:
+            feature_names: Mapping of feature ID to feature name
+            daily: Mapping of feature ID to {'YYYY-MM-DD': count} for unsummarized days
+            monthly: Mapping of feature ID to {'YYYY-MM': count} for all months
+    """
+    feature_names = {}
+    daily = {}
+    monthly = {}
+
+    # Closed months
+    summaries = db.session.query(
+        UsageMonthlySummary.feature_id, Feature.name, UsageMonthlySummary.month, UsageMonthlySummary.count
+    ).join(
+        Feature, Feature.id == UsageMonthlySummary.feature_id
+    ).filter(
+        UsageMonthlySummary.subscription_id == subscription_id
+    ).all()
+
+    raw_since = None
+    for feature_id, name, month, count in summaries:
+        feature_names[feature_id] = name
+        monthly.setdefault(feature_id, {})[month.strftime('%Y-%m')] = count
+
+        if raw_since is None or next_month(month) > raw_since:
+            raw_since = next_month(month)
+
+    # Days not yet covered by a monthly summary
+    query = db.session.query(
+        UsageRecord.feature_id, Feature.name, UsageRecord.date, func.sum(UsageRecord.count)
+    ).join(
+        Feature, Feature.id == UsageRecord.feature_id
+    ).filter(
+        UsageRecord.subscription_id == subscription_id
+    )
+
+    if raw_since is not None:
+        query = query.filter(UsageRecord.date >= raw_since)
+
+    rows = query.group_by(UsageRecord.feature_id, Feature.name, UsageRecord.date).all()
+
+    for feature_id, name, day, total in rows:
+        total = int(total or 0)
+        feature_names[feature_id] = name
+        daily.setdefault(feature_id, {})[day.strftime('%Y-%m-%d')] = total
+
+        month_key = day.strftime('%Y-%m')
+        feature_months = monthly.setdefault(feature_id, {})
+        feature_months[month_key] = feature_months.get(month_key, 0) + total
+
+    return {
+        'feature_names': feature_names,
+        'daily': daily,
+        'monthly': monthly
+    }
+
+def rollup_closed_months(today=None):
+    """
+    Summarize daily usage of closed months into UsageMonthlySummary
+
+    The previous month is always re-summarized so that usage flushed shortly
+    after a month boundary is still counted. Re-running is idempotent.
+
+    Args:
+        today (date, optional): Reference date. Defaults to the current date.
+
+    Returns:
+        int: Number of monthly summary rows written
+    """
+    cutoff = month_start(today or datetime.utcnow().date())
+
+    latest = db.session.query(func.max(UsageMonthlySummary.month)).scalar()
+
+    query = db.session.query(
+        UsageRecord.subscription_id, UsageRecord.feature_id, UsageRecord.date, func.sum(UsageRecord.count)
+    ).filter(
+        UsageRecord.date < cutoff
+    )
+
+    if latest is not None:
+        since = min(next_month(latest), previous_month(cutoff))
+        query = query.filter(UsageRecord.date >= since)
+
+    rows = query.group_by(
+        UsageRecord.subscription_id, UsageRecord.feature_id, UsageRecord.date
+    ).all()
+
+    totals = Counter()
+    for subscription_id, feature_id, day, total in rows:
+        totals[(subscription_id, feature_id, month_start(day))] += int(total or 0)
+
+    for (subscription_id, feature_id, month), count in totals.items():
+        write_monthly_summary(subscription_id, feature_id, month, count)
+
+    db.session.commit()
+
+    return len(totals)
+
+def write_monthly_summary(subscription_id, feature_id, month, count):
+    """
+    Insert or replace a monthly usage summary row
+
+    Args:
+        subscription_id (int): Subscription ID
+        feature_id (int): Feature ID
+        month (date): First day of the month
+        count (int): Total usage for the month
+    """
+    table = UsageMonthlySummary.__table__
+    insert = dialect_insert(table)
+    now = datetime.utcnow()
+
+    if insert is not None:
+        stmt = insert.values(
+            subscription_id=subscription_id,
+            feature_id=feature_id,
+            month=month,
+            count=count,
+            updated_at=now
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['subscription_id', 'feature_id', 'month'],
+            set_={'count': stmt.excluded.count, 'updated_at': stmt.excluded.updated_at}
+        )
+        db.session.execute(stmt)
+        return
+
+    summary = UsageMonthlySummary.query.filter_by(
+        subscription_id=subscription_id,
+        feature_id=feature_id,
+        month=month
+    ).first()
+
+    if summary:
+        summary.count = count
+    else:
+        summary = UsageMonthlySummary(
+            subscription_id=subscription_id,
+            feature_id=feature_id,
+            month=month,
+            count=count
+        )
+
+    db.session.add(summary)
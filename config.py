@@ -33,6 +33,49 @@ class Config:
     REMEMBER_COOKIE_SECURE = os.environ.get('REMEMBER_COOKIE_SECURE') == 'True'
     REMEMBER_COOKIE_HTTPONLY = True
     
+    # Performance configuration
+    FAST_BOOT = os.environ.get('FAST_BOOT') == 'True'  # skip create_all and seeding; run `flask init-db` on deploy
+    ENTITLEMENT_CACHE_TTL = int(os.environ.get('ENTITLEMENT_CACHE_TTL') or 300)  # seconds
+    USAGE_FLUSH_INTERVAL = int(os.environ.get('USAGE_FLUSH_INTERVAL') or 10)  # seconds, 0 = write-through
+    USAGE_BUFFER_MAX_KEYS = int(os.environ.get('USAGE_BUFFER_MAX_KEYS') or 10000)
+    BENCHMARK_CACHE_TTL = int(os.environ.get('BENCHMARK_CACHE_TTL') or 3600)  # seconds
+    CHART_CACHE_MAX_BYTES = int(os.environ.get('CHART_CACHE_MAX_BYTES') or 100 * 1024 * 1024)
+    CHART_CACHE_MAX_AGE = int(os.environ.get('CHART_CACHE_MAX_AGE') or 7 * 24 * 3600)  # seconds since last use
+    CHART_JANITOR_INTERVAL = int(os.environ.get('CHART_JANITOR_INTERVAL') or 600)  # seconds
+    CHART_RENDER_WORKERS = int(os.environ.get('CHART_RENDER_WORKERS') or 2)  # processes
+    CHART_RENDER_TIMEOUT = int(os.environ.get('CHART_RENDER_TIMEOUT') or 30)  # seconds
+    CHART_RENDER_QUEUE_SIZE = int(os.environ.get('CHART_RENDER_QUEUE_SIZE') or 16)
+    CHART_DATA_MAX_AGE = int(os.environ.get('CHART_DATA_MAX_AGE') or 60)  # seconds
+    COMPLIANCE_SCORE_MAX_AGE = int(os.environ.get('COMPLIANCE_SCORE_MAX_AGE') or 3600)  # seconds before a read rescores
+    REPORT_EXPORT_WORKERS = int(os.environ.get('REPORT_EXPORT_WORKERS') or 2)  # threads
+    REPORT_EXPORT_TIMEOUT = int(os.environ.get('REPORT_EXPORT_TIMEOUT') or 300)  # seconds a started job may run
+    REPORT_EXPORT_QUEUE_TIMEOUT = int(os.environ.get('REPORT_EXPORT_QUEUE_TIMEOUT') or 3600)  # seconds a job may wait for a worker
+    KB_SEARCH_PER_PAGE = int(os.environ.get('KB_SEARCH_PER_PAGE') or 20)
+    KB_API_PAGE_SIZE = int(os.environ.get('KB_API_PAGE_SIZE') or 100)
+    KB_API_MAX_PAGE_SIZE = int(os.environ.get('KB_API_MAX_PAGE_SIZE') or 500)
+    RETRIEVAL_TOP_K = int(os.environ.get('RETRIEVAL_TOP_K') or 5)  # passages per prompt
+    RETRIEVAL_CONTEXT_TOKENS = int(os.environ.get('RETRIEVAL_CONTEXT_TOKENS') or 1500)  # prompt budget for legal context
+    RETRIEVAL_SYNC_INTERVAL = int(os.environ.get('RETRIEVAL_SYNC_INTERVAL') or 300)  # seconds between index syncs
+    AI_FAQ_MIN_CONFIDENCE = float(os.environ.get('AI_FAQ_MIN_CONFIDENCE') or 0.6)  # less confident FAQ matches go to the model
+    AI_FAQ_SYNC_INTERVAL = int(os.environ.get('AI_FAQ_SYNC_INTERVAL') or 60)  # seconds between FAQ template checks
+    AI_CACHE_TTL = int(os.environ.get('AI_CACHE_TTL') or 7 * 24 * 3600)  # seconds, 0 = disabled
+    AI_CACHE_MAX_ENTRIES = int(os.environ.get('AI_CACHE_MAX_ENTRIES') or 1000)  # in-memory entries per process
+    AI_CACHE_HIT_FLUSH_INTERVAL = int(os.environ.get('AI_CACHE_HIT_FLUSH_INTERVAL') or 60)  # seconds between hit count writes
+    AI_CACHE_MAX_TEMPERATURE = float(os.environ.get('AI_CACHE_MAX_TEMPERATURE') or 0.5)  # hotter calls are not cached
+    AI_GENERATION_WORKERS = int(os.environ.get('AI_GENERATION_WORKERS') or 4)  # threads per process
+    AI_GENERATION_TIMEOUT = int(os.environ.get('AI_GENERATION_TIMEOUT') or 900)  # seconds before a job is failed
+    AI_STREAMING = os.environ.get('AI_STREAMING', 'False') == 'True'  # relay generated text to the page over server-sent events
+    ANTHROPIC_MAX_CONCURRENCY = int(os.environ.get('ANTHROPIC_MAX_CONCURRENCY') or 8)  # API calls in flight per process
+    ANTHROPIC_MAX_CONCURRENCY_PER_ORG = int(os.environ.get('ANTHROPIC_MAX_CONCURRENCY_PER_ORG') or 4)
+    ANTHROPIC_QUEUE_TIMEOUT = int(os.environ.get('ANTHROPIC_QUEUE_TIMEOUT') or 30)  # seconds to wait for a call slot
+    ANTHROPIC_TIMEOUT = int(os.environ.get('ANTHROPIC_TIMEOUT') or 120)  # seconds per API request
+    ANTHROPIC_CONNECT_TIMEOUT = int(os.environ.get('ANTHROPIC_CONNECT_TIMEOUT') or 10)
+    ANTHROPIC_MAX_RETRIES = int(os.environ.get('ANTHROPIC_MAX_RETRIES') or 2)
+    AI_TOKENS_PER_GENERATION = int(os.environ.get('AI_TOKENS_PER_GENERATION') or 4000)  # monthly budget = tier max_ai_generations x this
+    AI_MONTHLY_TOKEN_BUDGET = int(os.environ.get('AI_MONTHLY_TOKEN_BUDGET') or 0)  # tokens per month without a tier limit, 0 = no cap
+    AI_PROMPT_WARN_TOKENS = int(os.environ.get('AI_PROMPT_WARN_TOKENS') or 8000)  # log prompts larger than this
+    AI_BATCH_MAX_SIZE = int(os.environ.get('AI_BATCH_MAX_SIZE') or 20)  # documents per batch request
+    
     # Application configuration
     APP_NAME = 'NGOmply'
     ADMIN_EMAIL = os.environ.get('ADMIN_EMAIL') or 'admin@ngomply.com'
@@ -0,0 +1,151 @@
+"""usage upserts and background jobs
+
+Brings databases created before these changes up to date. db.create_all()
+creates missing tables but does not alter existing ones, so this adds the
+new columns, indexes and the daily usage record constraint to tables that
+already exist. Every step is skipped when it is already in place, so it is
+safe on databases created by db.create_all() from the current models.
+
+Revision ID: 3b7e9c2d4f10
+Revises:
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b7e9c2d4f10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+# Columns added to existing tables
+NEW_COLUMNS = {
+    'tier_feature': [
+        sa.Column('usage_limit', sa.Integer(), nullable=True),
+    ],
+    'compliance_benchmark': [
+        sa.Column('score_distribution', sa.Text(), nullable=True),
+    ],
+    'compliance_report': [
+        sa.Column('output_format', sa.String(length=10), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=True),
+        sa.Column('error_message', sa.Text(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('completed_at', sa.DateTime(), nullable=True),
+    ],
+    'ai_generated_document': [
+        sa.Column('status', sa.String(length=20), nullable=True, server_default='completed'),
+        sa.Column('generation_params', sa.Text(), nullable=True),
+        sa.Column('error_message', sa.Text(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('completed_at', sa.DateTime(), nullable=True),
+    ],
+}
+
+# Indexes added to existing tables: (table, name, columns)
+NEW_INDEXES = [
+    ('compliance_snapshot', 'ix_compliance_snapshot_org_date', ['organization_id', 'snapshot_date']),
+    ('compliance_benchmark', 'ix_compliance_benchmark_cohort', ['sector', 'organization_size', 'metric_name']),
+    ('compliance_report', 'ix_compliance_report_org_status', ['organization_id', 'status']),
+    ('ai_generated_document', 'ix_ai_generated_document_status', ['status']),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+
+    for table, columns in NEW_COLUMNS.items():
+        if table not in tables:
+            continue
+
+        existing = {column['name'] for column in inspector.get_columns(table)}
+        for column in columns:
+            if column.name not in existing:
+                op.add_column(table, column)
+
+    if 'compliance_report' in tables:
+        # Reports from before background exports were built in the request
+        op.execute(
+            "UPDATE compliance_report SET status = 'completed', "
+            "output_format = CASE WHEN file_path LIKE '%.pdf' THEN 'pdf' ELSE 'html' END "
+            "WHERE status IS NULL"
+        )
+
+    for table, name, columns in NEW_INDEXES:
+        if table in tables and not _has_index(inspector, table, name):
+            op.create_index(name, table, columns)
+
+    if 'usage_record' in tables and not _has_index(inspector, 'usage_record', 'uq_usage_record_day'):
+        _merge_duplicate_usage_records()
+
+        # A unique index serves as the ON CONFLICT target on SQLite and Postgres
+        op.create_index(
+            'uq_usage_record_day', 'usage_record', ['subscription_id', 'feature_id', 'date'], unique=True
+        )
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    if _has_index(inspector, 'usage_record', 'uq_usage_record_day'):
+        op.drop_index('uq_usage_record_day', table_name='usage_record')
+
+    for table, name, columns in NEW_INDEXES:
+        if _has_index(inspector, table, name):
+            op.drop_index(name, table_name=table)
+
+    tables = set(inspector.get_table_names())
+    for table, columns in NEW_COLUMNS.items():
+        if table not in tables:
+            continue
+
+        existing = {column['name'] for column in inspector.get_columns(table)}
+        with op.batch_alter_table(table) as batch_op:
+            for column in columns:
+                if column.name in existing:
+                    batch_op.drop_column(column.name)
+
+
+def _has_index(inspector, table, name):
+    if table not in inspector.get_table_names():
+        return False
+
+    names = {index['name'] for index in inspector.get_indexes(table)}
+    names |= {constraint['name'] for constraint in inspector.get_unique_constraints(table)}
+
+    return name in names
+
+
+def _merge_duplicate_usage_records():
+    # Fold the counts of duplicate rows for a day into the row with the lowest ID
+    op.execute(
+        """
+        UPDATE usage_record SET count = (
+            SELECT SUM(COALESCE(other.count, 0)) FROM usage_record AS other
+            WHERE other.subscription_id = usage_record.subscription_id
+              AND other.feature_id = usage_record.feature_id
+              AND other.date = usage_record.date
+        )
+        WHERE id IN (
+            SELECT MIN(id) FROM usage_record
+            GROUP BY subscription_id, feature_id, date
+            HAVING COUNT(*) > 1
+        )
+        """
+    )
+    op.execute(
+        """
+        DELETE FROM usage_record
+        WHERE id NOT IN (
+            SELECT id FROM (
+                SELECT MIN(id) AS id FROM usage_record
+                GROUP BY subscription_id, feature_id, date
+            ) AS keep
+        )
+        """
+    )